@@ -1,99 +1,351 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
-from sentence_transformers import SentenceTransformer
-import faiss
 import numpy as np
 import json
-from datetime import datetime
-import re
-from langdetect import detect
 import os
-from backend.scripts.rag_pipeline import load_json_data
-
-app = FastAPI()
-
-# Configuration for data paths. I've centralizing these for clarity.
-EMBEDDINGS_DIR = "backend/data/embeddings"
-RAW_DATA_DIR = "backend/data/raw"
-INDEX_PATH = os.path.join(EMBEDDINGS_DIR, "apec2025_index.bin")
-METADATA_PATH = os.path.join(EMBEDDINGS_DIR, "apec2025_metadata.json")
-# This path points to the specific raw data file. It's crucial for the RAG pipeline.
-JSON_PATH = os.path.join(RAW_DATA_DIR, "apec2025_all_info_20250708_221755.json")
-
-# Loading the core components of the RAG system. This setup ensures everything is
-# ready when the application starts.
-model = SentenceTransformer('all-MiniLM-L6-v2')
-index = faiss.read_index(INDEX_PATH)
-with open(METADATA_PATH, 'r', encoding='utf-8') as f:
-    metadata = json.load(f)
-with open(JSON_PATH, 'r', encoding='utf-8') as f:
-    # Using the pre-defined load_json_data function for consistency with the RAG pipeline.
-    chunks, _ = load_json_data(f)
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from backend.scripts.rag_pipeline import search_index, search_scores_to_cosine
+from backend.utils.batching_utils import MicroBatcher
+from backend.utils.cache_utils import embedding_cache_from_env
+from backend.utils.event_index import EventIndex
+from backend.utils.logging_utils import get_logger, start_request
+from backend.utils.metrics import (
+    EMBEDDING_SECONDS, EMBEDDING_TEXTS, REQUEST_SECONDS, VECTOR_QUERY_SECONDS, record_retrieved_scores,
+    render_metrics, track_duration
+)
+from backend.utils.serving_bundle import ServingBundle
+
+logger = get_logger(__name__)
+
+# Everything retrieval needs (index, row-aligned texts and metadata, encoder
+# name) comes from one prebuilt bundle: python backend/scripts/build_serving_bundle.py
+SERVING_BUNDLE_DIR = os.getenv("SERVING_BUNDLE_DIR", os.path.join("backend", "data", "serving_bundle"))
+# Memory-map the FAISS index instead of copying it into each worker's RAM.
+FAISS_INDEX_MMAP = os.getenv("FAISS_INDEX_MMAP", "true").lower() in ("1", "true", "yes")
+# Load and warm the bundle in the background as soon as the server starts. When
+# disabled, the first request loads it.
+WARM_UP_ON_STARTUP = os.getenv("WARM_UP_ON_STARTUP", "true").lower() in ("1", "true", "yes")
+
+# Schedule questions are answered from the event interval index written by
+# chunk_data.py next to the processed chunks.
+PROCESSED_CHUNKS_PATH = os.path.join("backend", "data", "processed", "refined_processed_chunks_v4.json")
+EVENT_INDEX_PATH = os.path.join("backend", "data", "processed", "event_index.json")
+_event_index = None
+
+# Nothing heavy happens at import: the bundle loads on warm-up or first use, so
+# the process starts listening immediately and /ready reports when it can serve.
+bundle = ServingBundle(SERVING_BUNDLE_DIR, mmap_index=FAISS_INDEX_MMAP)
+
+def warm_up_bundle():
+    try:
+        bundle.warm_up()
+    except Exception as e:
+        logger.error("Error warming up serving bundle: %s", e)
+    try:
+        get_event_index()
+    except Exception as e:
+        logger.error("Error loading event index: %s", e)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if WARM_UP_ON_STARTUP:
+        # Not awaited: the server accepts connections (and answers /ready) meanwhile.
+        asyncio.get_running_loop().run_in_executor(None, warm_up_bundle)
+    yield
+
+app = FastAPI(lifespan=lifespan)
+
+@app.middleware("http")
+async def request_context_middleware(request: Request, call_next):
+    """
+    Tags each request with an ID (the caller's X-Request-ID header, if any),
+    echoed in the response header and attached to every log record it produces.
+    """
+    request_id = start_request(request.headers.get("x-request-id"))
+    start = time.perf_counter()
+    response = await call_next(request)
+    response.headers["X-Request-ID"] = request_id
+    logger.info("Request handled.", extra={
+        "method": request.method, "path": request.url.path, "status": response.status_code,
+        "duration_ms": round((time.perf_counter() - start) * 1000, 2),
+    })
+    return response
 
 # Defines the expected structure for incoming API requests.
 class Query(BaseModel):
     text: str
 
-def query_rag(query: str, k: int = 5):
+# Batch requests for offline evaluation and bulk pre-warming jobs.
+class BatchQuery(BaseModel):
+    texts: List[str]
+    k: int = 5
+
+# Chat requests carry the conversation so far, in the same
+# [{'role': ..., 'content': ...}] format the Gradio chatbot uses.
+class ChatQuery(BaseModel):
+    text: str
+    history: list = []
+    session_id: Optional[str] = None
+
+# Query embeddings are cached by normalized text, so identical questions skip
+# the encoder (see EMBEDDING_CACHE_* settings in backend/utils/cache_utils.py).
+query_embedding_cache = embedding_cache_from_env(name="query_embedding")
+
+def encode_queries(queries: list):
     """
-    Performs a RAG query, integrating language detection and date-based event filtering.
-    This function encapsulates the core logic for retrieving relevant information.
+    Returns a (len(queries), dim) float32 array of query embeddings. Cached
+    queries are served from the cache; the rest are encoded in a single batch.
     """
-    lang = detect(query)
-    query_embedding = model.encode([query])[0]
-    distances, indices = index.search(np.array([query_embedding]).astype('float32'), k)
+    # Keyed by encoder name: ONNX int8 and PyTorch vectors differ slightly.
+    model_name = bundle.load().encoder.name
+    embeddings = [query_embedding_cache.get(model_name, "query", query) for query in queries]
+    missing_positions = [i for i, embedding in enumerate(embeddings) if embedding is None]
+    if missing_positions:
+        missing_queries = [queries[i] for i in missing_positions]
+        EMBEDDING_TEXTS.labels(model_name).inc(len(missing_queries))
+        with track_duration(EMBEDDING_SECONDS, model_name):
+            encoded = bundle.encoder.encode(missing_queries, batch_size=len(missing_queries))
+        for position, query, embedding in zip(missing_positions, missing_queries, encoded):
+            query_embedding_cache.set(model_name, "query", query, embedding)
+            embeddings[position] = embedding
+    return np.asarray(embeddings, dtype='float32')
 
-    current_date = datetime.now().strftime('%Y-%m-%d')
+def search_batch(queries: list, k: int = 5):
+    """
+    Encodes all queries with one encoder call and runs a single
+    FAISS search over the whole batch. Returns (distances, indices) arrays with
+    one row per query.
+    """
+    query_vectors = encode_queries(queries)
+    # search_index normalizes for cosine indexes and re-ranks compressed ones.
+    with track_duration(VECTOR_QUERY_SECONDS, "faiss"):
+        return search_index(bundle.index, bundle.index_params, query_vectors, k, bundle.rerank_vectors)
+
+def search_requests_batch(requests: list):
+    """
+    Batch function for the micro-batcher. Each request is a (query, k) tuple;
+    the batch is searched once with the largest k and each row is trimmed back.
+    """
+    max_k = max(k for _, k in requests)
+    distances, indices = search_batch([query for query, _ in requests], max_k)
+    return [(distances[i][:k], indices[i][:k]) for i, (_, k) in enumerate(requests)]
+
+def build_query_results(query: str, distances_row, indices_row):
+    """
+    Turns one row of FAISS search output into API results. The distances row
+    is aligned with the indices row, so scores are converted for the whole row
+    at once and paired with their rows by position.
+    """
+    scores_row = search_scores_to_cosine(distances_row, bundle.index_params)
     all_results = []
-    events_for_today = []
-
-    for idx in indices[0]:
-        meta = metadata[idx]
-        text = chunks[idx]
-        
-        # Checking for event details and date to enable specific filtering.
-        if 'event' in meta and 'date' in meta and meta['date'] != '-':
-            try:
-                # My logic for parsing various date formats. This is important for robustness.
-                date_match = re.search(r'(\w+ \d{1,2}(?: - \d{1,2})?, \d{4})|(\w+ \d{1,2}, \d{4})', meta['date'])
-                if date_match:
-                    # Prioritizing the first group that matches to handle both range and single dates.
-                    date_part = date_match.group(1) or date_match.group(2)
-                    start_date = datetime.strptime(date_part.split(' - ')[0], '%B %d, %Y')
-                    if start_date.strftime('%Y-%m-%d') == current_date:
-                        events_for_today.append({
-                            'text': text,
-                            'metadata': meta,
-                            'distance': distances[0][list(indices[0]).index(idx)]
-                        })
-            except Exception as e:
-                # Logging date parsing errors helps in debugging without stopping the process.
-                print(f"Error parsing date '{meta['date']}': {e}")
-        
+
+    for idx, score, distance in zip(np.asarray(indices_row).tolist(), scores_row.tolist(),
+                                    np.asarray(distances_row).tolist()):
+        if idx < 0:
+            # FAISS pads with -1 when fewer than k neighbours are found.
+            continue
+        # 'id' and 'score' (cosine) follow the result schema shared by all vector
+        # stores; 'text' and 'distance' are kept for existing API clients.
         all_results.append({
-            'text': text,
-            'metadata': meta,
-            'distance': distances[0][list(indices[0]).index(idx)]
+            'id': str(idx),
+            'score': score,
+            'text': bundle.rows.text(idx),
+            'metadata': bundle.rows.metadata(idx),
+            'distance': distance
         })
-    
-    # Conditional return based on query intent for "today's events".
-    # This decision flow prioritizes immediate user needs.
-    if "hôm nay" in query.lower() or "today" in query.lower():
-        if events_for_today:
-            return events_for_today
-        return [{"text": "Không có sự kiện nào diễn ra hôm nay theo lịch APEC 2025.", "metadata": {}, "distance": 0}]
-    
+
+    record_retrieved_scores(all_results)
     return all_results
 
+def get_event_index() -> EventIndex:
+    """Loads the event schedule index on first use (rebuilt if the chunks file changed)."""
+    global _event_index
+    if _event_index is None:
+        _event_index = EventIndex.load_or_build(EVENT_INDEX_PATH, PROCESSED_CHUNKS_PATH)
+    return _event_index
+
+def schedule_results(query: str):
+    """
+    Answers schedule questions ("today", "this week", "events in Busan") from
+    the event interval index instead of vector search. Returns None when the
+    query is not a schedule question.
+    """
+    match = get_event_index().match_query(query)
+    if match is None:
+        return None
+    if not match['events']:
+        if match['label'] == 'today':
+            return [{"text": "Không có sự kiện nào diễn ra hôm nay theo lịch APEC 2025.", "metadata": {}, "distance": 0}]
+        return [{"text": f"No APEC 2025 events found {match['label']}.", "metadata": {}, "distance": 0}]
+    return [{
+        'id': event['id'],
+        'score': 1.0,
+        'text': event['content'],
+        'metadata': {**event['metadata'], 'start': event['start'], 'end': event['end'], 'venue': event['venue']},
+        'distance': 0.0
+    } for event in match['events']]
+
+def query_rag(query: str, k: int = 5):
+    """
+    Performs a RAG query. Schedule questions are answered from the event index;
+    everything else goes through vector search.
+    """
+    schedule = schedule_results(query)
+    if schedule is not None:
+        return schedule
+    return query_rag_batch([query], k)[0]
+
+def query_rag_batch(queries: list, k: int = 5):
+    """
+    Batch version of query_rag for offline evaluation and cache pre-warming:
+    schedule questions are answered from the event index, and all remaining
+    queries share one encoder call and one FAISS search. Returns one result
+    list per query, in input order.
+    """
+    results = [schedule_results(query) for query in queries]
+    search_positions = [i for i, result in enumerate(results) if result is None]
+    if search_positions:
+        distances, indices = search_batch([queries[i] for i in search_positions], k)
+        for row, position in enumerate(search_positions):
+            results[position] = build_query_results(queries[position], distances[row], indices[row])
+    return results
+
+# Concurrent /query requests are coalesced by the micro-batcher: requests that
+# arrive within QUERY_BATCH_MAX_WAIT_MS share one encode call and one FAISS search,
+# executed on a dedicated thread pool instead of the event loop.
+QUERY_BATCH_MAX_SIZE = int(os.getenv("QUERY_BATCH_MAX_SIZE", "32"))
+QUERY_BATCH_MAX_WAIT_MS = float(os.getenv("QUERY_BATCH_MAX_WAIT_MS", "5"))
+QUERY_BATCH_WORKERS = int(os.getenv("QUERY_BATCH_WORKERS", "2"))
+
+# Upper bounds for /query/batch, so one request cannot monopolize the search workers.
+QUERY_BATCH_ENDPOINT_MAX_QUERIES = int(os.getenv("QUERY_BATCH_ENDPOINT_MAX_QUERIES", "256"))
+QUERY_BATCH_ENDPOINT_MAX_K = int(os.getenv("QUERY_BATCH_ENDPOINT_MAX_K", "100"))
+
+search_executor = ThreadPoolExecutor(max_workers=QUERY_BATCH_WORKERS, thread_name_prefix="query-batch")
+query_batcher = MicroBatcher(
+    search_requests_batch,
+    max_batch_size=QUERY_BATCH_MAX_SIZE,
+    max_wait_ms=QUERY_BATCH_MAX_WAIT_MS,
+    executor=search_executor
+)
+
 @app.post("/query")
 async def query_endpoint(query: Query):
     """
     API endpoint for handling chat queries. It routes the user's request
     through the RAG pipeline.
     """
-    results = query_rag(query.text)
+    with track_duration(REQUEST_SECONDS, "/query"):
+        # Schedule lookups are a bisect over the event index, cheap enough for the loop.
+        schedule = schedule_results(query.text)
+        if schedule is not None:
+            return {"results": schedule}
+        distances_row, indices_row = await query_batcher.submit((query.text, 5))
+        # Result building also stays off the loop.
+        results = await run_in_threadpool(build_query_results, query.text, distances_row, indices_row)
+        return {"results": results}
+
+@app.post("/query/batch")
+async def query_batch_endpoint(batch_query: BatchQuery):
+    """
+    Retrieval for many queries in one request: they are encoded together and
+    searched with a single FAISS call on the search thread pool. Returns one
+    result list per query, in request order.
+    """
+    if len(batch_query.texts) > QUERY_BATCH_ENDPOINT_MAX_QUERIES:
+        return JSONResponse(status_code=400, content={
+            "error": f"At most {QUERY_BATCH_ENDPOINT_MAX_QUERIES} queries per batch request."
+        })
+    if not 1 <= batch_query.k <= QUERY_BATCH_ENDPOINT_MAX_K:
+        return JSONResponse(status_code=400, content={"error": f"k must be between 1 and {QUERY_BATCH_ENDPOINT_MAX_K}."})
+    if not batch_query.texts:
+        return {"results": []}
+    loop = asyncio.get_running_loop()
+    with track_duration(REQUEST_SECONDS, "/query/batch"):
+        results = await loop.run_in_executor(search_executor, query_rag_batch, batch_query.texts, batch_query.k)
     return {"results": results}
 
+@app.get("/ready")
+def ready_endpoint():
+    """
+    Readiness probe: 200 once the serving bundle is loaded, 503 while it is
+    still loading or if loading failed. Load balancers should only route
+    traffic to instances that report ready.
+    """
+    if bundle.ready:
+        return {"status": "ready", "version": bundle.version, "load_seconds": bundle.load_seconds}
+    status = "error" if bundle.error else "loading"
+    return JSONResponse(status_code=503, content={"status": status, "error": bundle.error})
+
+@app.get("/metrics")
+def metrics_endpoint():
+    """Prometheus scrape endpoint (empty when prometheus_client is not installed)."""
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+_rag_chatbot = None
+
+def get_rag_chatbot():
+    """
+    Imports the Gemini/Pinecone chatbot (backend.chat.rag, shared with the
+    Gradio app) on first use. It is loaded lazily so the retrieval-only
+    endpoints keep working without the Gemini and Pinecone credentials the
+    chatbot needs.
+    """
+    global _rag_chatbot
+    if _rag_chatbot is None:
+        from backend.chat.rag import rag_chatbot
+        _rag_chatbot = rag_chatbot
+    return _rag_chatbot
+
+def format_sse_event(event: str, data: dict) -> str:
+    # One server-sent event: an event name plus a single-line JSON payload.
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def stream_chat_events(chat_query: ChatQuery):
+    """
+    Drives the streaming chatbot and converts its cumulative partial answers
+    into incremental 'delta' events, followed by a final 'done' event.
+    """
+    sent_text = ""
+    try:
+        # Inside the try: a chatbot that cannot start (e.g. missing credentials)
+        # is reported to the client as an 'error' event.
+        rag_chatbot = get_rag_chatbot()
+        for partial_answer in rag_chatbot(chat_query.text, chat_query.history, session_id=chat_query.session_id):
+            if partial_answer.startswith(sent_text):
+                delta = partial_answer[len(sent_text):]
+            else:
+                # The answer was rewritten (e.g. an error appended); resend it whole.
+                delta = partial_answer
+                yield format_sse_event("reset", {})
+            sent_text = partial_answer
+            if delta:
+                yield format_sse_event("delta", {"text": delta})
+        yield format_sse_event("done", {"text": sent_text})
+    except Exception as e:
+        logger.error("Error while streaming chat answer: %s", e)
+        yield format_sse_event("error", {"message": str(e)})
+
+@app.post("/query/stream")
+def chat_stream_endpoint(chat_query: ChatQuery):
+    """
+    Server-sent-events endpoint streaming the chatbot answer as it is generated.
+    Declared sync on purpose: Starlette iterates the blocking generator in its
+    thread pool, so the event loop stays free while Gemini streams tokens.
+    """
+    return StreamingResponse(
+        stream_chat_events(chat_query),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 if __name__ == "__main__":
     import uvicorn
     # Running the FastAPI application. This is the entry point for the API server.
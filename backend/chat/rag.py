@@ -0,0 +1,724 @@
+import os
+from dotenv import load_dotenv
+import functools
+from concurrent.futures import ThreadPoolExecutor
+import json
+import re
+
+# Import kho vector (Pinecone hoặc FAISS/NumPy trong tiến trình, chọn qua VECTOR_STORE_BACKEND)
+from backend.utils.vector_store import create_vector_store
+from backend.utils.cache_utils import SemanticAnswerCache, file_content_version
+from backend.utils.language_utils import detect_language_local, SessionLanguageCache
+from backend.utils.pipeline_utils import Stage, StageError, run_stage_graph
+from backend.utils.lexical_index import BM25Index, reciprocal_rank_fusion, tokenize
+from backend.utils.event_index import EventIndex
+from backend.utils.vector_store import make_result
+from backend.utils.logging_utils import get_logger, log_prompt, with_request_context
+from backend.utils.gemini_keys import PooledGenerativeModel, get_gemini_key_pool, load_gemini_api_keys
+from backend.utils.metrics import (
+    ERRORS, record_retrieved_scores, record_stage_timings, track_llm_call
+)
+
+logger = get_logger(__name__)
+
+# Thư mục gốc của dự án (chứa file .env và backend/data).
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+# Tải các biến môi trường từ file .env
+dotenv_path = os.path.join(PROJECT_ROOT, '.env')
+load_dotenv(dotenv_path=dotenv_path)
+
+# --- Cấu hình API Keys và LLM ---
+PINECONE_INDEX_NAME = "apec2027-chatbot"
+
+# --- HẰNG SỐ CẤU HÌNH LLM VÀ KHÁC ---
+LLM_GENERATION_MODEL = 'gemini-2.0-flash'
+
+CONFIDENCE_THRESHOLD = 0.5
+AWAITING_GENERAL_KNOWLEDGE_CONFIRMATION_TAG = "[AWAITING_GK_CONFIRMATION]"
+MAX_CONVERSATION_HISTORY_TOKENS = 700
+MAX_CONVERSATION_TURNS_FOR_SUMMARIZATION = 5
+# Ngưỡng tin cậy của bộ phát hiện ngôn ngữ cục bộ; dưới ngưỡng này mới gọi LLM.
+LANGUAGE_DETECTION_CONFIDENCE_THRESHOLD = 0.8
+# Số luồng dùng chung để chạy song song các bước độc lập của một lượt chat,
+# và thời gian chờ tối đa (giây) cho từng bước. Bước quá hạn vẫn chiếm luồng cho
+# tới khi kết thúc, nên các lời gọi Gemini bên trong bước bị giới hạn theo hạn
+# chót của bước (xem leased_call) để không làm đầy pool khi tải tăng đột biến.
+PIPELINE_MAX_WORKERS = 16
+STAGE_TIMEOUTS = {'analysis': 10, 'history': 10, 'retrieve': 8}
+# Bộ nhớ đệm câu trả lời theo độ tương đồng ngữ nghĩa của truy vấn tiếng Anh đã xử lý.
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+ANSWER_CACHE_SIMILARITY_THRESHOLD = float(os.getenv("ANSWER_CACHE_SIMILARITY_THRESHOLD", "0.93"))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "2000"))
+# File chunks đã được nạp vào Pinecone; mã băm nội dung của nó là phiên bản chỉ mục.
+PROCESSED_CHUNKS_FILE = os.path.join(PROJECT_ROOT, 'backend', 'data', 'processed', 'refined_processed_chunks_v4.json')
+# Chỉ mục lịch sự kiện do chunk_data.py tạo cạnh file chunks (dựng lại nếu file chunks đổi).
+EVENT_INDEX_FILE = os.path.join(os.path.dirname(PROCESSED_CHUNKS_FILE), 'event_index.json')
+# Đường tắt từ vựng (BM25): câu hỏi ngắn khớp gần như trọn vẹn một chunk (tên riêng,
+# từ viết tắt, số điện thoại) được trả lời mà không cần viết lại truy vấn bằng LLM
+# hay gọi API embedding.
+LEXICAL_FAST_PATH_ENABLED = os.getenv("LEXICAL_FAST_PATH_ENABLED", "true").lower() == "true"
+LEXICAL_CONFIDENCE_THRESHOLD = float(os.getenv("LEXICAL_CONFIDENCE_THRESHOLD", "0.9"))
+LEXICAL_FAST_PATH_MAX_TERMS = int(os.getenv("LEXICAL_FAST_PATH_MAX_TERMS", "6"))
+
+# Hardcoded English prompt for GK confirmation as requested
+ENGLISH_GK_CONFIRMATION_PROMPT = "I couldn't find this information in my documents. Would you like me to try to find out about it using my general knowledge? Please respond with 'yes' or 'no'."
+
+# Lấy tất cả các Gemini API keys từ biến môi trường
+GEMINI_API_KEYS = load_gemini_api_keys()
+
+if not GEMINI_API_KEYS:
+    raise ValueError("No GEMINI_API_KEY found in .env file for LLM/Translation.")
+
+def get_gemini_llm_model(model_name=LLM_GENERATION_MODEL):
+    # Mỗi lần gọi generate_content lấy một key từ pool: key ít tải nhất, còn hạn mức
+    # và không đang "nghỉ" sau lỗi 429/5xx. Mỗi key có client riêng nên an toàn
+    # khi nhiều luồng gọi cùng lúc (thay cho genai.configure dùng chung toàn tiến trình).
+    return PooledGenerativeModel(model_name, get_gemini_key_pool('generation'))
+
+vector_store = create_vector_store(index_name=PINECONE_INDEX_NAME)
+# Với Pinecone: mở sẵn kết nối tới chỉ mục ở luồng nền và kiểm tra sức khỏe định kỳ,
+# để câu hỏi đầu tiên không phải chờ phân giải chỉ mục.
+vector_store.warm_up()
+
+pipeline_executor = ThreadPoolExecutor(max_workers=PIPELINE_MAX_WORKERS, thread_name_prefix="rag-stage")
+
+# Chỉ mục BM25 trong tiến trình, dựng từ cùng file chunks với Pinecone (cùng ID chunk).
+try:
+    lexical_index = BM25Index.from_chunks_file(PROCESSED_CHUNKS_FILE)
+except (OSError, ValueError) as e:
+    logger.warning("Lexical index unavailable, using dense retrieval only: %s", e)
+    lexical_index = None
+
+# Chỉ mục lịch sự kiện: câu hỏi "hôm nay", "tuần này", "sự kiện ở Busan" được trả
+# lời bằng tra cứu khoảng thời gian/địa điểm thay vì tìm kiếm vector.
+try:
+    event_index = EventIndex.load_or_build(EVENT_INDEX_FILE, PROCESSED_CHUNKS_FILE)
+except (OSError, ValueError) as e:
+    logger.warning("Event index unavailable, schedule questions use normal retrieval: %s", e)
+    event_index = None
+
+def schedule_chunks(schedule_match: dict) -> list:
+    """Chuyển kết quả tra cứu lịch (có ít nhất một sự kiện) thành các chunk ngữ cảnh."""
+    return [make_result(event['id'], 1.0, event['content'], event['metadata']) for event in schedule_match['events']]
+
+def is_confident_lexical_match(query: str, lexical_chunks: list) -> bool:
+    """
+    True khi câu hỏi ngắn và kết quả BM25 đứng đầu chứa gần như toàn bộ các từ
+    của câu hỏi (tính theo trọng số IDF), trong đó có ít nhất một từ hiếm.
+    """
+    if lexical_index is None or not lexical_chunks or len(tokenize(query)) > LEXICAL_FAST_PATH_MAX_TERMS:
+        return False
+    return lexical_index.match_confidence(query, lexical_chunks[0]) >= LEXICAL_CONFIDENCE_THRESHOLD
+
+answer_cache = SemanticAnswerCache(
+    similarity_threshold=ANSWER_CACHE_SIMILARITY_THRESHOLD,
+    max_entries=ANSWER_CACHE_MAX_ENTRIES
+)
+_index_version_state = {'mtime': None, 'version': None}
+
+def get_index_version() -> str:
+    """
+    Phiên bản dữ liệu của chỉ mục, dùng để gắn thẻ các câu trả lời đã lưu đệm.
+    Ưu tiên biến môi trường PINECONE_INDEX_VERSION; nếu không có, dùng mã băm
+    nội dung của file chunks (chỉ tính lại khi file thay đổi).
+    """
+    env_version = os.getenv("PINECONE_INDEX_VERSION")
+    if env_version:
+        return env_version
+    try:
+        mtime = os.path.getmtime(PROCESSED_CHUNKS_FILE)
+    except OSError:
+        return "unknown"
+    if _index_version_state['mtime'] != mtime:
+        _index_version_state['version'] = file_content_version(PROCESSED_CHUNKS_FILE)
+        _index_version_state['mtime'] = mtime
+    return _index_version_state['version']
+
+# --- Hàm phát hiện ngôn ngữ của truy vấn ---
+# Ngôn ngữ đã phát hiện được của từng phiên chat (theo session_hash của Gradio).
+session_language_cache = SessionLanguageCache()
+
+def detect_language_with_llm(text: str) -> str:
+    """
+    Sử dụng LLM để phát hiện ngôn ngữ của văn bản.
+    Trả về mã ngôn ngữ ISO 639-1 (ví dụ: 'en', 'vi', 'ko').
+    """
+    model = get_gemini_llm_model()
+    prompt_detect_lang = f"""Detect the primary language of the following text and respond with ONLY its ISO 639-1 two-letter language code.
+    For example: 'en' for English, 'vi' for Vietnamese, 'ko' for Korean, 'zh' for Chinese, 'fr' for French, 'de' for German, 'es' for Spanish.
+    If the language cannot be confidently determined or is not one of the common languages, default to 'en'.
+
+    Text: {text}
+
+    Language Code:"""
+    try:
+        with track_llm_call('detect', prompt_detect_lang):
+            response = model.generate_content(prompt_detect_lang)
+        lang_code = response.text.strip().lower()
+
+        if len(lang_code) == 2 and lang_code.isalpha():
+            return lang_code
+        else:
+            logger.warning("LLM returned invalid language code '%s' for detection. Defaulting to 'en'.", lang_code)
+            return 'en'
+    except Exception as e:
+        logger.error("Error during LLM language detection: %s. Defaulting to 'en'.", e)
+        return 'en'
+
+def resolve_language_locally(text: str, session_id: str = None):
+    """
+    Phát hiện ngôn ngữ bằng bộ phát hiện cục bộ (theo chữ viết / n-gram).
+    Khi độ tin cậy thấp (ví dụ "yes", "ok"), dùng lại ngôn ngữ đã biết của phiên.
+    Trả về (mã ngôn ngữ, đã_xác_định); đã_xác_định=False nghĩa là cần LLM để chắc chắn.
+    """
+    lang_code, confidence = detect_language_local(text)
+    if confidence >= LANGUAGE_DETECTION_CONFIDENCE_THRESHOLD:
+        session_language_cache.set(session_id, lang_code)
+        return lang_code, True
+
+    cached_lang_code = session_language_cache.get(session_id)
+    if cached_lang_code:
+        logger.info("Low-confidence local detection. Reusing session language.",
+                    extra={'detected': lang_code, 'confidence': round(confidence, 2), 'session_language': cached_lang_code})
+        return cached_lang_code, True
+    return lang_code, False
+
+def detect_language(text: str, session_id: str = None) -> str:
+    """
+    Phát hiện ngôn ngữ cục bộ; chỉ khi phiên chưa có ngôn ngữ nào và độ tin cậy
+    thấp mới gọi LLM.
+    """
+    lang_code, resolved = resolve_language_locally(text, session_id)
+    if resolved:
+        return lang_code
+
+    logger.info("Low-confidence local detection. Falling back to LLM detection.", extra={'text': text[:50]})
+    lang_code = detect_language_with_llm(text)
+    session_language_cache.set(session_id, lang_code)
+    return lang_code
+
+# --- Hàm dịch tự động thông báo lỗi ---
+@functools.lru_cache(maxsize=128)
+def translate_error_message(error_message_en: str, target_lang_code: str) -> str:
+    if target_lang_code == 'en':
+        return error_message_en
+
+    model = get_gemini_llm_model()
+    prompt_translate_error = f"""Translate the following error message into {target_lang_code} language.
+    Respond with only the translated error message, without any additional commentary.
+
+    [ERROR MESSAGE IN ENGLISH]
+    {error_message_en}
+
+    [TRANSLATED ERROR MESSAGE]
+    """
+    try:
+        with track_llm_call('translate', prompt_translate_error):
+            response = model.generate_content(prompt_translate_error)
+        translated_message = response.text.strip()
+        logger.info("Translated error message.", extra={'target_language': target_lang_code, 'error_message': error_message_en})
+        return translated_message
+    except Exception as e:
+        logger.error("Error translating error message to '%s': %s", target_lang_code, e)
+        return error_message_en
+
+def get_localized_error_message(lang_code: str, error_type: str) -> str:
+    error_messages_en = {
+        'pinecone_query_error': "Sorry, I encountered an error while searching for relevant information in the database.",
+        'no_relevant_info': "Sorry, I couldn't find any relevant information in my documents for this question.",
+        'context_building_error': "Sorry, I couldn't form a valid context from the retrieved information.",
+        'llm_generation_error': "Sorry, I encountered an error while generating the answer.",
+        'query_preprocessing_error': "Sorry, I encountered an error while processing your question.",
+        # 'no_relevant_info_and_suggest_gk' is now handled separately for English output
+        'general_knowledge_declined': "Understood. I will stick to information from the provided documents. Is there anything else I can help you with?",
+        'general_knowledge_fallback_error': "Sorry, I couldn't find the answer using my general knowledge either. Can I help you with anything else?",
+        'repeat_no_history': "I'm sorry, I cannot repeat the answer as there is no previous conversation to refer to. What else can I help you with?"
+    }
+
+    english_error = error_messages_en.get(error_type, error_messages_en['llm_generation_error'])
+
+    if lang_code != 'en':
+        return translate_error_message(english_error, lang_code)
+    else:
+        return english_error
+
+# --- Hàm tiền xử lý truy vấn: Sửa lỗi chính tả/ngữ pháp và Dịch sang tiếng Anh ---
+def preprocess_query(query_text: str, original_lang_code: str) -> str:
+    model = get_gemini_llm_model()
+
+    prompt_fix_and_translate = f"""As a professional language assistant, your task is to review the user's question, correct any spelling or grammatical errors, improve the phrasing if it's unclear or awkward, and then translate the corrected and improved question into English.
+    Respond with only the corrected and translated English question. Do not add any other content or commentary.
+
+    [ORIGINAL QUESTION]
+    {query_text}
+
+    [CORRECTED AND TRANSLATED ENGLISH QUESTION]
+    """
+
+    try:
+        with track_llm_call('translate', prompt_fix_and_translate):
+            response = model.generate_content(prompt_fix_and_translate)
+        processed_query = response.text.strip()
+        logger.info("Query preprocessed.", extra={'original_query': query_text, 'processed_query': processed_query})
+        return processed_query
+    except Exception as e:
+        logger.error("Error during query preprocessing with Gemini: %s. Falling back to the original query.", e)
+        return query_text
+
+# --- Hàm tóm tắt lịch sử hội thoại ---
+def format_conversation_dialogue(history_list: list) -> str:
+    if not history_list:
+        return ""
+
+    recent_turns = history_list[-MAX_CONVERSATION_TURNS_FOR_SUMMARIZATION:]
+
+    dialogue_str = ""
+    for item in recent_turns:
+        if isinstance(item, dict) and item.get('role') == 'user':
+            dialogue_str += f"User: {item.get('content', '')}\n"
+        elif isinstance(item, dict) and item.get('role') == 'assistant':
+            # Remove the hidden tag for summarization
+            clean_content = item.get('content', '').replace(AWAITING_GENERAL_KNOWLEDGE_CONFIRMATION_TAG, "").strip()
+            dialogue_str += f"Assistant: {clean_content}\n"
+    return dialogue_str
+
+def dialogue_needs_summary(dialogue_str: str) -> bool:
+    # Note: Token count estimation here is very rough. For production, use a proper tokenizer.
+    return len(dialogue_str.split()) > MAX_CONVERSATION_HISTORY_TOKENS
+
+def summarize_conversation_history(history_list: list) -> str:
+    if not history_list:
+        return ""
+
+    dialogue_str = format_conversation_dialogue(history_list)
+
+    if dialogue_needs_summary(dialogue_str):
+        model = get_gemini_llm_model()
+        prompt_summarize = f"""Summarize the following conversation history concisely to extract key topics and context. This summary will be used to help an assistant understand the ongoing conversation and respond appropriately to the next user query.
+
+        [CONVERSATION HISTORY]
+        {dialogue_str}
+
+        [CONCISE SUMMARY]
+        """
+        try:
+            with track_llm_call('summarize', prompt_summarize):
+                response = model.generate_content(prompt_summarize)
+            summary = response.text.strip()
+            logger.info("Conversation history summarized.", extra={'summary_chars': len(summary)})
+            return f"\n[PREVIOUS CONVERSATION SUMMARY]\n{summary}\n"
+        except Exception as e:
+            logger.error("Error summarizing history: %s", e)
+            return "\n[PREVIOUS CONVERSATION CONTEXT UNAVAILABLE]\n"
+    else:
+        return f"\n[PREVIOUS CONVERSATION]\n{dialogue_str}\n"
+
+# --- Hàm phân tích truy vấn gộp: phát hiện ngôn ngữ + sửa/dịch + tóm tắt lịch sử ---
+def parse_query_analysis_response(response_text: str, expect_summary: bool) -> dict:
+    """
+    Kiểm tra và chuẩn hóa kết quả JSON của bước phân tích truy vấn.
+    Ném ValueError nếu thiếu trường hoặc giá trị không hợp lệ.
+    """
+    cleaned = response_text.strip()
+    # Một số phản hồi vẫn bọc JSON trong khối ```json ... ``` dù đã yêu cầu JSON thuần.
+    cleaned = re.sub(r'^```(?:json)?\s*|\s*```$', '', cleaned)
+    data = json.loads(cleaned)
+    if not isinstance(data, dict):
+        raise ValueError("Query analysis response is not a JSON object.")
+
+    lang_code = str(data.get('language', '')).strip().lower()
+    if len(lang_code) != 2 or not lang_code.isalpha():
+        raise ValueError(f"Invalid language code '{lang_code}' in query analysis.")
+
+    english_query = data.get('english_query')
+    if not isinstance(english_query, str) or not english_query.strip():
+        raise ValueError("Missing 'english_query' in query analysis.")
+
+    summary = data.get('summary', '')
+    if expect_summary and (not isinstance(summary, str) or not summary.strip()):
+        raise ValueError("Missing 'summary' in query analysis.")
+
+    return {
+        'language': lang_code,
+        'english_query': english_query.strip(),
+        'summary': summary.strip() if isinstance(summary, str) else '',
+    }
+
+def analyze_query(message: str, history: list, lang_code_hint: str = None) -> dict:
+    """
+    Gộp phát hiện ngôn ngữ, sửa lỗi + dịch truy vấn sang tiếng Anh và tóm tắt
+    lịch sử hội thoại vào MỘT lời gọi Gemini trả về JSON.
+    Trả về dict gồm 'language', 'processed_query', 'history_context'.
+    Nếu phản hồi không hợp lệ, quay về các hàm xử lý từng bước.
+    """
+    dialogue_str = format_conversation_dialogue(history)
+    needs_summary = dialogue_needs_summary(dialogue_str)
+
+    summary_instruction = ""
+    history_block = ""
+    if needs_summary:
+        summary_instruction = '\n    - "summary": a concise summary of the conversation history below, extracting key topics and context that help an assistant respond to the next user query.'
+        history_block = f"""
+    [CONVERSATION HISTORY]
+    {dialogue_str}
+    """
+
+    prompt_analyze = f"""As a professional language assistant, analyze the user's question and respond with ONLY a JSON object with these keys:
+    - "language": the ISO 639-1 two-letter code of the primary language of the ORIGINAL QUESTION (e.g. 'en', 'vi', 'ko', 'zh'). Default to 'en' if unsure.
+    - "english_query": the question with spelling and grammatical errors corrected, unclear or awkward phrasing improved, translated into English.{summary_instruction}
+    {history_block}
+    [ORIGINAL QUESTION]
+    {message}
+    """
+
+    model = get_gemini_llm_model()
+    try:
+        with track_llm_call('analyze', prompt_analyze):
+            response = model.generate_content(
+                prompt_analyze,
+                generation_config={"response_mime_type": "application/json"}
+            )
+        analysis = parse_query_analysis_response(response.text, needs_summary)
+    except Exception as e:
+        logger.warning("Query analysis failed (%s). Falling back to step-by-step preprocessing.", e)
+        lang_code = lang_code_hint or detect_language_with_llm(message)
+        return {
+            'language': lang_code,
+            'processed_query': preprocess_query(message, lang_code),
+            'history_context': summarize_conversation_history(history),
+        }
+
+    if needs_summary:
+        history_context = f"\n[PREVIOUS CONVERSATION SUMMARY]\n{analysis['summary']}\n"
+    elif dialogue_str:
+        history_context = f"\n[PREVIOUS CONVERSATION]\n{dialogue_str}\n"
+    else:
+        history_context = ""
+
+    logger.info("Query analyzed.", extra={'original_query': message, 'processed_query': analysis['english_query']})
+    return {
+        'language': lang_code_hint or analysis['language'],
+        'processed_query': analysis['english_query'],
+        'history_context': history_context,
+    }
+
+# --- Hàm sinh câu trả lời dạng luồng (streaming) ---
+def stream_generated_text(model, prompt: str, purpose: str = 'generate'):
+    """
+    Gọi Gemini ở chế độ stream và trả dần văn bản đã tích lũy, vì Gradio hiển thị
+    lại toàn bộ chuỗi ở mỗi lần yield. Ném ValueError nếu phản hồi rỗng hoặc bị chặn.
+    Thời gian đo (theo `purpose`) tính đến khi stream kết thúc.
+    """
+    accumulated = ""
+    with track_llm_call(purpose, prompt):
+        for chunk in model.generate_content(prompt, stream=True):
+            if chunk.candidates and chunk.candidates[0].content.parts:
+                accumulated += chunk.text
+                yield accumulated
+        if not accumulated:
+            raise ValueError("LLM response was empty or blocked.")
+
+# --- Hàm cốt lõi của Chatbot RAG ---
+# Mỗi lượt chat là một yêu cầu có request ID riêng, gắn vào mọi dòng log của lượt đó.
+@with_request_context
+def rag_chatbot(message: str, history: list, session_id: str = None):
+    """
+    Generator: trả dần câu trả lời (chuỗi tích lũy) để giao diện hiển thị ngay từ
+    token đầu tiên. Các nhánh trả lời ngắn (lỗi, xác nhận) chỉ yield một lần.
+    session_id là khóa cache ngôn ngữ của phiên (session_hash của Gradio, hoặc
+    session_id do client API gửi lên).
+    """
+    # Bước 1: Phát hiện ngôn ngữ của truy vấn gốc (luôn ở đầu hàm).
+    # Chỉ dùng bộ phát hiện cục bộ; nếu chưa chắc chắn, bước phân tích truy vấn
+    # (hoặc các nhánh đặc biệt bên dưới) sẽ xác định lại bằng LLM.
+    original_lang_code, language_resolved = resolve_language_locally(message, session_id)
+    logger.info("Detected original language.", extra={'language': original_lang_code, 'resolved_locally': language_resolved})
+
+    # --- Xử lý Vấn đề 01: Meta-query (nhắc lại câu trả lời) ---
+    repeat_keywords = {
+        'en': ['repeat', 'say again', 'what did you say', 'clarify', 'last answer'],
+        'vi': ['nhắc lại', 'lặp lại', 'nói lại', 'câu trả lời trước'],
+        'ko': ['다시 말해줘', '반복해줘', '뭐라고 했어']
+    }
+    user_message_lower = message.strip().lower()
+
+    # Khi ngôn ngữ chưa chắc chắn, kiểm tra từ khóa của mọi ngôn ngữ được hỗ trợ.
+    candidate_langs = [original_lang_code] if language_resolved else list(repeat_keywords)
+    is_repeat_query = any(
+        keyword in user_message_lower
+        for lang in candidate_langs if lang in repeat_keywords
+        for keyword in repeat_keywords[lang]
+    )
+
+    if is_repeat_query:
+        if not language_resolved:
+            original_lang_code = detect_language(message, session_id)
+        if history and len(history) >= 2:
+            last_bot_message_item = None
+            for item in reversed(history):
+                if isinstance(item, dict) and item.get('role') == 'assistant':
+                    last_bot_message_item = item
+                    break
+
+            if last_bot_message_item and last_bot_message_item.get('content'):
+                logger.info("Responding to repeat query with previous answer.")
+                clean_answer = last_bot_message_item['content'].replace(AWAITING_GENERAL_KNOWLEDGE_CONFIRMATION_TAG, "").strip()
+                yield clean_answer
+                return
+            else:
+                logger.info("No previous bot response found to repeat.")
+                yield get_localized_error_message(original_lang_code, 'repeat_no_history')
+                return
+        else:
+            logger.info("No previous conversation to repeat.")
+            yield get_localized_error_message(original_lang_code, 'repeat_no_history')
+            return
+
+    # --- Xử lý Vấn đề 02: Trạng thái chờ xác nhận kiến thức chung ---
+    last_bot_response_content = ""
+    original_query_for_gk = message # Default to current message
+
+    if history:
+        for item in reversed(history):
+            if isinstance(item, dict) and item.get('role') == 'assistant':
+                last_bot_response_content = item.get('content', '')
+                break
+
+        found_bot_response_idx = -1
+        # Find index of the last bot response
+        for idx, item in enumerate(reversed(history)):
+            if isinstance(item, dict) and item.get('role') == 'assistant' and item.get('content') == last_bot_response_content:
+                found_bot_response_idx = len(history) - 1 - idx
+                break
+
+        # If the last bot response was the GK prompt, use the user's *previous* query
+        if found_bot_response_idx > 0 and AWAITING_GENERAL_KNOWLEDGE_CONFIRMATION_TAG in last_bot_response_content:
+            user_msg_item = history[found_bot_response_idx - 1]
+            if isinstance(user_msg_item, dict) and user_msg_item.get('role') == 'user':
+                original_query_for_gk = user_msg_item.get('content', original_query_for_gk)
+
+
+    is_awaiting_gk_confirmation = AWAITING_GENERAL_KNOWLEDGE_CONFIRMATION_TAG in last_bot_response_content
+
+    if is_awaiting_gk_confirmation:
+        if not language_resolved:
+            original_lang_code = detect_language(message, session_id)
+
+        # Check user's response to the general knowledge suggestion
+        user_message_lower = message.strip().lower()
+        if user_message_lower in ["yes", "vâng", "có", "ok", "chấp nhận", "đồng ý"]: # Allow some common non-English affirmatives too for robustness
+            logger.info("User accepted general knowledge fallback. Generating answer from LLM's general knowledge.")
+
+            model = get_gemini_llm_model(model_name=LLM_GENERATION_MODEL)
+            prompt_gk = f"""You are an intelligent assistant. Answer the following question using your general knowledge.
+            Answer in the language of the ORIGINAL USER QUESTION, which was: '{original_lang_code}'.
+            IMPORTANT: ALWAYS RETAIN PLACE NAMES, EVENT NAMES, ORGANIZATION NAMES, TIMES, DATES, PHONE NUMBERS, WEBSITES, and SPECIALIZED TERMS in English in the answer.
+
+            [ORIGINAL USER QUESTION]
+            {original_query_for_gk}
+
+            [ANSWER]
+            """
+            final_answer = ""
+            try:
+                for final_answer in stream_generated_text(model, prompt_gk, purpose='general_knowledge'):
+                    yield final_answer
+            except Exception as e:
+                logger.error("Error generating GK content: %s", e)
+                error_message = get_localized_error_message(original_lang_code, 'general_knowledge_fallback_error')
+                yield f"{final_answer}\n\n{error_message}" if final_answer else error_message
+            return
+        elif user_message_lower in ["no", "không", "ko", "từ chối"]: # Allow some common non-English negatives
+            logger.info("User declined general knowledge fallback.")
+            yield get_localized_error_message(original_lang_code, 'general_knowledge_declined')
+            return
+        else:
+            logger.info("Unclear response to GK fallback, re-prompting.")
+            # Keep the GK prompt in English as requested
+            yield f"{ENGLISH_GK_CONFIRMATION_PROMPT} {AWAITING_GENERAL_KNOWLEDGE_CONFIRMATION_TAG}"
+            return
+
+
+    # Bắt đầu luồng RAG tiêu chuẩn
+
+    # Các bước được chạy như một đồ thị phụ thuộc: phân tích truy vấn (ngôn ngữ +
+    # truy vấn tiếng Anh + tóm tắt lịch sử trong MỘT lời gọi LLM), rồi truy xuất
+    # Pinecone. Trên đường tắt không có bước phân tích, nên lịch sử được tóm tắt
+    # ở một bước riêng. Thời gian một lượt = đường găng.
+    lang_code_hint = original_lang_code if language_resolved else None
+    fallback_lang_code = original_lang_code
+
+    def analysis_fallback(exc):
+        # Hết thời gian chờ: tìm kiếm bằng chính câu hỏi gốc thay vì chặn cả lượt.
+        # Ngôn ngữ ở đây chỉ là phỏng đoán cục bộ chưa chắc chắn ('resolved': False),
+        # nên không được lưu làm ngôn ngữ của phiên. Lịch sử được dùng nguyên văn
+        # nếu đủ ngắn, vì không còn thời gian để tóm tắt.
+        dialogue_str = format_conversation_dialogue(history)
+        if not dialogue_str:
+            history_context = ""
+        elif dialogue_needs_summary(dialogue_str):
+            history_context = "\n[PREVIOUS CONVERSATION CONTEXT UNAVAILABLE]\n"
+        else:
+            history_context = f"\n[PREVIOUS CONVERSATION]\n{dialogue_str}\n"
+        return {'language': fallback_lang_code, 'processed_query': message, 'history_context': history_context,
+                'resolved': False}
+
+    # Bộ nhớ đệm câu trả lời chỉ dùng cho câu hỏi đầu phiên: khi đã có lịch sử,
+    # câu trả lời có thể phụ thuộc vào ngữ cảnh hội thoại.
+    use_answer_cache = ANSWER_CACHE_ENABLED and not history
+
+    def retrieve_stage(inputs):
+        processed_query = inputs['analysis']['processed_query']
+        if not processed_query:
+            return None
+        query_embedding = vector_store.embed_query(processed_query)
+        if use_answer_cache and query_embedding is not None:
+            answer_lang_code = lang_code_hint or inputs['analysis']['language']
+            cached_answer = answer_cache.lookup(query_embedding, answer_lang_code, get_index_version())
+            if cached_answer is not None:
+                return {'query_embedding': query_embedding, 'chunks': [], 'dense_chunks': [], 'cached_answer': cached_answer}
+        dense_chunks = vector_store.query(processed_query, top_k=3, query_embedding=query_embedding)
+        record_retrieved_scores(dense_chunks)
+        # Hợp nhất kết quả vector với BM25 theo thứ hạng (RRF) để tên riêng khớp
+        # chính xác không bị bỏ sót; ngưỡng tin cậy vẫn dựa trên điểm cosine.
+        lexical_chunks = lexical_index.search(processed_query, top_k=3) if lexical_index is not None else []
+        chunks = reciprocal_rank_fusion([dense_chunks, lexical_chunks], top_k=3) if lexical_chunks else dense_chunks
+        return {'query_embedding': query_embedding, 'chunks': chunks, 'dense_chunks': dense_chunks, 'cached_answer': None}
+
+    # Đường tắt: câu hỏi về lịch sự kiện được trả lời bằng tra cứu chỉ mục sự kiện;
+    # nếu không, khi BM25 trên câu hỏi gốc đã khớp chắc chắn thì dùng luôn kết quả đó.
+    # Cả hai đều bỏ qua bước phân tích bằng LLM và lời gọi embedding; chỉ còn tóm
+    # tắt lịch sử (nếu có).
+    # Tra cứu lịch không tìm thấy sự kiện nào thì quay về truy xuất thông thường
+    # (vẫn qua ngưỡng tin cậy) thay vì trả lời "không có sự kiện".
+    fast_path_chunks = None
+    schedule_match = event_index.match_query(message) if event_index is not None else None
+    if schedule_match is not None and schedule_match['events']:
+        fast_path_chunks = schedule_chunks(schedule_match)
+        logger.info("Schedule lookup. Skipping vector search.",
+                    extra={'events': len(schedule_match['events']), 'window': schedule_match['label']})
+    elif LEXICAL_FAST_PATH_ENABLED and lexical_index is not None:
+        lexical_chunks = lexical_index.search(message, top_k=3)
+        if is_confident_lexical_match(message, lexical_chunks):
+            fast_path_chunks = lexical_chunks
+            logger.info("Lexical fast path. Skipping query analysis and embedding.",
+                        extra={'query': message, 'chunk_id': lexical_chunks[0]['id']})
+    use_fast_path = fast_path_chunks is not None
+
+    if use_fast_path:
+        stages = [
+            Stage('history', lambda _: summarize_conversation_history(history),
+                  timeout=STAGE_TIMEOUTS['history'],
+                  fallback=lambda exc: "\n[PREVIOUS CONVERSATION CONTEXT UNAVAILABLE]\n"),
+        ]
+    else:
+        stages = [
+            Stage('analysis', lambda _: analyze_query(message, history, lang_code_hint),
+                  timeout=STAGE_TIMEOUTS['analysis'], fallback=analysis_fallback),
+            Stage('retrieve', retrieve_stage, depends_on=['analysis'], timeout=STAGE_TIMEOUTS['retrieve']),
+        ]
+    stage_timings = {}
+    try:
+        stage_results = run_stage_graph(stages, pipeline_executor, timings=stage_timings)
+    except StageError as e:
+        logger.error("Error querying Pinecone: %s", e)
+        ERRORS.labels('retrieval').inc()
+        yield get_localized_error_message(original_lang_code, 'pinecone_query_error')
+        return
+    finally:
+        record_stage_timings(stage_timings)
+
+    if use_fast_path:
+        # Ngôn ngữ trả lời do prompt sinh câu trả lời tự xác định từ câu hỏi gốc.
+        query_analysis = {'language': original_lang_code, 'processed_query': message,
+                          'history_context': stage_results['history']}
+        stage_results['retrieve'] = {'query_embedding': None, 'chunks': fast_path_chunks, 'dense_chunks': [],
+                                     'cached_answer': None}
+    else:
+        query_analysis = stage_results['analysis']
+        if not language_resolved:
+            original_lang_code = query_analysis['language']
+            if query_analysis.get('resolved', True):
+                session_language_cache.set(session_id, original_lang_code)
+    conversation_history_context = query_analysis['history_context']
+
+    processed_query_for_pinecone = query_analysis['processed_query']
+    if not processed_query_for_pinecone:
+        yield get_localized_error_message(original_lang_code, 'query_preprocessing_error')
+        return
+
+    retrieval = stage_results['retrieve']
+    if retrieval['cached_answer'] is not None:
+        yield retrieval['cached_answer']
+        return
+
+    retrieved_chunks = retrieval['chunks']
+    logger.info("Retrieved chunks.", extra={'chunks': len(retrieved_chunks), 'processed_query': processed_query_for_pinecone})
+
+    # Ngưỡng tin cậy dựa trên điểm cosine của kết quả vector; kết quả của các
+    # đường tắt đã được kiểm tra ở trên.
+    dense_chunks = retrieval['dense_chunks']
+    avg_score = sum([c['score'] for c in dense_chunks]) / len(dense_chunks) if dense_chunks else 0
+
+    if not retrieved_chunks or (not use_fast_path and avg_score < CONFIDENCE_THRESHOLD):
+        logger.info("Low confidence or no chunks retrieved. Suggesting general knowledge fallback.",
+                    extra={'avg_score': round(avg_score, 3)})
+        # Directly use the English GK confirmation prompt
+        yield f"{ENGLISH_GK_CONFIRMATION_PROMPT} {AWAITING_GENERAL_KNOWLEDGE_CONFIRMATION_TAG}"
+        return
+
+
+    context_texts = [chunk["content"] for chunk in retrieved_chunks]
+    context_texts = [text for text in context_texts if text != 'N/A' and text.strip()]
+    context_str = "\n\n---\n\n".join(context_texts)
+
+    if not context_str.strip():
+        yield get_localized_error_message(original_lang_code, 'context_building_error')
+        return
+
+    model = get_gemini_llm_model(model_name=LLM_GENERATION_MODEL)
+
+    prompt = f"""You are an intelligent assistant specialized in APEC 2025 information.
+
+    {conversation_history_context}
+
+    You must answer the user's question accurately and completely BASED ON the context provided below.
+    If the context does not contain enough information to answer, state that you do not know that information.
+    Do not fabricate information.
+
+    Answer in the language of the ORIGINAL USER QUESTION.
+    For example: If the ORIGINAL USER QUESTION is in Vietnamese, answer in Vietnamese. If it is in English, answer in English. If it is in Korean, answer in Korean.
+
+    IMPORTANT: ALWAYS RETAIN PLACE NAMES, EVENT NAMES, ORGANIZATION NAMES, TIMES, DATES, PHONE NUMBERS, WEBSITES, and SPECIALIZED TERMS in English in the answer.
+    Example: "The APEC Economic Leaders’ Meeting will take place in Gyeongju."
+
+    FORMATTING GUIDELINES:
+    - For answers containing lists of items (e.g., members, events, detailed information), use bullet points or numbered lists.
+    - Bold important keywords, names, dates, and locations using Markdown (e.g., **Example Text**).
+    - Ensure the answer is well-structured, easy to read, and uses line breaks appropriately for clarity.
+    - If the answer has multiple distinct parts, use subheadings or clear paragraph breaks.
+
+    [CONTEXT]
+    {context_str}
+
+    [ORIGINAL USER QUESTION]
+    {message}
+
+    [ANSWER]
+    """
+    # Prompt đầy đủ (kèm mọi chunk) chỉ được ghi cho một phần yêu cầu được lấy mẫu.
+    log_prompt(logger, 'generate', prompt)
+
+    final_answer = ""
+    try:
+        for final_answer in stream_generated_text(model, prompt):
+            yield final_answer
+    except Exception as e:
+        logger.error("Error generating content with LLM: %s", e)
+        error_message = get_localized_error_message(original_lang_code, 'llm_generation_error')
+        yield f"{final_answer}\n\n{error_message}" if final_answer else error_message
+    else:
+        if use_answer_cache and retrieval['query_embedding'] is not None:
+            answer_cache.store(retrieval['query_embedding'], processed_query_for_pinecone,
+                               original_lang_code, final_answer, get_index_version())
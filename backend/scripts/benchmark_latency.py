@@ -0,0 +1,214 @@
+import argparse
+import contextlib
+import json
+import logging
+import os
+import sys
+import time
+
+# Dynamically adds the project root to sys.path to ensure module imports work correctly.
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, project_root)
+
+from backend.utils.benchmark_utils import (
+    InjectedLatency, LatencyRecorder, StandInGeminiModel, StandInQueryEncoder, StandInServingBundle,
+    StandInVectorStore, compare_to_baseline
+)
+from backend.utils.logging_utils import PROJECT_LOGGERS
+
+# --- Configuration ---
+PROCESSED_CHUNKS_FILE = os.path.join(project_root, "backend", "data", "processed", "refined_processed_chunks_v4.json")
+# Fixed multilingual query set. It covers the normal RAG path, a follow-up with
+# history, and the schedule and exact-match fast paths.
+BENCHMARK_QUERIES = [
+    {"text": "What is APEC?", "history": []},
+    {"text": "What are the main themes and priorities of APEC 2025 KOREA?", "history": []},
+    {"text": "Where is Informal Senior Officials’ Meeting (ISOM) held?", "history": []},
+    {"text": "APEC là gì?", "history": []},
+    {"text": "Các thành viên của APEC là những quốc gia nào?", "history": []},
+    {"text": "Thời tiết ở Hàn Quốc vào tháng 7 như thế nào?", "history": []},
+    {"text": "APEC 한국의 주요 회의는 무엇입니까?", "history": []},
+    {"text": "경주 APEC 정상회의는 어디에서 열리나요?", "history": []},
+    {"text": "What events are happening this week?", "history": []},
+    {"text": "Gyeongju East Palace Garden", "history": []},
+    {"text": "And what is its phone number?", "history": [
+        {"role": "user", "content": "Tell me about Gyeongju East Palace Garden."},
+        {"role": "assistant", "content": "Gyeongju East Palace Garden is a palace site and pond in Gyeongju."},
+    ]},
+]
+# Display order of the stages; anything else recorded is listed after these.
+CHATBOT_STAGES = ["detect", "summarize", "preprocess", "embed", "retrieve", "generate_first_token", "generate",
+                  "first_answer", "end_to_end"]
+API_STAGES = ["schedule", "embed", "retrieve", "results", "end_to_end"]
+
+def load_chunks():
+    with open(PROCESSED_CHUNKS_FILE, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def instrument_chatbot(args, recorder: LatencyRecorder):
+    """
+    Imports the chatbot (backend.chat.rag) with the selected stand-ins plugged
+    in and wraps its stage functions so their wall times are recorded.
+    Returns rag_chatbot.
+    """
+    if args.gemini == "stand-in":
+        # backend.chat.rag refuses to start without a key; the stand-in never uses it.
+        os.environ.setdefault("GEMINI_API_KEY_01", "offline-benchmark")
+    if args.vector_store == "stand-in":
+        # backend.chat.rag builds its store at import time, so the factory is swapped first.
+        import backend.utils.vector_store as vector_store_module
+        store = StandInVectorStore(load_chunks(), InjectedLatency(args.embed_ms, args.jitter, seed=1),
+                                   InjectedLatency(args.vector_ms, args.jitter, seed=2))
+        vector_store_module.create_vector_store = lambda **kwargs: store
+
+    import backend.chat.rag as rag
+
+    if args.gemini == "stand-in":
+        model = StandInGeminiModel(InjectedLatency(args.llm_ms, args.jitter, seed=3),
+                                   InjectedLatency(args.token_ms, args.jitter, seed=4))
+        rag.get_gemini_llm_model = lambda model_name=None: model
+
+    # rag_chatbot looks these up as module globals on every call.
+    rag.resolve_language_locally = recorder.timed("detect", rag.resolve_language_locally)
+    rag.detect_language_with_llm = recorder.timed("detect", rag.detect_language_with_llm)
+    rag.summarize_conversation_history = recorder.timed("summarize", rag.summarize_conversation_history)
+    rag.analyze_query = recorder.timed("preprocess", rag.analyze_query)
+    rag.stream_generated_text = recorder.timed_generator("generate", rag.stream_generated_text,
+                                                         first_item_stage="generate_first_token")
+    rag.vector_store.embed_query = recorder.timed("embed", rag.vector_store.embed_query)
+    rag.vector_store.query = recorder.timed("retrieve", rag.vector_store.query)
+    return rag.rag_chatbot
+
+def run_chatbot_turn(rag_chatbot, recorder: LatencyRecorder, query: dict, session_id: str):
+    recorder.start_turn()
+    start = time.perf_counter()
+    first = True
+    for _ in rag_chatbot(query["text"], list(query["history"]), session_id=session_id):
+        if first:
+            recorder.record("first_answer", time.perf_counter() - start)
+            first = False
+    recorder.record("end_to_end", time.perf_counter() - start)
+
+def instrument_api(args, recorder: LatencyRecorder):
+    """Imports the FastAPI module, plugs in the stand-in bundle if selected and wraps its stages."""
+    import backend.api.app as api
+
+    if args.api_bundle == "stand-in":
+        encoder = StandInQueryEncoder(InjectedLatency(args.encoder_ms, args.jitter, seed=5))
+        api.bundle = StandInServingBundle(load_chunks(), encoder)
+    else:
+        api.bundle.load()
+
+    api.schedule_results = recorder.timed("schedule", api.schedule_results)
+    api.encode_queries = recorder.timed("embed", api.encode_queries)
+    api.search_index = recorder.timed("retrieve", api.search_index)
+    api.build_query_results = recorder.timed("results", api.build_query_results)
+    return api.query_rag
+
+def run_api_query(query_rag, recorder: LatencyRecorder, query: dict, k: int):
+    recorder.start_turn()
+    start = time.perf_counter()
+    query_rag(query["text"], k)
+    recorder.record("end_to_end", time.perf_counter() - start)
+
+def run_benchmark(run_fn, recorder: LatencyRecorder, repeats: int, warmup: int, verbose: bool = False) -> dict:
+    # Anything the app still prints is discarded unless asked for.
+    with open(os.devnull, 'w', encoding='utf-8') as devnull, \
+            contextlib.nullcontext() if verbose else contextlib.redirect_stdout(devnull):
+        # Warm-up rounds load models and indexes; only the timed rounds are reported.
+        for round_number in range(warmup + repeats):
+            if round_number == warmup:
+                recorder.turns = []
+            for i, query in enumerate(BENCHMARK_QUERIES):
+                run_fn(query, f"benchmark-{round_number}-{i}")
+    return recorder.summary()
+
+def print_summary(title: str, summary: dict, stage_order: list):
+    print(f"\n--- {title} ---")
+    print(f"{'stage':>21} {'n':>5} {'mean':>9} {'p50':>9} {'p95':>9} {'p99':>9}  (ms)")
+    for stage in stage_order + sorted(set(summary) - set(stage_order)):
+        if stage in summary:
+            stats = summary[stage]
+            print(f"{stage:>21} {stats['count']:>5} {stats['mean_ms']:>9.2f} {stats['p50_ms']:>9.2f} "
+                  f"{stats['p95_ms']:>9.2f} {stats['p99_ms']:>9.2f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Stage-level latency benchmark for the Gradio chatbot and the retrieval API."
+    )
+    parser.add_argument("--target", choices=("chatbot", "api", "all"), default="all", help="What to benchmark.")
+    parser.add_argument("--gemini", choices=("stand-in", "live"), default="stand-in", help="LLM used by the chatbot.")
+    parser.add_argument("--vector-store", choices=("stand-in", "live"), default="stand-in",
+                        help="Chatbot vector store: the offline stand-in or the configured VECTOR_STORE_BACKEND.")
+    parser.add_argument("--api-bundle", choices=("stand-in", "live"), default="stand-in",
+                        help="API retrieval: an offline stand-in bundle or the built serving bundle.")
+    parser.add_argument("--llm-ms", type=float, default=400, help="Stand-in Gemini latency per call.")
+    parser.add_argument("--token-ms", type=float, default=15, help="Stand-in Gemini latency per streamed word.")
+    parser.add_argument("--embed-ms", type=float, default=120, help="Stand-in embedding API latency.")
+    parser.add_argument("--vector-ms", type=float, default=80, help="Stand-in Pinecone query latency.")
+    parser.add_argument("--encoder-ms", type=float, default=5, help="Stand-in API query encoder latency.")
+    parser.add_argument("--jitter", type=float, default=0.2, help="Injected latency spread, as a fraction.")
+    parser.add_argument("--repeats", type=int, default=5, help="Timed rounds over the query set.")
+    parser.add_argument("--warmup", type=int, default=1, help="Untimed rounds before measuring.")
+    parser.add_argument("--k", type=int, default=5, help="Results per API query.")
+    parser.add_argument("--warm-caches", action="store_true",
+                        help="Keep the answer and embedding caches on (default: off, to time every stage).")
+    parser.add_argument("--verbose", action="store_true", help="Show the app's own logging while benchmarking.")
+    parser.add_argument("--output", help="Write the summary as JSON (use as a later --baseline).")
+    parser.add_argument("--baseline", help="Summary JSON from an earlier run to compare against.")
+    parser.add_argument("--max-regression", type=float, default=0.2,
+                        help="Allowed p95 growth per stage over the baseline, as a fraction.")
+    parser.add_argument("--min-regression-ms", type=float, default=1.0,
+                        help="Ignore p95 growth smaller than this, whatever the fraction.")
+    args = parser.parse_args()
+
+    if not args.verbose and "LOG_LEVEL" not in os.environ:
+        # Logging was configured when the benchmark utilities were imported, so
+        # the project loggers are quieted directly rather than through LOG_LEVEL.
+        for name in PROJECT_LOGGERS:
+            logging.getLogger(name).setLevel(logging.WARNING)
+    if not args.warm_caches:
+        # Read by backend/chat/rag.py and backend/utils/cache_utils.py at import time.
+        os.environ.setdefault("ANSWER_CACHE_ENABLED", "false")
+        os.environ.setdefault("EMBEDDING_CACHE_MAX_ENTRIES", "0")
+
+    results = {}
+    if args.target in ("chatbot", "all"):
+        recorder = LatencyRecorder()
+        rag_chatbot = instrument_chatbot(args, recorder)
+        results["chatbot"] = run_benchmark(
+            lambda query, session_id: run_chatbot_turn(rag_chatbot, recorder, query, session_id),
+            recorder, args.repeats, args.warmup, args.verbose
+        )
+        print_summary(f"rag_chatbot (gemini={args.gemini}, vector store={args.vector_store})",
+                      results["chatbot"], CHATBOT_STAGES)
+    if args.target in ("api", "all"):
+        recorder = LatencyRecorder()
+        query_rag = instrument_api(args, recorder)
+        results["api"] = run_benchmark(
+            lambda query, session_id: run_api_query(query_rag, recorder, query, args.k),
+            recorder, args.repeats, args.warmup, args.verbose
+        )
+        print_summary(f"API query_rag (bundle={args.api_bundle}, k={args.k})", results["api"], API_STAGES)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({"config": vars(args), **results}, f, ensure_ascii=False, indent=4)
+        print(f"\nSaved summary to '{args.output}'.")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = [
+            (target, *regression)
+            for target, summary in results.items() if target in baseline
+            for regression in compare_to_baseline(summary, baseline[target], args.max_regression,
+                                                  args.min_regression_ms)
+        ]
+        if regressions:
+            print(f"\nLatency regressions (p95 more than {args.max_regression:.0%} and "
+                  f"{args.min_regression_ms} ms above baseline):")
+            for target, stage, baseline_ms, current_ms in regressions:
+                print(f"  {target}/{stage}: {baseline_ms:.2f} -> {current_ms:.2f} ms")
+            sys.exit(1)
+        print(f"\nNo stage regressed by more than {args.max_regression:.0%} at p95.")
@@ -0,0 +1,66 @@
+import argparse
+import json
+import os
+import sys
+
+# Dynamically adds the project root to sys.path to ensure module imports work correctly.
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, project_root)
+
+from backend.scripts.rag_pipeline import (
+    EMBEDDINGS_DIR, ROW_STORE_DIR, load_faiss_index, load_json_data, rerank_vectors_path
+)
+from backend.utils.row_store import COLUMNS_FILE, RowStore
+from backend.utils.serving_bundle import write_serving_bundle
+
+# --- Configuration ---
+INDEX_PATH = os.path.join(EMBEDDINGS_DIR, "apec2025_index.bin")
+METADATA_PATH = os.path.join(EMBEDDINGS_DIR, "apec2025_metadata.json")
+RAW_JSON_PATH = os.path.join("backend", "data", "raw", "apec2025_all_info_20250708_221755.json")
+SERVING_BUNDLE_DIR = os.path.join("backend", "data", "serving_bundle")
+DEFAULT_MODEL_NAME = "all-MiniLM-L6-v2"
+
+def load_rows(row_store_dir: str, metadata_path: str, raw_json_path: str):
+    """
+    Returns the (texts, metadatas) aligned with the index rows: from the row
+    store written by rag_pipeline if present, otherwise by re-chunking the raw
+    crawl and pairing it with the saved metadata file.
+    """
+    if os.path.exists(os.path.join(row_store_dir, COLUMNS_FILE)):
+        rows = RowStore(row_store_dir)
+        try:
+            return [rows.text(i) for i in range(len(rows))], [rows.metadata(i) for i in range(len(rows))]
+        finally:
+            rows.close()
+    with open(metadata_path, 'r', encoding='utf-8') as f:
+        metadatas = json.load(f)
+    texts, _ = load_json_data(raw_json_path)
+    return texts, metadatas
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Package the FAISS index, row-aligned texts/metadata and encoder reference for the API server."
+    )
+    parser.add_argument("--index", default=INDEX_PATH, help="FAISS index built by rag_pipeline.py.")
+    parser.add_argument("--row-store", default=ROW_STORE_DIR, help="Row store written by rag_pipeline.py.")
+    parser.add_argument("--metadata", default=METADATA_PATH, help="Metadata JSON, used when there is no row store.")
+    parser.add_argument("--raw-json", default=RAW_JSON_PATH, help="Raw crawl JSON, used when there is no row store.")
+    parser.add_argument("--model", help="Query encoder name (default: the one recorded with the index).")
+    parser.add_argument("--output", default=SERVING_BUNDLE_DIR, help="Bundle directory to (re)write.")
+    args = parser.parse_args()
+
+    index, index_params = load_faiss_index(args.index)
+    texts, metadatas = load_rows(args.row_store, args.metadata, args.raw_json)
+    if len(texts) != index.ntotal or len(metadatas) != index.ntotal:
+        print(f"Error: the index has {index.ntotal} vectors but there are {len(texts)} texts and "
+              f"{len(metadatas)} metadata rows. Rebuild the index with rag_pipeline.py first.")
+        sys.exit(1)
+
+    model_name = args.model or index_params.get('model_name', DEFAULT_MODEL_NAME)
+    # Saved by rag_pipeline only for compressed indexes built with a re-rank factor.
+    vectors_path = rerank_vectors_path(args.index)
+    manifest = write_serving_bundle(args.output, args.index, index_params, texts, metadatas, model_name,
+                                    rerank_vectors_path=vectors_path if os.path.exists(vectors_path) else None)
+    print(f"Wrote serving bundle {manifest['version']} ({manifest['rows']} rows, "
+          f"{manifest['index_type']}/{manifest['metric']}/{manifest['compression']}, encoder '{model_name}') "
+          f"to '{args.output}'.")
@@ -1,5 +1,12 @@
+import hashlib
 import json
 import os
+import sys
+
+# Dynamically adds the project root to sys.path to ensure module imports work correctly.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from backend.utils.cache_utils import file_content_version
+from backend.utils.event_index import EventIndex
 
 def process_content_node(content_node, metadata_prefix):
     """
@@ -235,12 +242,31 @@ def remove_duplicate_chunks(chunks):
             seen_content.add(normalized_content)
     return unique_chunks
 
+def compute_chunk_id(content: str) -> str:
+    """
+    Derives a stable chunk ID from the chunk content. Unlike sequential numbering,
+    the ID does not shift when other chunks are added or removed upstream.
+    """
+    digest = hashlib.sha256(content.strip().encode('utf-8')).hexdigest()
+    return f"chunk_{digest[:16]}"
+
+def compute_chunk_fingerprint(chunk) -> str:
+    """
+    Hashes content and metadata together, so a chunk whose text is unchanged but
+    whose metadata moved (e.g. a renamed section) is still detected as changed.
+    """
+    metadata = {k: v for k, v in chunk["metadata"].items() if k != "content_hash"}
+    payload = json.dumps({"content": chunk["content"].strip(), "metadata": metadata}, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
 def assign_chunk_ids(chunks):
     """
-    Assigns unique and sequential IDs to chunks after deduplication.
+    Assigns content-addressed IDs to chunks after deduplication, and records a
+    content+metadata fingerprint used by incremental index sync.
     """
-    for i, chunk in enumerate(chunks):
-        chunk['id'] = f"chunk_{i}"
+    for chunk in chunks:
+        chunk['id'] = compute_chunk_id(chunk["content"])
+        chunk["metadata"]["content_hash"] = compute_chunk_fingerprint(chunk)
     return chunks
 
 if __name__ == "__main__":
@@ -280,6 +306,13 @@ if __name__ == "__main__":
             json.dump(final_chunks, f, ensure_ascii=False, indent=4)
         print(f"Unique chunks saved to: {output_file_name}")
 
+        # Extract the event schedule once, so date and venue questions are index lookups.
+        event_index_file_name = os.path.join(output_directory, 'event_index.json')
+        event_index = EventIndex.from_chunks(final_chunks, source_version=file_content_version(output_file_name))
+        event_index.save(event_index_file_name)
+        print(f"Event index ({len(event_index.events)} dated, {len(event_index.undated_events)} undated events) "
+              f"saved to: {event_index_file_name}")
+
         # Providing sample chunks for verification. This helps confirm the chunking
         # logic works as intended for different content types.
         print("\n--- First few chunks after processing ---")
@@ -0,0 +1,224 @@
+import argparse
+import json
+import os
+import sys
+
+# Dynamically adds the project root to sys.path to ensure module imports work correctly.
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, project_root)
+
+from backend.utils.benchmark_utils import (
+    InjectedLatency, LatencyRecorder, StandInQueryEncoder, StandInVectorStore, compare_to_baseline, hashed_embedding
+)
+from backend.utils.retrieval_eval import (
+    DEFAULT_KS, compare_quality, evaluate_retriever, golden_set_fingerprint, load_golden_set, missing_relevant_ids
+)
+
+# --- Configuration ---
+GOLDEN_SET_FILE = os.path.join(project_root, "backend", "data", "eval", "retrieval_golden_v1.json")
+PINECONE_INDEX_NAME = "apec2027-chatbot"
+# Mirrors the chatbot's answer gate: mean score of the top 3 chunks vs. backend.chat.rag.CONFIDENCE_THRESHOLD.
+CONFIDENCE_THRESHOLD = 0.5
+CONFIDENCE_TOP_K = 3
+DEFAULT_MODEL_NAME = "all-MiniLM-L6-v2"
+
+def load_chunks(golden: dict) -> list:
+    with open(os.path.join(project_root, golden["chunks_file"]), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def faiss_retriever(args, chunks: list, recorder: LatencyRecorder):
+    """
+    The API's retrieval path: a FAISS index (type and compression as given)
+    built over the golden set's chunks, searched with the query encoder.
+    Returns (retrieve_fn, memory report).
+    """
+    import faiss
+    import numpy as np
+    from backend.scripts.rag_pipeline import build_faiss_index, prepare_vectors, search_index, search_scores_to_cosine
+
+    texts = [chunk["content"] for chunk in chunks]
+    if args.encoder == "stand-in":
+        encoder = StandInQueryEncoder(InjectedLatency(args.encoder_ms, args.jitter, seed=5))
+        # Documents are embedded without the injected latency, which only imitates query encoding.
+        embeddings = np.vstack([hashed_embedding(text, encoder.dimension) for text in texts])
+    else:
+        from backend.utils.encoders import create_query_encoder
+        encoder = create_query_encoder(args.model, backend=args.encoder)
+        embeddings = encoder.encode(texts)
+
+    index, params = build_faiss_index(embeddings, args.index_type, 'cosine', compression=args.compression,
+                                      nprobe=args.nprobe, ef_search=args.ef_search, rerank_factor=args.rerank_factor)
+    rerank_vectors = prepare_vectors(embeddings, 'cosine') if params['rerank_factor'] > 1 else None
+    memory = {
+        "index_bytes": len(faiss.serialize_index(index)),
+        "rerank_vectors_bytes": int(rerank_vectors.nbytes) if rerank_vectors is not None else 0,
+        "float32_vectors_bytes": int(prepare_vectors(embeddings, 'cosine').nbytes),
+    }
+    encode = recorder.timed("embed", encoder.encode)
+    search = recorder.timed("search", search_index)
+    ids = [chunk["id"] for chunk in chunks]
+
+    def retrieve(query_text: str, k: int) -> list:
+        scores, rows = search(index, params, encode([query_text]), k, rerank_vectors)
+        scores = search_scores_to_cosine(scores, params)
+        return [{"id": ids[row], "score": float(score)} for score, row in zip(scores[0], rows[0]) if row >= 0]
+
+    return retrieve, memory
+
+def vector_store_retriever(args, chunks: list, recorder: LatencyRecorder):
+    """
+    The chatbot's retrieval path through the VectorStore interface: Pinecone,
+    its offline stand-in, or an in-process FAISS / NumPy store.
+    Returns (retrieve_fn, memory report).
+    """
+    if args.vector_store == "stand-in":
+        store = StandInVectorStore(chunks, InjectedLatency(args.embed_ms, args.jitter, seed=1),
+                                   InjectedLatency(args.vector_ms, args.jitter, seed=2))
+        # BM25 postings are not comparable to a vector index, so no size is reported.
+        memory = {"index_bytes": None}
+    elif args.vector_store == "pinecone":
+        from backend.utils.vector_store import PineconeVectorStore
+        store = PineconeVectorStore(args.index_name)
+        store.warm_up()
+        # Pinecone holds the index server-side; there is no local footprint to measure.
+        memory = {"index_bytes": None}
+    else:
+        from backend.utils.vector_store import create_vector_store, faiss
+        store = create_vector_store(backend=args.vector_store, chunks_path=os.path.join(project_root, args.chunks_file))
+        if store.index is not None:
+            memory = {"index_bytes": len(faiss.serialize_index(store.index))}
+        else:
+            memory = {"index_bytes": int(store.embeddings.nbytes)}
+
+    embed = recorder.timed("embed", store.embed_query)
+    query = recorder.timed("search", store.query)
+
+    def retrieve(query_text: str, k: int) -> list:
+        return query(query_text, top_k=k, query_embedding=embed(query_text))
+
+    return retrieve, memory
+
+def run_target(build_retriever, args, golden: dict, chunks: list) -> dict:
+    recorder = LatencyRecorder()
+    retrieve, memory = build_retriever(args, chunks, recorder)
+    # Warm-up passes load models and open connections; only the timed passes are reported.
+    for _ in range(args.warmup):
+        for query in golden["queries"]:
+            retrieve(query["query"], max(args.ks))
+    recorder.turns = []
+    report = evaluate_retriever(golden, retrieve, recorder, ks=tuple(args.ks),
+                                confidence_threshold=args.confidence_threshold, confidence_k=CONFIDENCE_TOP_K,
+                                repeats=args.repeats)
+    report["memory"] = memory
+    return report
+
+def print_report(title: str, report: dict):
+    quality = report["quality"]
+    print(f"\n--- {title} ---")
+    print(f"queries: {quality['queries']}   MRR: {quality['mrr']:.3f}   " +
+          "   ".join(f"{metric}: {value:.3f}" for metric, value in quality.items() if metric.startswith("recall@")))
+    for language, stats in report["by_language"].items():
+        print(f"  {language:>4} ({stats['queries']:>2}): MRR {stats['mrr']:.3f}   " +
+              "   ".join(f"{metric} {value:.3f}" for metric, value in stats.items() if metric.startswith("recall@")))
+    if "confidence" in report:
+        confidence = report["confidence"]
+        print(f"confidence >= {confidence['threshold']}: in-scope answered {confidence['in_scope_answered']:.0%}, "
+              f"out-of-scope rejected {confidence['out_of_scope_rejected']:.0%}")
+    for stage, stats in report["latency"].items():
+        print(f"{stage:>10} latency (ms): mean {stats['mean_ms']:.2f}   p50 {stats['p50_ms']:.2f}   "
+              f"p95 {stats['p95_ms']:.2f}   p99 {stats['p99_ms']:.2f}")
+    memory = ", ".join(f"{key} {value:,}" for key, value in report["memory"].items() if value is not None)
+    print(f"memory: {memory or 'n/a'}")
+    misses = [row["id"] for row in report["per_query"] if "reciprocal_rank" in row and not row["reciprocal_rank"]]
+    if misses:
+        print(f"no relevant chunk retrieved: {', '.join(misses)}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Retrieval quality (recall@k, MRR), latency and index memory over a golden query set."
+    )
+    parser.add_argument("--golden", default=GOLDEN_SET_FILE, help="Golden set JSON (queries with relevant chunk IDs).")
+    parser.add_argument("--target", choices=("api", "chatbot", "all"), default="all",
+                        help="api = local FAISS index; chatbot = the VectorStore path (Pinecone or stand-in).")
+    parser.add_argument("--ks", type=int, nargs="+", default=list(DEFAULT_KS), help="Cut-offs for recall@k.")
+    # API (FAISS) path.
+    parser.add_argument("--encoder", choices=("stand-in", "sentence-transformers", "onnx-int8", "onnx-fp32"),
+                        default="stand-in", help="Query/document encoder for the FAISS path.")
+    parser.add_argument("--model", default=DEFAULT_MODEL_NAME, help="Encoder model name.")
+    parser.add_argument("--index-type", choices=("flat", "ivf_flat", "ivf_pq", "hnsw"), default="flat")
+    parser.add_argument("--compression", choices=("none", "fp16", "int8", "pq"), default="none")
+    parser.add_argument("--nprobe", type=int, help="IVF cells searched per query.")
+    parser.add_argument("--ef-search", type=int, help="HNSW query-time beam width.")
+    parser.add_argument("--rerank-factor", type=int, help="Re-score rerank_factor * k candidates exactly.")
+    parser.add_argument("--encoder-ms", type=float, default=5, help="Stand-in query encoder latency.")
+    # Chatbot (VectorStore) path.
+    parser.add_argument("--vector-store", choices=("stand-in", "pinecone", "faiss", "numpy"), default="stand-in",
+                        help="Store used for the chatbot path.")
+    parser.add_argument("--index-name", default=PINECONE_INDEX_NAME, help="Pinecone index name.")
+    parser.add_argument("--embed-ms", type=float, default=120, help="Stand-in embedding API latency.")
+    parser.add_argument("--vector-ms", type=float, default=80, help="Stand-in Pinecone query latency.")
+    parser.add_argument("--jitter", type=float, default=0.2, help="Injected latency spread, as a fraction.")
+    # Both paths.
+    parser.add_argument("--confidence-threshold", type=float, default=CONFIDENCE_THRESHOLD,
+                        help="Answer gate to evaluate (the chatbot's CONFIDENCE_THRESHOLD).")
+    parser.add_argument("--repeats", type=int, default=3, help="Timed runs of each query.")
+    parser.add_argument("--warmup", type=int, default=1, help="Untimed passes over the golden set first.")
+    parser.add_argument("--output", help="Write the full report as JSON (use as a later --baseline).")
+    parser.add_argument("--baseline", help="Report JSON from an earlier run to compare against.")
+    parser.add_argument("--max-quality-drop", type=float, default=0.02,
+                        help="Allowed absolute drop of MRR or any recall@k.")
+    parser.add_argument("--max-regression", type=float, default=0.2,
+                        help="Allowed p95 latency growth per stage, as a fraction.")
+    parser.add_argument("--min-regression-ms", type=float, default=1.0,
+                        help="Ignore p95 growth smaller than this, whatever the fraction.")
+    args = parser.parse_args()
+
+    golden = load_golden_set(args.golden)
+    chunks = load_chunks(golden)
+    args.chunks_file = golden["chunks_file"]
+    fingerprint = golden_set_fingerprint(golden)
+    print(f"Golden set {golden['version']} ({fingerprint}): {len(golden['queries'])} queries, {len(chunks)} chunks.")
+    missing = missing_relevant_ids(golden, [chunk["id"] for chunk in chunks])
+    if missing:
+        print(f"WARNING: {len(missing)} relevant chunk IDs are not in '{golden['chunks_file']}' "
+              f"(re-chunked corpus?); recall is capped until the golden set is relabelled: {', '.join(missing)}")
+
+    results = {}
+    if args.target in ("api", "all"):
+        results["api"] = run_target(faiss_retriever, args, golden, chunks)
+        print_report(f"API FAISS (encoder={args.encoder}, index={args.index_type}, compression={args.compression})",
+                     results["api"])
+    if args.target in ("chatbot", "all"):
+        results["chatbot"] = run_target(vector_store_retriever, args, golden, chunks)
+        print_report(f"Chatbot vector store ({args.vector_store})", results["chatbot"])
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({"golden": {"version": golden["version"], "fingerprint": fingerprint,
+                                  "missing_relevant_ids": missing},
+                       "config": vars(args), **results}, f, ensure_ascii=False, indent=4)
+        print(f"\nSaved report to '{args.output}'.")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline["golden"]["fingerprint"] != fingerprint:
+            print(f"\nBaseline was run on golden set {baseline['golden']['version']} "
+                  f"({baseline['golden']['fingerprint']}); results are not comparable.")
+            sys.exit(2)
+        failures = []
+        for target, report in results.items():
+            if target not in baseline:
+                continue
+            for metric, before, after in compare_quality(report, baseline[target], args.max_quality_drop):
+                failures.append(f"{target}/{metric}: {before:.3f} -> {after:.3f}")
+            for stage, before, after in compare_to_baseline(report["latency"], baseline[target]["latency"],
+                                                            args.max_regression, args.min_regression_ms):
+                failures.append(f"{target}/{stage} p95: {before:.2f} -> {after:.2f} ms")
+        if failures:
+            print(f"\nRegressions against '{args.baseline}':")
+            for failure in failures:
+                print(f"  {failure}")
+            sys.exit(1)
+        print(f"\nNo quality drop above {args.max_quality_drop} and no p95 regression above "
+              f"{args.max_regression:.0%} against the baseline.")
@@ -0,0 +1,56 @@
+import argparse
+import json
+import os
+import sys
+
+# Dynamically adds the project root to sys.path to ensure module imports work correctly.
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, project_root)
+
+from backend.utils.encoders import (
+    OnnxEncoder, SentenceTransformerEncoder, check_encoder_parity, export_onnx_encoder, onnx_encoder_dir
+)
+
+# --- Configuration ---
+DEFAULT_MODEL_NAME = "all-MiniLM-L6-v2"
+PROCESSED_CHUNKS_FILE = os.path.join("backend", "data", "processed", "refined_processed_chunks_v4.json")
+# Short questions like the ones users send, checked alongside chunk texts.
+SAMPLE_QUERIES = [
+    "Where is Informal Senior Officials’ Meeting (ISOM) held?",
+    "When does APEC 2025 take place?",
+    "Gyeongju East Palace Garden",
+    "APEC 2025 ở đâu?",
+    "경주 APEC 정상회의 일정",
+]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the query encoder to ONNX (int8) and check parity.")
+    parser.add_argument("--model", default=DEFAULT_MODEL_NAME, help="SentenceTransformer model to export.")
+    parser.add_argument("--output", help="Output directory (default: ONNX_ENCODER_DIR/<model>-onnx).")
+    parser.add_argument("--no-quantize", action="store_true", help="Only write the float32 graph.")
+    parser.add_argument("--sample-size", type=int, default=200, help="Chunk texts used for the parity check.")
+    parser.add_argument("--min-cosine", type=float, default=0.99, help="Lowest acceptable per-text cosine.")
+    args = parser.parse_args()
+
+    output_dir = args.output or onnx_encoder_dir(args.model)
+    export_onnx_encoder(args.model, output_dir, quantize=not args.no_quantize)
+    print(f"Exported '{args.model}' to '{output_dir}'.")
+
+    with open(PROCESSED_CHUNKS_FILE, 'r', encoding='utf-8') as f:
+        chunks = json.load(f)
+    texts = SAMPLE_QUERIES + [chunk['content'] for chunk in chunks[:args.sample_size]]
+
+    reference = SentenceTransformerEncoder(args.model)
+    candidate = OnnxEncoder(output_dir, quantized=not args.no_quantize)
+    report = check_encoder_parity(reference, candidate, texts, min_cosine=args.min_cosine)
+    single_query = check_encoder_parity(reference, candidate, SAMPLE_QUERIES, min_cosine=args.min_cosine, batch_size=1)
+
+    print(f"\n--- Parity: {candidate.name} vs {reference.name} ({report['texts']} texts) ---")
+    print(f"  Cosine: mean={report['mean_cosine']:.4f}  min={report['min_cosine']:.4f}")
+    print(f"  Nearest-neighbour agreement: {report['neighbour_agreement']:.2%}")
+    print(f"  Batch encode: {report['reference_ms_per_text']:.2f} -> {report['candidate_ms_per_text']:.2f} ms/text")
+    print(f"  Single query: {single_query['reference_ms_per_text']:.2f} -> {single_query['candidate_ms_per_text']:.2f} ms")
+    if not report['passed']:
+        print(f"Parity check failed: min cosine {report['min_cosine']:.4f} < {args.min_cosine}.")
+        sys.exit(1)
+    print("Parity check passed. Serve it with QUERY_ENCODER_BACKEND=onnx-int8.")
@@ -1,43 +1,308 @@
+import argparse
+import hashlib
 import json
 import os
 import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # Dynamically adds the project root to sys.path to ensure module imports work correctly.
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
 sys.path.insert(0, project_root)
 
 # Imports necessary functions from the Pinecone utility module.
-from backend.utils.pinecone_utils import upsert_chunks_to_pinecone, initialize_pinecone_client, pc as pinecone_client_instance
+from backend.utils.pinecone_utils import (
+    initialize_pinecone_client, create_or_connect_pinecone_index,
+    get_gemini_embeddings, build_pinecone_vectors
+)
+from backend.utils.cache_utils import file_content_version
+from backend.utils.retry_utils import retry_with_backoff
 
 # Configuration constants for the processed data file and Pinecone index.
 PROCESSED_CHUNKS_FILE = 'backend/data/processed/refined_processed_chunks_v4.json'
-PINECONE_INDEX_NAME = "apec2027-chatbot" 
+PINECONE_INDEX_NAME = "apec2027-chatbot"
+# Per-batch progress and the final reconciliation report are written here,
+# so an interrupted ingestion resumes without repeating finished batches.
+CHECKPOINT_DIR = 'backend/data/checkpoints'
+
+UPSERT_BATCH_SIZE = 100
+UPSERT_WORKERS = 4
+MAX_ATTEMPTS = 6
+# Pinecone's fetch and delete endpoints accept a limited number of IDs per request.
+FETCH_BATCH_SIZE = 100
+DELETE_BATCH_SIZE = 1000
+# Every chunk ID produced by chunk_data.assign_chunk_ids starts with this prefix.
+CHUNK_ID_PREFIX = "chunk_"
+# Upserts to serverless indexes become visible to fetch after a short delay, so
+# reconciliation re-checks missing IDs a few times before reporting them.
+RECONCILE_ATTEMPTS = 5
+RECONCILE_DELAY_SECONDS = 3.0
+
+class IngestionCheckpoint:
+    """
+    On-disk record of which batches of a given chunks file have been fully
+    upserted. It is rewritten atomically after every batch, and discarded
+    automatically when the chunks file or batch size changes.
+    """
+
+    def __init__(self, path: str, source_version: str, batch_size: int):
+        self.path = path
+        self.source_version = source_version
+        self.batch_size = batch_size
+        self.completed_batches = set()
+        self.failed_ids = {}  # batch number -> chunk IDs that could not be upserted
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path: str, source_version: str, batch_size: int):
+        checkpoint = cls(path, source_version, batch_size)
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('source_version') == source_version and data.get('batch_size') == batch_size:
+                checkpoint.completed_batches = set(data.get('completed_batches', []))
+                checkpoint.failed_ids = {int(k): v for k, v in data.get('failed_ids', {}).items()}
+                print(f"Resuming from checkpoint: {len(checkpoint.completed_batches)} batches already done.")
+            else:
+                print("Checkpoint belongs to a different chunks file or batch size. Starting over.")
+        return checkpoint
+
+    def mark_batch(self, batch_number: int, failed_ids: list):
+        with self._lock:
+            if failed_ids:
+                self.failed_ids[batch_number] = failed_ids
+            else:
+                self.completed_batches.add(batch_number)
+                self.failed_ids.pop(batch_number, None)
+            self._save()
+
+    def _save(self):
+        # Caller holds the lock. Writes to a temp file first so a crash never
+        # leaves a truncated checkpoint behind.
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'source_version': self.source_version,
+                'batch_size': self.batch_size,
+                'completed_batches': sorted(self.completed_batches),
+                'failed_ids': {str(k): v for k, v in self.failed_ids.items()},
+                'updated_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            }, f, indent=2)
+        os.replace(temp_path, self.path)
+
+def ingest_batch(pinecone_index, batch_number: int, batch: list):
+    """
+    Embeds and upserts one batch, retrying rate limits and transient errors.
+    Returns the IDs of chunks that could not be upserted.
+    """
+    embeddings = get_gemini_embeddings([chunk["content"] for chunk in batch], max_attempts=MAX_ATTEMPTS)
+    vectors, failed_ids = build_pinecone_vectors(batch, embeddings)
+    if vectors:
+        try:
+            retry_with_backoff(pinecone_index.upsert, vectors=vectors, max_attempts=MAX_ATTEMPTS,
+                               description=f"upsert of batch {batch_number}")
+        except Exception as e:
+            print(f"Error upserting batch {batch_number}: {e}")
+            failed_ids.extend(vector["id"] for vector in vectors)
+    return failed_ids
+
+def run_ingestion_job(chunks: list, index_name: str, checkpoint: IngestionCheckpoint, workers: int = UPSERT_WORKERS):
+    """
+    Ingests all batches not yet recorded in the checkpoint using a pool of
+    workers; each worker embeds and upserts whole batches, so embedding of one
+    batch overlaps with upserts of others.
+    """
+    pinecone_index = create_or_connect_pinecone_index(index_name)
+    batch_size = checkpoint.batch_size
+    pending = [
+        (batch_number, chunks[start:start + batch_size])
+        for batch_number, start in enumerate(range(0, len(chunks), batch_size))
+        if batch_number not in checkpoint.completed_batches
+    ]
+    print(f"{len(pending)} batches to ingest ({len(checkpoint.completed_batches)} already done).")
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ingest") as executor:
+        futures = {
+            executor.submit(ingest_batch, pinecone_index, batch_number, batch): batch_number
+            for batch_number, batch in pending
+        }
+        for done_count, future in enumerate(as_completed(futures), start=1):
+            batch_number = futures[future]
+            failed_ids = future.result()
+            checkpoint.mark_batch(batch_number, failed_ids)
+            status = f"{len(failed_ids)} chunks failed" if failed_ids else "ok"
+            print(f"Batch {batch_number} done ({done_count}/{len(pending)}): {status}.")
+    return pinecone_index
+
+def fetch_present_ids(pinecone_index, ids: list) -> set:
+    """Returns the subset of `ids` currently stored in the index."""
+    present_ids = set()
+    for start in range(0, len(ids), FETCH_BATCH_SIZE):
+        response = retry_with_backoff(pinecone_index.fetch, ids=ids[start:start + FETCH_BATCH_SIZE],
+                                      max_attempts=MAX_ATTEMPTS, description="reconciliation fetch")
+        present_ids.update(response.vectors.keys())
+    return present_ids
+
+def reconcile_index(pinecone_index, expected_ids: list, attempts: int = RECONCILE_ATTEMPTS,
+                    delay_seconds: float = RECONCILE_DELAY_SECONDS) -> dict:
+    """
+    Compares the expected chunk IDs with what is actually stored in the index.
+    IDs not found are fetched again up to `attempts` times, `delay_seconds`
+    apart, so freshly upserted vectors are not reported missing.
+    """
+    missing_ids = list(expected_ids)
+    for attempt in range(attempts):
+        if attempt:
+            time.sleep(delay_seconds)
+        present_ids = fetch_present_ids(pinecone_index, missing_ids)
+        missing_ids = [chunk_id for chunk_id in missing_ids if chunk_id not in present_ids]
+        if not missing_ids:
+            break
+
+    return {
+        'expected': len(expected_ids),
+        'upserted': len(expected_ids) - len(missing_ids),
+        'missing': len(missing_ids),
+        'missing_ids': missing_ids,
+        'checked_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
+def reupsert_missing(pinecone_index, chunks: list, missing_ids: list, batch_size: int) -> list:
+    """
+    Embeds and upserts the chunks with the given IDs again. Their batches are
+    already marked done in the checkpoint, so a plain re-run would skip them.
+    Returns the IDs that failed again.
+    """
+    missing = set(missing_ids)
+    retry_chunks = [chunk for chunk in chunks if chunk["id"] in missing]
+    failed_ids = []
+    for batch_number, start in enumerate(range(0, len(retry_chunks), batch_size)):
+        failed_ids.extend(ingest_batch(pinecone_index, batch_number, retry_chunks[start:start + batch_size]))
+    return failed_ids
+
+def list_indexed_ids(pinecone_index, prefix: str = CHUNK_ID_PREFIX) -> set:
+    """Lists every vector ID in the index that starts with the chunk prefix."""
+    indexed_ids = set()
+    for id_page in pinecone_index.list(prefix=prefix):
+        indexed_ids.update(id_page)
+    return indexed_ids
+
+def fetch_content_hashes(pinecone_index, ids: list) -> dict:
+    """Returns {id: content_hash} from the metadata stored with each vector."""
+    content_hashes = {}
+    for start in range(0, len(ids), FETCH_BATCH_SIZE):
+        response = retry_with_backoff(pinecone_index.fetch, ids=ids[start:start + FETCH_BATCH_SIZE],
+                                      max_attempts=MAX_ATTEMPTS, description="content hash fetch")
+        for vector_id, vector in response.vectors.items():
+            content_hashes[vector_id] = (vector.metadata or {}).get('content_hash')
+    return content_hashes
+
+def plan_index_sync(pinecone_index, chunks: list) -> dict:
+    """
+    Diffs the new chunk set against the index. Chunk IDs are content hashes, so a
+    new ID means new content; IDs present on both sides are compared by their
+    content+metadata fingerprint.
+    """
+    indexed_ids = list_indexed_ids(pinecone_index)
+    chunks_by_id = {chunk["id"]: chunk for chunk in chunks}
+    shared_ids = [chunk_id for chunk_id in chunks_by_id if chunk_id in indexed_ids]
+    indexed_hashes = fetch_content_hashes(pinecone_index, shared_ids)
+
+    new_chunks = [chunk for chunk_id, chunk in chunks_by_id.items() if chunk_id not in indexed_ids]
+    changed_chunks = [
+        chunks_by_id[chunk_id] for chunk_id in shared_ids
+        if indexed_hashes.get(chunk_id) != chunks_by_id[chunk_id]["metadata"].get("content_hash")
+    ]
+    removed_ids = sorted(indexed_ids - set(chunks_by_id))
+    return {
+        'new': new_chunks,
+        'changed': changed_chunks,
+        'removed_ids': removed_ids,
+        'unchanged': len(shared_ids) - len(changed_chunks),
+    }
+
+def delete_ids(pinecone_index, ids: list):
+    for start in range(0, len(ids), DELETE_BATCH_SIZE):
+        retry_with_backoff(pinecone_index.delete, ids=ids[start:start + DELETE_BATCH_SIZE],
+                           max_attempts=MAX_ATTEMPTS, description="delete of removed chunks")
+
+def run_sync_job(chunks: list, index_name: str, batch_size: int, workers: int):
+    """
+    Incremental sync: embeds and upserts only new or changed chunks and deletes
+    chunks that no longer exist, so cost follows the size of the change.
+    """
+    pinecone_index = create_or_connect_pinecone_index(index_name)
+    plan = plan_index_sync(pinecone_index, chunks)
+    print(f"Sync plan: {len(plan['new'])} new, {len(plan['changed'])} changed, "
+          f"{len(plan['removed_ids'])} removed, {plan['unchanged']} unchanged.")
+
+    to_upsert = plan['new'] + plan['changed']
+    if to_upsert:
+        # The checkpoint is keyed by the exact set of chunks to upsert, so a rerun
+        # after a crash resumes this sync instead of mixing it with another one.
+        sync_version = hashlib.sha256(",".join(sorted(chunk["id"] for chunk in to_upsert)).encode()).hexdigest()[:16]
+        checkpoint_path = os.path.join(CHECKPOINT_DIR, f"{index_name}_sync.json")
+        checkpoint = IngestionCheckpoint.load(checkpoint_path, sync_version, batch_size)
+        run_ingestion_job(to_upsert, index_name, checkpoint, workers=workers)
+    if plan['removed_ids']:
+        delete_ids(pinecone_index, plan['removed_ids'])
+        print(f"Deleted {len(plan['removed_ids'])} chunks that no longer exist.")
+    return pinecone_index
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Resumable ingestion of processed chunks into Pinecone.")
+    parser.add_argument("--chunks-file", default=PROCESSED_CHUNKS_FILE)
+    parser.add_argument("--index-name", default=PINECONE_INDEX_NAME)
+    parser.add_argument("--batch-size", type=int, default=UPSERT_BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=UPSERT_WORKERS)
+    parser.add_argument("--reset", action="store_true", help="Ignore any existing checkpoint and ingest everything.")
+    parser.add_argument("--sync", action="store_true",
+                        help="Only upsert new or changed chunks and delete removed ones, based on content-hash IDs.")
+    args = parser.parse_args()
+
     # Checks if the processed chunks file exists before attempting to load data.
-    if not os.path.exists(PROCESSED_CHUNKS_FILE):
-        print(f"Error: Processed chunks file not found at '{PROCESSED_CHUNKS_FILE}'.")
-        print("Please ensure 'chunk_apec_data.py' has been run to generate this file.")
+    if not os.path.exists(args.chunks_file):
+        print(f"Error: Processed chunks file not found at '{args.chunks_file}'.")
+        print("Please ensure 'chunk_data.py' has been run to generate this file.")
     else:
-        print(f"Loading chunks from '{PROCESSED_CHUNKS_FILE}'...")
+        print(f"Loading chunks from '{args.chunks_file}'...")
         try:
-            with open(PROCESSED_CHUNKS_FILE, 'r', encoding='utf-8') as f:
+            with open(args.chunks_file, 'r', encoding='utf-8') as f:
                 chunks_to_upsert = json.load(f)
             print(f"Successfully loaded {len(chunks_to_upsert)} chunks.")
 
             # Initializes the Pinecone client and then upserts the loaded chunks.
-            # This sequential process ensures Pinecone is ready before data transfer.
-            initialize_pinecone_client() 
-            upsert_chunks_to_pinecone(PINECONE_INDEX_NAME, chunks_to_upsert)
-            print(f"Data upsert to Pinecone index '{PINECONE_INDEX_NAME}' complete.")
-            
-            # Optional: Verifies the total record count in the Pinecone index.
-            # This step provides immediate confirmation of successful data ingestion.
-            if pinecone_client_instance:
-                index_stats = pinecone_client_instance.describe_index_stats(PINECONE_INDEX_NAME)
-                print(f"Total records in '{PINECONE_INDEX_NAME}': {index_stats.total_vector_count}")
+            initialize_pinecone_client()
+            if args.sync:
+                pinecone_index = run_sync_job(chunks_to_upsert, args.index_name, args.batch_size, args.workers)
+            else:
+                checkpoint_path = os.path.join(CHECKPOINT_DIR, f"{args.index_name}_ingest.json")
+                if args.reset and os.path.exists(checkpoint_path):
+                    os.remove(checkpoint_path)
+                checkpoint = IngestionCheckpoint.load(checkpoint_path, file_content_version(args.chunks_file), args.batch_size)
+                pinecone_index = run_ingestion_job(chunks_to_upsert, args.index_name, checkpoint, workers=args.workers)
+            print(f"Data upsert to Pinecone index '{args.index_name}' complete.")
+
+            # Verifies that every expected ID actually landed in the index; missing
+            # chunks are upserted once more and checked again.
+            expected_ids = [chunk["id"] for chunk in chunks_to_upsert]
+            report = reconcile_index(pinecone_index, expected_ids)
+            if report['missing']:
+                print(f"{report['missing']} chunks missing after upsert. Upserting them again...")
+                reupsert_missing(pinecone_index, chunks_to_upsert, report['missing_ids'], args.batch_size)
+                report = reconcile_index(pinecone_index, expected_ids)
+            report_path = os.path.join(CHECKPOINT_DIR, f"{args.index_name}_reconciliation.json")
+            with open(report_path, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2)
+            print(f"Reconciliation: {report['upserted']}/{report['expected']} chunks present, {report['missing']} missing.")
+            if report['missing']:
+                print(f"Missing IDs (first 20): {report['missing_ids'][:20]}. "
+                      f"Re-run this script with --sync to upsert them again.")
+            print(f"Full report written to '{report_path}'.")
 
         except json.JSONDecodeError as e:
-            print(f"Error decoding JSON from '{PROCESSED_CHUNKS_FILE}': {e}")
+            print(f"Error decoding JSON from '{args.chunks_file}': {e}")
         except Exception as e:
-            print(f"An unexpected error occurred during data upsert to Pinecone: {e}")
\ No newline at end of file
+            print(f"An unexpected error occurred during data upsert to Pinecone: {e}")
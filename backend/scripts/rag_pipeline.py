@@ -1,12 +1,23 @@
+import argparse
 import json
 import os
-from sentence_transformers import SentenceTransformer
+import sys
+import time
 import faiss
 import numpy as np
 
+# Adds the project root to sys.path so the script also runs as a plain file.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from backend.utils.logging_utils import get_logger
+from backend.utils.row_store import write_row_store
+
+logger = get_logger(__name__)
+
 # Defines the output directories for raw data and generated embeddings.
 RAW_DATA_DIR = "backend\\data\\raw"
 EMBEDDINGS_DIR = "backend/data/embeddings"
+ROW_STORE_DIR = os.path.join(EMBEDDINGS_DIR, "apec2025_rows")
+INDEX_PATH = os.path.join(EMBEDDINGS_DIR, "apec2025_index.bin")
 os.makedirs(EMBEDDINGS_DIR, exist_ok=True)
 
 def load_json_data(json_file_path):
@@ -104,56 +115,379 @@ def load_json_data(json_file_path):
     
     return chunks, metadata
 
-def create_embeddings(chunks, metadata, model_name='all-MiniLM-L6-v2'):
+# Supported FAISS index layouts. 'flat' is exact brute force; the others are
+# approximate and keep search cost sublinear as the corpus grows.
+INDEX_TYPES = ('flat', 'ivf_flat', 'ivf_pq', 'hnsw')
+DEFAULT_INDEX_PARAMS = {
+    'nlist': None,          # IVF cells; None = about 4 * sqrt(n), capped by n
+    'nprobe': 8,            # IVF cells visited per query
+    'pq_m': 16,             # PQ sub-quantizers (must divide the dimension)
+    'pq_nbits': 8,          # bits per PQ code
+    'hnsw_m': 32,           # HNSW graph degree
+    'ef_construction': 200, # HNSW build-time beam width
+    'ef_search': 64,        # HNSW query-time beam width
+    'rerank_factor': 0,     # compressed indexes: re-score rerank_factor * k candidates exactly (0 = off)
+}
+
+# Vector storage inside the index: float32 ('none'), float16, scalar int8 or
+# product quantization (pq_m bytes per vector with 8-bit codes).
+COMPRESSION_TYPES = ('none', 'fp16', 'int8', 'pq')
+SCALAR_QUANTIZER_TYPES = {
+    'fp16': faiss.ScalarQuantizer.QT_fp16,
+    'int8': faiss.ScalarQuantizer.QT_8bit,
+}
+def index_params_path(index_path: str) -> str:
+    """Build/search parameters are stored next to the index file."""
+    return os.path.splitext(index_path)[0] + '_params.json'
+
+def prepare_vectors(vectors, metric: str):
+    """Returns a float32 copy of the vectors in index space (L2-normalized for cosine)."""
+    vectors = np.array(vectors, dtype='float32', ndmin=2)
+    if metric == 'cosine':
+        faiss.normalize_L2(vectors)
+    return vectors
+
+def build_faiss_index(embeddings, index_type: str = 'flat', metric: str = 'cosine', compression: str = 'none', **params):
+    """
+    Builds a FAISS index of the requested type over the embeddings.
+    With metric='cosine' the vectors are L2-normalized and searched by inner
+    product; metric='l2' keeps raw vectors and L2 distance (legacy layout).
+    `compression` stores the vectors as float16 ('fp16'), scalar int8 ('int8')
+    or product-quantized codes ('pq') instead of float32; pair it with
+    search_index(rerank_vectors=...) to restore exact scores on the candidates.
+    Returns (index, params) where params records everything needed to reload
+    and search the index the same way.
+    """
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type '{index_type}'. Choose one of {INDEX_TYPES}.")
+    if metric not in ('cosine', 'l2'):
+        raise ValueError(f"Unknown metric '{metric}'. Choose 'cosine' or 'l2'.")
+
+    vectors = prepare_vectors(embeddings, metric)
+    n, dimension = vectors.shape
+    faiss_metric = faiss.METRIC_INNER_PRODUCT if metric == 'cosine' else faiss.METRIC_L2
+
+    params = {**DEFAULT_INDEX_PARAMS, **{k: v for k, v in params.items() if v is not None}}
+    params.update({'index_type': index_type, 'metric': metric, 'compression': compression,
+                   'dimension': dimension, 'ntotal': n})
+    if compression not in COMPRESSION_TYPES:
+        raise ValueError(f"Unknown compression '{compression}'. Choose one of {COMPRESSION_TYPES}.")
+    if index_type == 'ivf_pq' and compression not in ('none', 'pq'):
+        raise ValueError("ivf_pq already stores PQ codes; use compression 'none' or 'pq'.")
+    if index_type == 'ivf_pq':
+        params['compression'] = compression = 'pq'
+    if compression == 'pq':
+        if dimension % params['pq_m'] != 0:
+            raise ValueError(f"pq_m={params['pq_m']} must divide the embedding dimension {dimension}.")
+        # PQ codebooks need at least 2^nbits training points.
+        while params['pq_nbits'] > 1 and 2 ** params['pq_nbits'] > n:
+            params['pq_nbits'] -= 1
+    scalar_type = SCALAR_QUANTIZER_TYPES.get(compression)
+
+    if index_type == 'flat':
+        if scalar_type is not None:
+            index = faiss.IndexScalarQuantizer(dimension, scalar_type, faiss_metric)
+        elif compression == 'pq':
+            index = faiss.IndexPQ(dimension, params['pq_m'], params['pq_nbits'], faiss_metric)
+        else:
+            index = faiss.IndexFlatIP(dimension) if metric == 'cosine' else faiss.IndexFlatL2(dimension)
+    elif index_type in ('ivf_flat', 'ivf_pq'):
+        nlist = params['nlist'] or int(4 * np.sqrt(n))
+        # k-means wants roughly 39+ training points per cell; small corpora get fewer cells.
+        nlist = max(1, min(nlist, n // 39))
+        params['nlist'] = nlist
+        quantizer = faiss.IndexFlatIP(dimension) if metric == 'cosine' else faiss.IndexFlatL2(dimension)
+        if scalar_type is not None:
+            index = faiss.IndexIVFScalarQuantizer(quantizer, dimension, nlist, scalar_type, faiss_metric)
+        elif compression == 'pq':
+            index = faiss.IndexIVFPQ(quantizer, dimension, nlist, params['pq_m'], params['pq_nbits'], faiss_metric)
+        else:
+            index = faiss.IndexIVFFlat(quantizer, dimension, nlist, faiss_metric)
+        index.nprobe = min(params['nprobe'], nlist)
+        params['nprobe'] = index.nprobe
+    else:
+        if scalar_type is not None:
+            index = faiss.IndexHNSWSQ(dimension, scalar_type, params['hnsw_m'], faiss_metric)
+        elif compression == 'pq':
+            index = faiss.IndexHNSWPQ(dimension, params['pq_m'], params['hnsw_m'], params['pq_nbits'], faiss_metric)
+        else:
+            index = faiss.IndexHNSWFlat(dimension, params['hnsw_m'], faiss_metric)
+        index.hnsw.efConstruction = params['ef_construction']
+        index.hnsw.efSearch = params['ef_search']
+
+    if not index.is_trained:
+        index.train(vectors)
+    index.add(vectors)
+    return index, params
+
+def apply_search_params(index, params: dict):
+    """Applies the stored query-time parameters (nprobe, efSearch) to a loaded index."""
+    if params.get('index_type') in ('ivf_flat', 'ivf_pq'):
+        faiss.extract_index_ivf(index).nprobe = params['nprobe']
+    elif params.get('index_type') == 'hnsw':
+        index.hnsw.efSearch = params['ef_search']
+    return index
+
+def rerank_vectors_path(index_path: str) -> str:
+    """Full-precision vectors for exact re-ranking are stored next to the index file."""
+    return os.path.splitext(index_path)[0] + '_vectors.npy'
+
+def save_faiss_index(index, params: dict, index_path: str, rerank_vectors=None):
+    faiss.write_index(index, index_path)
+    with open(index_params_path(index_path), 'w', encoding='utf-8') as f:
+        json.dump(params, f, ensure_ascii=False, indent=4)
+    if rerank_vectors is not None:
+        np.save(rerank_vectors_path(index_path), np.asarray(rerank_vectors, dtype='float32'))
+
+def load_index_params(index_path: str) -> dict:
+    """
+    Reads the parameters stored next to an index. Indexes written before
+    parameters were recorded are flat L2 indexes, which is what the defaults describe.
+    """
+    if not os.path.exists(index_params_path(index_path)):
+        return {'index_type': 'flat', 'metric': 'l2'}
+    with open(index_params_path(index_path), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def load_faiss_index(index_path: str, mmap: bool = False):
+    """
+    Loads an index and its stored parameters (see load_index_params).
+    With mmap=True the vector data is memory-mapped read-only instead of copied
+    into RAM, so worker processes share it through the OS page cache.
+    """
+    params = load_index_params(index_path)
+    index = _read_index_mmap(index_path, params) if mmap else faiss.read_index(index_path)
+    return apply_search_params(index, params), params
+
+def mmap_read_flags(params: dict) -> list:
+    """
+    FAISS read flags to try, in order, for memory-mapping an index. The two
+    mmap flags cannot be combined: IVF indexes then fail to load their
+    inverted lists. IO_FLAG_MMAP_IFC (newer FAISS) maps flat and HNSW storage;
+    IVF indexes map their inverted lists with IO_FLAG_MMAP alone.
+    """
+    mmap_ifc = getattr(faiss, 'IO_FLAG_MMAP_IFC', None)
+    if params.get('index_type') in ('ivf_flat', 'ivf_pq') or mmap_ifc is None:
+        candidates = [faiss.IO_FLAG_MMAP]
+    else:
+        candidates = [mmap_ifc, faiss.IO_FLAG_MMAP]
+    return [flag | faiss.IO_FLAG_READ_ONLY for flag in candidates]
+
+def _read_index_mmap(index_path: str, params: dict):
+    for flags in mmap_read_flags(params):
+        try:
+            return faiss.read_index(index_path, flags)
+        except RuntimeError:
+            continue
+    # Layouts FAISS cannot map are loaded into RAM rather than failing the load.
+    logger.warning("Could not memory-map '%s'; loading it into memory instead.", index_path)
+    return faiss.read_index(index_path)
+
+def load_rerank_vectors(index_path: str):
+    """
+    Memory-maps the re-rank vectors saved with an index, or returns None. Only
+    the candidate rows touched by a query are paged in.
+    """
+    path = rerank_vectors_path(index_path)
+    return np.load(path, mmap_mode='r') if os.path.exists(path) else None
+
+def search_index(index, params: dict, query_embeddings, k: int, rerank_vectors=None):
+    """
+    Searches the index with raw query embeddings (normalized here when the
+    index is cosine) and returns (scores, rows) like faiss. With re-rank
+    vectors and a rerank_factor, the index supplies rerank_factor * k
+    candidates and they are re-scored exactly before the top k are kept.
+    """
+    queries = prepare_vectors(query_embeddings, params.get('metric', 'l2'))
+    rerank_factor = params.get('rerank_factor') or 0
+    if rerank_vectors is None or rerank_factor <= 1:
+        return index.search(queries, k)
+
+    _, candidates = index.search(queries, k * rerank_factor)
+    cosine = params.get('metric') == 'cosine'
+    scores = np.full((len(queries), k), -np.inf if cosine else np.inf, dtype='float32')
+    rows = np.full((len(queries), k), -1, dtype='int64')
+    for i, query in enumerate(queries):
+        candidate_rows = candidates[i][candidates[i] >= 0]
+        # Fancy indexing reads the rows in sorted order, which is kinder to the mmap.
+        candidate_rows = np.sort(candidate_rows)
+        candidate_vectors = np.asarray(rerank_vectors[candidate_rows], dtype='float32')
+        if cosine:
+            exact = candidate_vectors @ query
+            order = np.argsort(-exact)[:k]
+        else:
+            exact = ((candidate_vectors - query) ** 2).sum(axis=1)
+            order = np.argsort(exact)[:k]
+        scores[i, :len(order)] = exact[order]
+        rows[i, :len(order)] = candidate_rows[order]
+    return scores, rows
+
+def search_scores_to_cosine(raw_scores, params: dict):
+    """
+    Converts raw FAISS output to cosine similarity: inner-product indexes over
+    normalized vectors already return cosine; L2 indexes return squared distances.
+    """
+    raw_scores = np.asarray(raw_scores, dtype='float32')
+    if params.get('metric') == 'cosine':
+        return raw_scores
+    return 1.0 - raw_scores / 2.0
+
+def create_embeddings(chunks, metadata, model_name='all-MiniLM-L6-v2', index_type='flat', metric='cosine',
+                      compression='none', **index_params):
     """
     Generates embeddings for text chunks using a SentenceTransformer model
-    and creates a FAISS index for efficient similarity search. The index
-    and associated metadata are saved to disk.
+    and creates a FAISS index for efficient similarity search. The index,
+    its build/search parameters and the associated metadata are saved to disk.
     """
+    # Imported here so the index helpers in this module load without torch.
+    from sentence_transformers import SentenceTransformer
     model = SentenceTransformer(model_name)
     
     embeddings = model.encode(chunks, show_progress_bar=True)
     
-    dimension = embeddings.shape[1]
-    index = faiss.IndexFlatL2(dimension) # Using L2 distance for similarity
-    index.add(embeddings.astype('float32'))
+    index, params = build_faiss_index(embeddings, index_type=index_type, metric=metric,
+                                      compression=compression, **index_params)
+    params['model_name'] = model_name
+    # A compressed index only keeps float32 copies on disk when they are needed for re-ranking.
+    rerank_vectors = prepare_vectors(embeddings, metric) if params['compression'] != 'none' and params['rerank_factor'] > 1 else None
     
-    # Persisting the FAISS index and metadata for later retrieval.
-    faiss.write_index(index, os.path.join(EMBEDDINGS_DIR, 'apec2025_index.bin'))
+    # Persisting the FAISS index, its parameters and metadata for later retrieval.
+    save_faiss_index(index, params, INDEX_PATH, rerank_vectors=rerank_vectors)
     with open(os.path.join(EMBEDDINGS_DIR, 'apec2025_metadata.json'), 'w', encoding='utf-8') as f:
         json.dump(metadata, f, ensure_ascii=False, indent=4)
+    # Row-aligned texts and metadata in the memory-mappable layout the API serves from.
+    write_row_store(ROW_STORE_DIR, chunks, metadata)
     
     return model, index, chunks, metadata
 
-def query_rag(query, model, index, chunks, metadata, k=5):
+def _measure_search(search_fn, queries, true_neighbours, k: int) -> dict:
+    # Runs one query at a time (the serving pattern) and scores it against the exact top k.
+    latencies = []
+    hits = 0
+    for i in range(len(queries)):
+        start = time.perf_counter()
+        _, neighbours = search_fn(queries[i:i + 1], k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        hits += len(set(neighbours[0]) & set(true_neighbours[i]))
+    return {
+        'recall_at_k': hits / (len(queries) * k),
+        'mean_latency_ms': float(np.mean(latencies)),
+        'p95_latency_ms': float(np.percentile(latencies, 95)),
+    }
+
+def _exact_neighbours(embeddings, query_embeddings, k: int, metric: str):
+    flat_index, flat_params = build_faiss_index(embeddings, 'flat', metric)
+    return search_index(flat_index, flat_params, query_embeddings, k)[1]
+
+def recall_latency_report(embeddings, query_embeddings, index_types=INDEX_TYPES, k=5, metric='cosine', **index_params):
+    """
+    Builds each index type over the same embeddings and compares it with the
+    exact flat baseline: recall@k (share of the true top-k neighbours found)
+    and mean / p95 per-query search latency in milliseconds.
+    """
+    true_neighbours = _exact_neighbours(embeddings, query_embeddings, k, metric)
+    report = []
+    for index_type in index_types:
+        index, params = build_faiss_index(embeddings, index_type, metric, **index_params)
+        row = _measure_search(lambda q, n: search_index(index, params, q, n), query_embeddings, true_neighbours, k)
+        row['index_type'] = index_type
+        row['params'] = {key: params.get(key) for key in ('nlist', 'nprobe', 'pq_m', 'pq_nbits', 'hnsw_m', 'ef_search')}
+        report.append(row)
+    return report
+
+def compression_report(embeddings, query_embeddings, index_type='flat', compressions=COMPRESSION_TYPES, k=5,
+                       metric='cosine', rerank_factor=4, **index_params):
+    """
+    Builds the index with each vector compression and reports its serialized
+    size (bytes per vector and how many times smaller than the raw float32
+    vectors), recall@k against exact
+    search without and with exact re-ranking of rerank_factor * k candidates,
+    and per-query latency.
+    """
+    true_neighbours = _exact_neighbours(embeddings, query_embeddings, k, metric)
+    rerank_vectors = prepare_vectors(embeddings, metric)
+    float32_bytes = rerank_vectors.nbytes
+    report = []
+    for compression in compressions:
+        # ivf_pq always stores PQ codes, so it only has one row.
+        if index_type == 'ivf_pq' and compression != 'pq':
+            continue
+        index, params = build_faiss_index(embeddings, index_type, metric, compression=compression, **index_params)
+        index_bytes = len(faiss.serialize_index(index))
+        row = {
+            'compression': params['compression'],
+            'index_bytes': index_bytes,
+            'bytes_per_vector': index_bytes / index.ntotal,
+            'size_ratio': float32_bytes / index_bytes,
+        }
+        plain = _measure_search(lambda q, n: search_index(index, params, q, n), query_embeddings, true_neighbours, k)
+        reranked_params = {**params, 'rerank_factor': rerank_factor}
+        reranked = _measure_search(lambda q, n: search_index(index, reranked_params, q, n, rerank_vectors),
+                                   query_embeddings, true_neighbours, k)
+        row.update(plain)
+        row.update({f"rerank_{key}": value for key, value in reranked.items()})
+        report.append(row)
+    return report
+
+def query_rag_batch(queries, model, index, chunks, metadata, k=5, params=None, rerank_vectors=None, batch_size=64):
+    """
+    Batch version of query_rag: encodes all queries in one call, runs a single
+    search over the whole (n, dim) query matrix and returns one result list
+    per query ({'text', 'metadata', 'score'}, score = cosine similarity).
+
+    `params` are the index's saved parameters (see load_index_params); they
+    set the metric, nprobe / efSearch and, with `rerank_vectors`, exact
+    re-ranking. Without them only the metric is taken from the index itself.
+    """
+    queries = list(queries)
+    if not queries:
+        return []
+    if params is None:
+        params = {'metric': 'cosine' if index.metric_type == faiss.METRIC_INNER_PRODUCT else 'l2'}
+    apply_search_params(index, params)
+    query_embeddings = model.encode(queries, batch_size=batch_size)
+    raw_scores, indices = search_index(index, params, query_embeddings, k, rerank_vectors)
+    scores = search_scores_to_cosine(raw_scores, params)
+
+    return [
+        [
+            {'text': chunks[idx], 'metadata': metadata[idx], 'score': float(score)}
+            # FAISS pads with -1 when fewer than k neighbours are found.
+            for idx, score in zip(indices_row.tolist(), scores_row.tolist()) if idx >= 0
+        ]
+        for scores_row, indices_row in zip(scores, indices)
+    ]
+
+def query_rag(query, model, index, chunks, metadata, k=5, params=None, rerank_vectors=None):
     """
     Performs a Retrieval-Augmented Generation (RAG) query.
     It embeds the query, searches the FAISS index for relevant chunks,
-    and returns the top 'k' results with their text, metadata, and distance.
+    and returns the top 'k' results with their text, metadata, and score.
     """
-    query_embedding = model.encode([query])[0]
-    
-    distances, indices = index.search(np.array([query_embedding]).astype('float32'), k)
-    
-    results = []
-    for idx in indices[0]:
-        # The original code used list(indices[0]).index(idx) which is inefficient.
-        # Direct indexing `distances[0][idx]` is also incorrect as `idx` is the FAISS internal index.
-        # The `distances` array already corresponds to the `indices` array.
-        # So, `distances[0][list(indices[0]).index(idx)]` should be simplified.
-        # Here, I'm assuming 'distances[0]' and 'indices[0]' are already aligned
-        # where `distances[0][i]` corresponds to `chunks[indices[0][i]]`.
-        # I'll stick to your current result structure, but note this potential optimization
-        # if performance becomes a bottleneck on large 'k'. For small 'k', it's negligible.
-        results.append({
-            'text': chunks[idx],
-            'metadata': metadata[idx],
-            'distance': distances[0][np.where(indices[0] == idx)[0][0]] # Corrected logic
-        })
-    
-    return results
+    return query_rag_batch([query], model, index, chunks, metadata, k=k, params=params,
+                           rerank_vectors=rerank_vectors)[0]
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the FAISS index used by the API and run a sample query.")
+    parser.add_argument("--index-type", choices=INDEX_TYPES, default='flat', help="FAISS index layout.")
+    parser.add_argument("--metric", choices=('cosine', 'l2'), default='cosine', help="Similarity metric.")
+    parser.add_argument("--nlist", type=int, help="IVF cells (default: about 4 * sqrt(n)).")
+    parser.add_argument("--nprobe", type=int, help="IVF cells searched per query.")
+    parser.add_argument("--pq-m", type=int, help="PQ sub-quantizers for ivf_pq.")
+    parser.add_argument("--hnsw-m", type=int, help="HNSW graph degree.")
+    parser.add_argument("--ef-search", type=int, help="HNSW query-time beam width.")
+    parser.add_argument("--compression", choices=COMPRESSION_TYPES, default='none',
+                        help="Store vectors as float16, scalar int8 or PQ codes instead of float32.")
+    parser.add_argument("--rerank-factor", type=int,
+                        help="Re-score rerank_factor * k candidates exactly (saves float32 vectors next to the index).")
+    parser.add_argument("--report", action="store_true",
+                        help="Print recall@k and latency of every index type against the flat baseline.")
+    parser.add_argument("--compression-report", action="store_true",
+                        help="Print size, recall@k (with and without re-rank) and latency for every compression.")
+    args = parser.parse_args()
+    index_params = {'nlist': args.nlist, 'nprobe': args.nprobe, 'pq_m': args.pq_m,
+                    'hnsw_m': args.hnsw_m, 'ef_search': args.ef_search, 'rerank_factor': args.rerank_factor}
+
     # My specified input JSON file containing processed data.
     json_file = os.path.join(RAW_DATA_DIR, "apec2025_all_info_20250708_221755.json")
     
@@ -164,13 +498,35 @@ if __name__ == "__main__":
     print(f"Loaded {len(chunks)} chunks for embedding.")
     
     # Step 2: Create embeddings and build the FAISS index.
-    model, index, chunks, metadata = create_embeddings(chunks, metadata)
-    print("Embeddings created and FAISS index saved.")
+    model, index, chunks, metadata = create_embeddings(chunks, metadata, index_type=args.index_type,
+                                                       metric=args.metric, compression=args.compression,
+                                                       **index_params)
+    print(f"Embeddings created and FAISS index ({args.index_type}, {args.metric}, {args.compression}) saved.")
+
+    if args.report or args.compression_report:
+        # Corpus vectors double as queries: a sample of up to 200 of them is enough
+        # to measure how many exact neighbours each approximate index recovers.
+        embeddings = model.encode(chunks)
+        sample = np.random.default_rng(0).choice(len(embeddings), size=min(200, len(embeddings)), replace=False)
+        report_params = {key: value for key, value in index_params.items() if key != 'rerank_factor'}
+    if args.report:
+        print("\n--- Recall vs latency (k=5, flat baseline) ---")
+        for row in recall_latency_report(embeddings, embeddings[sample], metric=args.metric, **report_params):
+            print(f"{row['index_type']:>9}: recall@5={row['recall_at_k']:.3f}  "
+                  f"mean={row['mean_latency_ms']:.3f}ms  p95={row['p95_latency_ms']:.3f}ms  {row['params']}")
+    if args.compression_report:
+        print(f"\n--- Compression ({args.index_type}, k=5, re-rank x{args.rerank_factor or 4}) ---")
+        for row in compression_report(embeddings, embeddings[sample], index_type=args.index_type, metric=args.metric,
+                                      rerank_factor=args.rerank_factor or 4, **report_params):
+            print(f"{row['compression']:>5}: {row['bytes_per_vector']:.0f} B/vector ({row['size_ratio']:.1f}x smaller)  "
+                  f"recall@5={row['recall_at_k']:.3f} -> {row['rerank_recall_at_k']:.3f} re-ranked  "
+                  f"mean={row['mean_latency_ms']:.3f}ms / {row['rerank_mean_latency_ms']:.3f}ms")
     
     # Step 3: Perform a sample query to test the RAG pipeline.
     sample_query = "Where is Informal Senior Officials’ Meeting (ISOM) held?"
     print(f"\nPerforming sample query: '{sample_query}'")
-    results = query_rag(sample_query, model, index, chunks, metadata)
+    results = query_rag(sample_query, model, index, chunks, metadata, params=load_index_params(INDEX_PATH),
+                        rerank_vectors=load_rerank_vectors(INDEX_PATH))
     
     # Displaying query results for verification.
     print("\n--- Query Results ---")
@@ -179,7 +535,7 @@ if __name__ == "__main__":
             print(f"Result {i+1}:")
             print(f"  Text: {result['text']}")
             print(f"  Metadata: {result['metadata']}")
-            print(f"  Distance: {result['distance']:.4f}") # Formatting distance for readability
+            print(f"  Score: {result['score']:.4f}") # Cosine similarity, higher is better
             print("-" * 50)
     else:
         print("No results found for the query.")
\ No newline at end of file
@@ -0,0 +1,42 @@
+import asyncio
+import gc
+
+from backend.utils.batching_utils import MicroBatcher
+
+def test_concurrent_submits_share_a_batch():
+    batcher = MicroBatcher(lambda items: [item * 2 for item in items], max_batch_size=8, max_wait_ms=20)
+
+    async def run():
+        return await asyncio.gather(*(batcher.submit(i) for i in range(5)))
+
+    assert asyncio.run(run()) == [0, 2, 4, 6, 8]
+    assert batcher.batches_run == 1
+
+def test_batch_tasks_survive_garbage_collection():
+    def slow_double(items):
+        gc.collect()
+        return [item * 2 for item in items]
+
+    batcher = MicroBatcher(slow_double, max_batch_size=4, max_wait_ms=1)
+
+    async def run():
+        return await asyncio.wait_for(asyncio.gather(*(batcher.submit(i) for i in range(12))), timeout=5)
+
+    assert asyncio.run(run()) == [i * 2 for i in range(12)]
+    assert not batcher._batch_tasks
+
+def test_restarted_worker_keeps_queued_items():
+    batcher = MicroBatcher(lambda items: list(items), max_batch_size=4, max_wait_ms=1)
+
+    async def run():
+        batcher._ensure_worker()
+        queue = batcher._queue
+        batcher._worker.cancel()
+        await asyncio.sleep(0)
+        future = asyncio.get_running_loop().create_future()
+        await queue.put(("queued", future))
+        result = await asyncio.wait_for(batcher.submit("new"), timeout=5)
+        assert batcher._queue is queue
+        return await asyncio.wait_for(future, timeout=5), result
+
+    assert asyncio.run(run()) == ("queued", "new")
@@ -0,0 +1,44 @@
+from datetime import date
+
+import pytest
+
+from backend.utils.event_index import EventIndex
+
+def event_chunk(chunk_id: str, name: str, dates: str, venue: str) -> dict:
+    return {
+        'id': chunk_id,
+        'content': f"Event No. 1: {name}, Date: {dates}, Venue: {venue}",
+        'metadata': {'item_type': 'event', 'event_name': name},
+    }
+
+@pytest.fixture(scope='module')
+def index():
+    return EventIndex.from_chunks([
+        event_chunk('som2', 'SOM2', 'May 3 - 16, 2025', 'Jeju'),
+        event_chunk('hldc', 'HLDC', 'August 26 - 28, 2025', 'Gyeongju'),
+        event_chunk('emm', 'EMM', 'August 27 - 28, 2025', 'Busan'),
+    ])
+
+TODAY = date(2025, 5, 13)
+
+@pytest.mark.parametrize('query, label, event_ids', [
+    ("What events are happening this week?", 'this week', ['som2']),
+    ("Hôm nay có sự kiện gì?", 'today', ['som2']),
+    ("Lịch trình hội nghị ở Busan", 'in Busan', ['emm']),
+    ("경주에서 열리는 회의는?", 'in Gyeongju', ['hldc']),
+    ("Are there any meetings in Busan today?", 'today in Busan', []),
+])
+def test_schedule_questions(index, query, label, event_ids):
+    match = index.match_query(query, today=TODAY)
+    assert match['label'] == label
+    assert [event['id'] for event in match['events']] == event_ids
+
+@pytest.mark.parametrize('query', [
+    "Du lịch ở Gyeongju có gì hay?",
+    "Lịch sử của Busan",
+    "What's the weather in Seoul today?",
+    "Tell me about Gyeongju",
+    "What is the schedule format of APEC?",
+])
+def test_general_questions_are_not_schedule_lookups(index, query):
+    assert index.match_query(query, today=TODAY) is None
@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+
+from backend.scripts.rag_pipeline import build_faiss_index, load_faiss_index, save_faiss_index, search_index
+
+# Every index layout the API can be asked to serve.
+INDEX_LAYOUTS = [
+    ('flat', 'none'), ('flat', 'fp16'), ('flat', 'int8'), ('flat', 'pq'),
+    ('ivf_flat', 'none'), ('ivf_flat', 'int8'), ('ivf_flat', 'pq'),
+    ('ivf_pq', 'pq'),
+    ('hnsw', 'none'), ('hnsw', 'int8'), ('hnsw', 'pq'),
+]
+
+@pytest.fixture(scope='module')
+def vectors():
+    rng = np.random.default_rng(0)
+    return rng.standard_normal((400, 32)).astype('float32'), rng.standard_normal((5, 32)).astype('float32')
+
+@pytest.mark.parametrize('mmap', [False, True], ids=['in-memory', 'mmap'])
+@pytest.mark.parametrize('index_type, compression', INDEX_LAYOUTS)
+def test_index_round_trip(tmp_path, vectors, index_type, compression, mmap):
+    embeddings, queries = vectors
+    index, params = build_faiss_index(embeddings, index_type, 'cosine', compression=compression, pq_m=8, pq_nbits=4)
+    index_path = str(tmp_path / 'index.bin')
+    save_faiss_index(index, params, index_path)
+
+    loaded, loaded_params = load_faiss_index(index_path, mmap=mmap)
+
+    assert loaded_params == params
+    assert loaded.ntotal == len(embeddings)
+    expected_scores, expected_rows = search_index(index, params, queries, 5)
+    scores, rows = search_index(loaded, loaded_params, queries, 5)
+    np.testing.assert_array_equal(rows, expected_rows)
+    np.testing.assert_allclose(scores, expected_scores, rtol=1e-5)
@@ -0,0 +1,37 @@
+import pytest
+
+from backend.utils import language_utils
+from backend.utils.language_utils import detect_language_local
+
+# backend.chat.rag.LANGUAGE_DETECTION_CONFIDENCE_THRESHOLD: above it the LLM is not asked.
+CONFIDENT = 0.8
+
+requires_langdetect = pytest.mark.skipif(language_utils.detect_langs is None, reason="langdetect is not installed")
+
+@pytest.mark.parametrize('text', ["Hội nghị ở đâu?", "Tôi muốn biết về APEC"])
+def test_vietnamese_only_letters_are_detected_locally(text):
+    lang_code, confidence = detect_language_local(text)
+    assert lang_code == 'vi'
+    assert confidence >= CONFIDENT
+
+@requires_langdetect
+@pytest.mark.parametrize('text', ["APEC là gì?", "Thủ đô là gì?", "Hàn Quốc"])
+def test_shared_diacritics_are_detected_locally_when_langdetect_agrees(text):
+    lang_code, confidence = detect_language_local(text)
+    assert lang_code == 'vi'
+    assert confidence >= CONFIDENT
+
+@pytest.mark.parametrize('text', [
+    "¿Qué es APEC?", "Qué hora es?", "Où est le sommet?", "Olá, tudo bem?", "Café near Gyeongju?", "Où?",
+])
+def test_short_accented_text_in_other_languages_is_not_confidently_vietnamese(text):
+    lang_code, confidence = detect_language_local(text)
+    assert not (lang_code == 'vi' and confidence >= CONFIDENT)
+
+@requires_langdetect
+@pytest.mark.parametrize('text, expected', [
+    ("Où se tiendra le sommet de l'APEC cette année?", 'fr'),
+    ("Qué es APEC y dónde se celebra la cumbre?", 'es'),
+])
+def test_longer_accented_text_keeps_its_language(text, expected):
+    assert detect_language_local(text)[0] == expected
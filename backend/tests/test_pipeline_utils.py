@@ -0,0 +1,50 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from backend.utils.gemini_keys import ApiKeyPool, leased_call
+from backend.utils.pipeline_utils import Stage, run_stage_graph, stage_time_remaining
+
+def test_stages_see_their_own_deadline():
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        results = run_stage_graph([
+            Stage('timed', lambda _: stage_time_remaining(), timeout=5),
+            Stage('untimed', lambda _: stage_time_remaining()),
+        ], executor)
+    assert 0 < results['timed'] <= 5
+    assert results['untimed'] is None
+    assert stage_time_remaining() is None
+
+def test_abandoned_stage_sends_no_request_after_its_deadline():
+    pool = ApiKeyPool(["key-0001"], lambda api_key: object(), requests_per_minute=600)
+    calls = []
+    outcome = []
+    finished = threading.Event()
+
+    def slow_stage(_):
+        time.sleep(0.2)
+        try:
+            leased_call(pool, lambda lease, timeout: calls.append(timeout))
+        except TimeoutError as e:
+            outcome.append(e)
+        finally:
+            finished.set()
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        results = run_stage_graph([Stage('slow', slow_stage, timeout=0.05, fallback=lambda exc: 'fallback')],
+                                  executor)
+        assert finished.wait(5)
+    assert results == {'slow': 'fallback'}
+    assert calls == []
+    assert isinstance(outcome[0], TimeoutError)
+    # A missed deadline is not the key's fault: it stays available.
+    assert pool.stats()[0]['cooldown_seconds'] == 0
+
+def test_requests_in_a_timed_stage_get_the_remaining_time():
+    pool = ApiKeyPool(["key-0001"], lambda api_key: object(), requests_per_minute=600)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        results = run_stage_graph([
+            Stage('timed', lambda _: leased_call(pool, lambda lease, timeout: timeout), timeout=5),
+        ], executor)
+    assert 0 < results['timed'] <= 5
+    assert leased_call(pool, lambda lease, timeout: timeout) is None
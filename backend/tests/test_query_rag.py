@@ -0,0 +1,41 @@
+import numpy as np
+
+from backend.scripts.rag_pipeline import build_faiss_index, prepare_vectors, query_rag, query_rag_batch
+
+class FixedEncoder:
+    """Stands in for the sentence-transformers model: texts are row numbers of a fixed matrix."""
+
+    def __init__(self, vectors):
+        self.vectors = vectors
+
+    def encode(self, texts, batch_size=None):
+        return self.vectors[[int(text) for text in texts]]
+
+def corpus(n=300, dim=16):
+    rng = np.random.default_rng(1)
+    embeddings = rng.standard_normal((n, dim)).astype('float32')
+    return embeddings, [f"chunk {i}" for i in range(n)], [{'row': i} for i in range(n)]
+
+def test_query_rag_scores_with_the_index_metric():
+    embeddings, chunks, metadata = corpus()
+    index, _ = build_faiss_index(embeddings, 'flat', 'cosine')
+    results = query_rag('7', FixedEncoder(embeddings), index, chunks, metadata, k=3)
+    assert results[0]['metadata'] == {'row': 7}
+    assert abs(results[0]['score'] - 1.0) < 1e-5
+    assert set(results[0]) == {'text', 'metadata', 'score'}
+
+def test_query_rag_batch_applies_saved_params_and_rerank():
+    embeddings, chunks, metadata = corpus()
+    index, params = build_faiss_index(embeddings, 'ivf_flat', 'cosine', compression='int8', nlist=16, nprobe=1,
+                                      rerank_factor=4)
+    params['nprobe'] = 16
+    encoder = FixedEncoder(embeddings)
+    rerank_vectors = prepare_vectors(embeddings, 'cosine')
+    results = query_rag_batch(['3', '42'], encoder, index, chunks, metadata, k=5, params=params,
+                              rerank_vectors=rerank_vectors)
+    for query_row, rows in zip((3, 42), results):
+        assert rows[0]['metadata'] == {'row': query_row}
+        # Re-ranked scores are exact cosine similarities.
+        assert abs(rows[0]['score'] - 1.0) < 1e-6
+        assert [row['score'] for row in rows] == sorted((row['score'] for row in rows), reverse=True)
+    assert index.nprobe == 16
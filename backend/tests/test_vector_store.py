@@ -0,0 +1,54 @@
+import json
+
+import numpy as np
+
+from backend.utils.vector_store import LocalVectorStore
+
+CHUNKS = [{"id": f"c{i}", "content": f"text {i}", "metadata": {}} for i in range(4)]
+
+def fake_embedder(fail=()):
+    calls = []
+
+    def embed(texts):
+        calls.append(list(texts))
+        return [None if text in fail else [float(text.split()[-1]) + 1.0, 1.0] for text in texts]
+    return embed, calls
+
+def build(cache_path, embed):
+    return LocalVectorStore.from_chunks(CHUNKS, embed, lambda text: None, cache_path=str(cache_path), use_faiss=False)
+
+def test_cache_is_reused_when_every_chunk_is_embedded(tmp_path):
+    cache_path = tmp_path / "embeddings.npy"
+    embed, calls = fake_embedder()
+    build(cache_path, embed)
+    store = build(cache_path, embed)
+    assert len(calls) == 1
+    assert store.ids == ["c0", "c1", "c2", "c3"]
+
+def test_failed_chunks_are_retried_without_re_embedding_the_rest(tmp_path):
+    cache_path = tmp_path / "embeddings.npy"
+    embed, calls = fake_embedder(fail={"text 2"})
+    store = build(cache_path, embed)
+    assert store.ids == ["c0", "c1", "c3"]
+    with open(f"{cache_path}.ids.json", encoding="utf-8") as f:
+        assert json.load(f) == {"ids": ["c0", "c1", "c3"], "failed": ["c2"]}
+
+    embed, calls = fake_embedder()
+    store = build(cache_path, embed)
+    assert calls == [["text 2"]]
+    assert store.ids == ["c0", "c1", "c2", "c3"]
+    assert np.allclose(np.load(cache_path)[:, 0], [1.0, 2.0, 3.0, 4.0])
+
+    embed, calls = fake_embedder()
+    build(cache_path, embed)
+    assert calls == []
+
+def test_legacy_id_list_cache_is_still_read(tmp_path):
+    cache_path = tmp_path / "embeddings.npy"
+    np.save(cache_path, np.asarray([[1.0, 1.0], [2.0, 1.0]], dtype="float32"))
+    with open(f"{cache_path}.ids.json", "w", encoding="utf-8") as f:
+        json.dump(["c0", "c1"], f)
+    embed, calls = fake_embedder()
+    store = build(cache_path, embed)
+    assert calls == [["text 2", "text 3"]]
+    assert store.ids == ["c0", "c1", "c2", "c3"]
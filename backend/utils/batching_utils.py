@@ -0,0 +1,88 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+class MicroBatcher:
+    """
+    Dynamic micro-batcher for async request handlers.
+    Concurrent `submit` calls are collected for at most `max_wait_ms` (or until
+    `max_batch_size` items are queued) and then handed to `batch_fn` as one list,
+    which runs in a worker thread so the event loop is never blocked.
+    `batch_fn` must return one result per input item, in the same order.
+    """
+
+    def __init__(self, batch_fn, max_batch_size: int = 32, max_wait_ms: float = 5.0, executor: ThreadPoolExecutor = None):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.executor = executor
+        self._queue = None
+        self._worker = None
+        # The event loop only keeps weak references to tasks, so in-flight batch
+        # tasks are held here until they finish.
+        self._batch_tasks = set()
+        self.batches_run = 0
+        self.items_processed = 0
+
+    def _ensure_worker(self):
+        # The queue and worker task are created lazily so they bind to the loop
+        # that is actually serving requests (uvicorn creates it after import).
+        # A worker that died is restarted on the same queue, so items already
+        # waiting in it are still served.
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.get_running_loop().create_task(self._collect_batches())
+
+    async def submit(self, item):
+        """Queues one item and waits for its result from the next batch."""
+        self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((item, future))
+        return await future
+
+    async def _collect_batches(self):
+        while True:
+            first = await self._queue.get()
+            batch = [first]
+            try:
+                deadline = time.monotonic() + self.max_wait
+                while len(batch) < self.max_batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+                    except asyncio.TimeoutError:
+                        break
+            except BaseException as e:
+                # Items already taken off the queue would otherwise wait forever.
+                error = e if isinstance(e, Exception) else RuntimeError("Micro-batcher worker stopped.")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(error)
+                raise
+            # Batches run as independent tasks so the next batch can be collected
+            # while this one is still being encoded.
+            task = asyncio.get_running_loop().create_task(self._run_batch(batch))
+            self._batch_tasks.add(task)
+            task.add_done_callback(self._batch_tasks.discard)
+
+    async def _run_batch(self, batch):
+        items = [item for item, _ in batch]
+        loop = asyncio.get_running_loop()
+        try:
+            results = await loop.run_in_executor(self.executor, self.batch_fn, items)
+            if len(results) != len(items):
+                raise ValueError(f"Batch function returned {len(results)} results for {len(items)} items.")
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.batches_run += 1
+        self.items_processed += len(items)
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
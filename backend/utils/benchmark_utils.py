@@ -0,0 +1,272 @@
+import functools
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+
+import numpy as np
+
+from backend.utils.language_utils import detect_language_local
+from backend.utils.lexical_index import BM25Index, tokenize
+from backend.utils.vector_store import VectorStore, make_result
+
+# Percentiles reported for every stage.
+PERCENTILES = (50, 95, 99)
+STAND_IN_EMBEDDING_DIMENSION = 768
+
+class InjectedLatency:
+    """
+    Sleeps for a configured time to imitate a remote call: `base_ms` per call,
+    spread uniformly by +/- `jitter` (a fraction of base_ms). Seeded, so two
+    benchmark runs wait the same amounts in the same order.
+    """
+
+    def __init__(self, base_ms: float = 0.0, jitter: float = 0.0, seed: int = 0):
+        self.base_ms = base_ms
+        self.jitter = jitter
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample_seconds(self) -> float:
+        with self._lock:
+            spread = self._random.uniform(-self.jitter, self.jitter)
+        return max(0.0, self.base_ms * (1 + spread)) / 1000
+
+    def wait(self):
+        seconds = self.sample_seconds()
+        if seconds:
+            time.sleep(seconds)
+
+class LatencyRecorder:
+    """
+    Collects wall times per stage. `start_turn()` opens a new sample; stage
+    times recorded from any thread until the next call are added to it, so a
+    stage called twice in one turn (e.g. local then LLM detection) counts once
+    with the summed time.
+    """
+
+    def __init__(self):
+        self.turns = []
+        self._current = None
+        self._lock = threading.Lock()
+
+    def start_turn(self):
+        with self._lock:
+            self._current = {}
+            self.turns.append(self._current)
+
+    def record(self, stage: str, seconds: float):
+        with self._lock:
+            if self._current is not None:
+                self._current[stage] = self._current.get(stage, 0.0) + seconds
+
+    def timed(self, stage: str, fn):
+        """Wraps a function so each call's wall time is recorded under `stage`."""
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.record(stage, time.perf_counter() - start)
+        return wrapper
+
+    def timed_generator(self, stage: str, fn, first_item_stage: str = None):
+        """
+        Wraps a generator function: the time until it is exhausted is recorded
+        under `stage`, and the time to its first item under `first_item_stage`.
+        """
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            first = True
+            try:
+                for item in fn(*args, **kwargs):
+                    if first and first_item_stage:
+                        self.record(first_item_stage, time.perf_counter() - start)
+                    first = False
+                    yield item
+            finally:
+                self.record(stage, time.perf_counter() - start)
+        return wrapper
+
+    def summary(self) -> dict:
+        """stage -> {'count', 'mean_ms', 'p50_ms', 'p95_ms', 'p99_ms'} over the turns that ran it."""
+        stages = {}
+        for turn in self.turns:
+            for stage, seconds in turn.items():
+                stages.setdefault(stage, []).append(seconds * 1000)
+        return {stage: latency_stats(values) for stage, values in stages.items()}
+
+def latency_stats(latencies_ms: list) -> dict:
+    values = np.asarray(latencies_ms, dtype='float64')
+    stats = {'count': int(len(values)), 'mean_ms': float(values.mean()) if len(values) else 0.0}
+    for percentile in PERCENTILES:
+        stats[f'p{percentile}_ms'] = float(np.percentile(values, percentile)) if len(values) else 0.0
+    return stats
+
+def compare_to_baseline(summary: dict, baseline: dict, max_regression: float = 0.2, min_increase_ms: float = 1.0,
+                        metric: str = 'p95_ms') -> list:
+    """
+    Returns (stage, baseline_ms, current_ms) for every stage whose `metric`
+    grew by more than `max_regression` (a fraction) over the baseline summary
+    and by at least `min_increase_ms`, so sub-millisecond noise is ignored.
+    """
+    regressions = []
+    for stage, stats in summary.items():
+        if stage in baseline:
+            before, after = baseline[stage][metric], stats[metric]
+            if after > before * (1 + max_regression) and after - before >= min_increase_ms:
+                regressions.append((stage, before, after))
+    return regressions
+
+class _StandInPart:
+    pass
+
+class _StandInResponse:
+    """Mimics the parts of a Gemini response the app reads: .text and .candidates[0].content.parts."""
+
+    def __init__(self, text: str):
+        self.text = text
+        candidate = _StandInPart()
+        candidate.content = _StandInPart()
+        candidate.content.parts = [text] if text else []
+        self.candidates = [candidate]
+
+class StandInGeminiModel:
+    """
+    Offline replacement for genai.GenerativeModel. Each call waits
+    `call_latency`; streamed answers then emit one word per `token_latency`.
+    Responses follow the prompt type closely enough for the app's parsing:
+    JSON query analysis, a language code, or a short canned answer.
+    """
+
+    def __init__(self, call_latency: InjectedLatency, token_latency: InjectedLatency, answer_words: int = 60):
+        self.call_latency = call_latency
+        self.token_latency = token_latency
+        self.answer_words = answer_words
+
+    @staticmethod
+    def _original_question(prompt: str) -> str:
+        match = re.search(r'\[ORIGINAL (?:USER )?QUESTION\]\s*(.*?)\s*(?:\[|$)', prompt, re.DOTALL)
+        return match.group(1).strip() if match else prompt.strip()[-200:]
+
+    def _respond(self, prompt: str, generation_config: dict = None) -> str:
+        question = self._original_question(prompt)
+        if generation_config and generation_config.get('response_mime_type') == 'application/json':
+            language, _ = detect_language_local(question)
+            summary = "The user asked about APEC 2025 events." if "[CONVERSATION HISTORY]" in prompt else ""
+            return json.dumps({'language': language, 'english_query': question, 'summary': summary}, ensure_ascii=False)
+        if prompt.rstrip().endswith("Language Code:"):
+            return detect_language_local(question)[0]
+        words = tokenize(question) or ["APEC"]
+        return " ".join(words[i % len(words)] for i in range(self.answer_words))
+
+    def _stream(self, text: str):
+        for word in text.split():
+            self.token_latency.wait()
+            yield _StandInResponse(word + " ")
+
+    def generate_content(self, prompt: str, stream: bool = False, generation_config: dict = None, **kwargs):
+        self.call_latency.wait()
+        text = self._respond(prompt, generation_config)
+        return self._stream(text) if stream else _StandInResponse(text)
+
+class StandInVectorStore(VectorStore):
+    """
+    Offline replacement for the Pinecone store. Queries are embedded as a
+    hashed bag of words and answered by BM25 over the processed chunks, so
+    the app receives realistic chunk texts; scores are rescaled into the
+    cosine range above the app's confidence threshold. `embed_latency` and
+    `query_latency` imitate the embedding API and Pinecone round trips.
+    """
+
+    def __init__(self, chunks: list, embed_latency: InjectedLatency, query_latency: InjectedLatency,
+                 dimension: int = STAND_IN_EMBEDDING_DIMENSION):
+        self.lexical_index = BM25Index.from_chunks(chunks)
+        self.embed_latency = embed_latency
+        self.query_latency = query_latency
+        self.dimension = dimension
+
+    def embed_query(self, query_text: str):
+        self.embed_latency.wait()
+        return hashed_embedding(query_text, self.dimension)
+
+    def query(self, query_text: str, top_k: int = 5, query_embedding=None) -> list:
+        self.query_latency.wait()
+        results = self.lexical_index.search(query_text, top_k=top_k)
+        if not results:
+            return []
+        best = results[0]['score']
+        return [
+            make_result(result['id'], 0.6 + 0.3 * result['score'] / best, result['content'], result['metadata'])
+            for result in results
+        ]
+
+class StandInQueryEncoder:
+    """Offline query encoder for the API benchmark: hashed bag of words after `latency`."""
+
+    def __init__(self, latency: InjectedLatency, dimension: int = 384):
+        self.name = f"stand-in-hashing-{dimension}"
+        self.latency = latency
+        self.dimension = dimension
+
+    def encode(self, texts: list, batch_size: int = 32):
+        self.latency.wait()
+        return np.vstack([hashed_embedding(text, self.dimension) for text in texts]) if texts \
+            else np.zeros((0, self.dimension), dtype='float32')
+
+def hashed_embedding(text: str, dimension: int):
+    """Deterministic unit vector: each token adds +/-1 to a hashed coordinate."""
+    vector = np.zeros(dimension, dtype='float32')
+    for token in tokenize(text):
+        digest = hashlib.blake2b(token.encode('utf-8'), digest_size=8).digest()
+        value = int.from_bytes(digest, 'little')
+        vector[value % dimension] += 1.0 if value >> 63 else -1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+class _StandInRows:
+    def __init__(self, texts: list, metadatas: list):
+        self.texts = texts
+        self.metadatas = metadatas
+
+    def text(self, row: int) -> str:
+        return self.texts[row]
+
+    def metadata(self, row: int) -> dict:
+        return self.metadatas[row]
+
+    def __len__(self):
+        return len(self.texts)
+
+class StandInServingBundle:
+    """
+    Offline replacement for the API's ServingBundle: a flat cosine FAISS index
+    over the processed chunks, embedded with the stand-in encoder (without its
+    injected latency, which only applies to queries).
+    """
+
+    def __init__(self, chunks: list, encoder: StandInQueryEncoder):
+        from backend.scripts.rag_pipeline import build_faiss_index
+
+        texts = [chunk['content'] for chunk in chunks]
+        embeddings = np.vstack([hashed_embedding(text, encoder.dimension) for text in texts])
+        self.index, self.index_params = build_faiss_index(embeddings, 'flat', 'cosine')
+        self.encoder = encoder
+        self.rerank_vectors = None
+        self.rows = _StandInRows(texts, [chunk.get('metadata', {}) for chunk in chunks])
+        self.manifest = {'version': 'stand-in', 'model_name': encoder.name}
+        self.error = None
+        self.load_seconds = 0.0
+
+    ready = True
+    version = 'stand-in'
+
+    def load(self):
+        return self
+
+    def warm_up(self, sample_query: str = "APEC 2025"):
+        return self
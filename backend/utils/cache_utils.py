@@ -0,0 +1,264 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+from collections import OrderedDict
+
+import numpy as np
+
+from backend.utils.logging_utils import get_logger
+from backend.utils.metrics import record_cache_lookup
+
+logger = get_logger(__name__)
+
+def normalize_cache_text(text: str) -> str:
+    """
+    Normalizes text for use in a cache key: Unicode NFC, collapsed whitespace
+    and case-folding, so trivially different spellings of the same question
+    share one entry.
+    """
+    text = unicodedata.normalize('NFC', text or "")
+    return re.sub(r'\s+', ' ', text).strip().casefold()
+
+class EmbeddingCache:
+    """
+    Two-tier cache for embedding vectors keyed by (model, task_type, normalized text).
+    The memory tier is an LRU with optional TTL. The optional disk tier is a
+    SQLite file, so embeddings survive restarts and are shared between processes
+    on the same host. Hit/miss counters are kept for monitoring and exported
+    as metrics under `name`.
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl_seconds: float = None, disk_path: str = None,
+                 name: str = "embedding"):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.disk_path = disk_path
+        self._entries = OrderedDict()  # key -> (vector, expires_at)
+        self._lock = threading.Lock()
+        self._disk = None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if disk_path:
+            os.makedirs(os.path.dirname(os.path.abspath(disk_path)), exist_ok=True)
+            self._disk = sqlite3.connect(disk_path, check_same_thread=False)
+            self._disk.execute("PRAGMA journal_mode=WAL")
+            self._disk.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key TEXT PRIMARY KEY, vector BLOB NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._disk.commit()
+
+    @staticmethod
+    def make_key(model: str, task_type: str, text: str) -> str:
+        return f"{model}\x1f{task_type}\x1f{normalize_cache_text(text)}"
+
+    def _is_stale(self, created_at: float) -> bool:
+        return self.ttl_seconds is not None and time.time() - created_at >= self.ttl_seconds
+
+    def get(self, model: str, task_type: str, text: str):
+        """Returns the cached vector (list of floats) or None."""
+        key = self.make_key(model, task_type, text)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                vector, expires_at = entry
+                if expires_at is None or time.time() < expires_at:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    record_cache_lookup(self.name, True)
+                    return vector
+                del self._entries[key]
+
+            if self._disk is not None:
+                row = self._disk.execute(
+                    "SELECT vector, created_at FROM embeddings WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and not self._is_stale(row[1]):
+                    vector = array('f', row[0]).tolist()
+                    self._remember(key, vector)
+                    self.hits += 1
+                    self.disk_hits += 1
+                    record_cache_lookup(self.name, True)
+                    return vector
+
+            self.misses += 1
+            record_cache_lookup(self.name, False)
+            return None
+
+    def set(self, model: str, task_type: str, text: str, vector):
+        key = self.make_key(model, task_type, text)
+        vector = [float(value) for value in vector]
+        with self._lock:
+            self._remember(key, vector)
+            if self._disk is not None:
+                self._disk.execute(
+                    "INSERT OR REPLACE INTO embeddings (key, vector, created_at) VALUES (?, ?, ?)",
+                    (key, array('f', vector).tobytes(), time.time())
+                )
+                self._disk.commit()
+
+    def _remember(self, key: str, vector):
+        # Caller holds the lock.
+        expires_at = time.time() + self.ttl_seconds if self.ttl_seconds is not None else None
+        self._entries[key] = (vector, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get_or_compute(self, model: str, task_type: str, text: str, compute_fn):
+        """
+        Returns the cached vector, or calls compute_fn(text) and caches its result.
+        A None result (failed embedding) is not cached.
+        """
+        vector = self.get(model, task_type, text)
+        if vector is not None:
+            return vector
+        vector = compute_fn(text)
+        if vector is not None:
+            self.set(model, task_type, text, vector)
+        return vector
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+def embedding_cache_from_env(prefix: str = "EMBEDDING_CACHE", name: str = "embedding") -> EmbeddingCache:
+    """
+    Builds an EmbeddingCache from environment variables:
+    <prefix>_MAX_ENTRIES, <prefix>_TTL_SECONDS (unset = no expiry) and
+    <prefix>_PATH (unset = memory only). `name` labels its metrics.
+    """
+    ttl = os.getenv(f"{prefix}_TTL_SECONDS")
+    return EmbeddingCache(
+        max_entries=int(os.getenv(f"{prefix}_MAX_ENTRIES", "10000")),
+        ttl_seconds=float(ttl) if ttl else None,
+        disk_path=os.getenv(f"{prefix}_PATH") or None,
+        name=name,
+    )
+
+class SemanticAnswerCache:
+    """
+    Answer cache looked up by embedding similarity of the processed (English)
+    query, so paraphrases and the same question asked in different languages
+    share one entry. Each entry stores one answer per target language and is
+    tagged with the index version it was generated from; entries from another
+    version never match, so re-ingestion invalidates them.
+    """
+
+    def __init__(self, similarity_threshold: float = 0.93, max_entries: int = 2000, ttl_seconds: float = None):
+        self.similarity_threshold = similarity_threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._vectors = None  # (n, dim) float32 matrix of unit-normalized query embeddings
+        self._entries = []  # parallel to the matrix rows
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _normalize(embedding):
+        vector = np.asarray(embedding, dtype='float32')
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def _best_match(self, vector, index_version: str):
+        # Caller holds the lock. Returns (row, similarity) of the closest live entry.
+        if self._vectors is None or not self._entries:
+            return None, 0.0
+        similarities = self._vectors @ vector
+        now = time.time()
+        for row, entry in enumerate(self._entries):
+            stale = self.ttl_seconds is not None and now - entry['created_at'] >= self.ttl_seconds
+            if entry['index_version'] != index_version or stale:
+                similarities[row] = -1.0
+        best_row = int(np.argmax(similarities))
+        return best_row, float(similarities[best_row])
+
+    def lookup(self, query_embedding, lang_code: str, index_version: str):
+        """Returns a cached answer in lang_code for a similar query, or None."""
+        vector = self._normalize(query_embedding)
+        with self._lock:
+            row, similarity = self._best_match(vector, index_version)
+            if row is not None and similarity >= self.similarity_threshold:
+                entry = self._entries[row]
+                answer = entry['answers'].get(lang_code)
+                if answer is not None:
+                    entry['last_used'] = time.time()
+                    self.hits += 1
+                    record_cache_lookup("answer", True)
+                    logger.info("Answer cache hit.", extra={'similarity': round(similarity, 3), 'cached_query': entry['query']})
+                    return answer
+            self.misses += 1
+            record_cache_lookup("answer", False)
+            return None
+
+    def store(self, query_embedding, processed_query: str, lang_code: str, answer: str, index_version: str):
+        """Stores an answer, merging it into an existing entry for a similar query."""
+        vector = self._normalize(query_embedding)
+        now = time.time()
+        with self._lock:
+            row, similarity = self._best_match(vector, index_version)
+            if row is not None and similarity >= self.similarity_threshold:
+                self._entries[row]['answers'][lang_code] = answer
+                self._entries[row]['last_used'] = now
+                return
+
+            entry = {
+                'query': processed_query,
+                'index_version': index_version,
+                'answers': {lang_code: answer},
+                'created_at': now,
+                'last_used': now,
+            }
+            if self._vectors is None:
+                self._vectors = vector[np.newaxis, :].copy()
+                self._entries = [entry]
+            elif len(self._entries) < self.max_entries:
+                self._vectors = np.vstack([self._vectors, vector])
+                self._entries.append(entry)
+            else:
+                # Full: replace the least recently used entry in place.
+                lru_row = min(range(len(self._entries)), key=lambda i: self._entries[i]['last_used'])
+                self._vectors[lru_row] = vector
+                self._entries[lru_row] = entry
+
+    def clear(self):
+        with self._lock:
+            self._vectors = None
+            self._entries = []
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+def file_content_version(path: str) -> str:
+    """
+    Returns a short content hash of a file, used as an index version tag.
+    Re-ingesting from a changed chunks file therefore yields a new version.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()[:16]
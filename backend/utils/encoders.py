@@ -0,0 +1,205 @@
+import json
+import os
+import time
+
+import numpy as np
+
+# Query encoder used by the local FAISS retrieval API:
+# 'sentence-transformers' (PyTorch, full precision) or 'onnx-int8' (exported,
+# dynamically quantized graph run by ONNX Runtime on CPU).
+QUERY_ENCODER_BACKEND = os.getenv("QUERY_ENCODER_BACKEND", "sentence-transformers")
+ONNX_ENCODER_DIR = os.getenv("ONNX_ENCODER_DIR", os.path.join("backend", "data", "encoders"))
+# Threads ONNX Runtime may use per inference call; 0 lets it decide.
+ONNX_INTRA_OP_THREADS = int(os.getenv("ONNX_INTRA_OP_THREADS", "0"))
+
+ENCODER_CONFIG_FILE = "encoder_config.json"
+ONNX_FP32_FILE = "model.onnx"
+ONNX_INT8_FILE = "model_int8.onnx"
+
+def onnx_encoder_dir(model_name: str, base_dir: str = ONNX_ENCODER_DIR) -> str:
+    return os.path.join(base_dir, f"{model_name.split('/')[-1]}-onnx")
+
+class SentenceTransformerEncoder:
+    """Full-precision PyTorch encoder; the reference the ONNX encoder is checked against."""
+
+    def __init__(self, model_name: str):
+        from sentence_transformers import SentenceTransformer
+        self.model_name = model_name
+        self.name = model_name
+        self.model = SentenceTransformer(model_name)
+
+    def encode(self, texts: list, batch_size: int = 32):
+        return np.asarray(self.model.encode(list(texts), batch_size=batch_size), dtype='float32')
+
+class OnnxEncoder:
+    """
+    Runs an encoder exported by export_onnx_encoder with ONNX Runtime and the
+    same tokenizer, reproducing the SentenceTransformer pooling (and
+    normalization) from the saved encoder config. Only onnxruntime and
+    tokenizers are needed at serving time, not PyTorch.
+    """
+
+    def __init__(self, model_dir: str, quantized: bool = True):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        with open(os.path.join(model_dir, ENCODER_CONFIG_FILE), 'r', encoding='utf-8') as f:
+            self.config = json.load(f)
+        self.model_name = self.config["model_name"]
+        self.name = f"{self.model_name}-onnx-{'int8' if quantized else 'fp32'}"
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=self.config["max_seq_length"])
+        self.tokenizer.enable_padding(pad_id=self.config["pad_token_id"], pad_token=self.config["pad_token"])
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if ONNX_INTRA_OP_THREADS:
+            options.intra_op_num_threads = ONNX_INTRA_OP_THREADS
+        model_path = os.path.join(model_dir, ONNX_INT8_FILE if quantized else ONNX_FP32_FILE)
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+
+    def _encode_batch(self, texts: list):
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.asarray([encoding.ids for encoding in encodings], dtype='int64')
+        attention_mask = np.asarray([encoding.attention_mask for encoding in encodings], dtype='int64')
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self.input_names:
+            feeds["token_type_ids"] = np.asarray([encoding.type_ids for encoding in encodings], dtype='int64')
+        token_embeddings = self.session.run(None, {name: feeds[name] for name in self.input_names})[0]
+
+        if self.config["pooling"] == "cls":
+            embeddings = token_embeddings[:, 0]
+        else:
+            mask = attention_mask[:, :, np.newaxis].astype('float32')
+            embeddings = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        if self.config["normalize"]:
+            norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+            embeddings = embeddings / np.clip(norms, 1e-12, None)
+        return embeddings.astype('float32')
+
+    def encode(self, texts: list, batch_size: int = 32):
+        texts = list(texts)
+        if not texts:
+            return np.zeros((0, self.config["dimension"]), dtype='float32')
+        return np.vstack([self._encode_batch(texts[i:i + batch_size]) for i in range(0, len(texts), batch_size)])
+
+def export_onnx_encoder(model_name: str, output_dir: str, quantize: bool = True, opset: int = 14) -> str:
+    """
+    Exports a SentenceTransformer's transformer to ONNX (dynamic batch and
+    sequence axes), saves its fast tokenizer and pooling config next to it and,
+    by default, writes a dynamically int8-quantized copy of the graph.
+    Returns output_dir.
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    os.makedirs(output_dir, exist_ok=True)
+    model = SentenceTransformer(model_name, device="cpu")
+    transformer = model[0].auto_model.eval()
+    tokenizer = model.tokenizer
+    tokenizer.save_pretrained(output_dir)
+
+    pooling = "mean"
+    normalize = False
+    for module in model:
+        module_type = type(module).__name__
+        if module_type == "Pooling" and getattr(module, "pooling_mode_cls_token", False):
+            pooling = "cls"
+        elif module_type == "Normalize":
+            normalize = True
+
+    class TokenEmbeddings(torch.nn.Module):
+        # Returns only the last hidden state, which the pooling step needs.
+        def __init__(self, transformer):
+            super().__init__()
+            self.transformer = transformer
+
+        def forward(self, input_ids, attention_mask, token_type_ids):
+            return self.transformer(input_ids=input_ids, attention_mask=attention_mask,
+                                    token_type_ids=token_type_ids)[0]
+
+    sample = tokenizer(["APEC 2025 KOREA"], return_tensors="pt")
+    token_type_ids = sample.get("token_type_ids", torch.zeros_like(sample["input_ids"]))
+    fp32_path = os.path.join(output_dir, ONNX_FP32_FILE)
+    dynamic_axes = {"input_ids": {0: "batch", 1: "sequence"}, "attention_mask": {0: "batch", 1: "sequence"},
+                    "token_type_ids": {0: "batch", 1: "sequence"}, "token_embeddings": {0: "batch", 1: "sequence"}}
+    with torch.no_grad():
+        torch.onnx.export(
+            TokenEmbeddings(transformer),
+            (sample["input_ids"], sample["attention_mask"], token_type_ids),
+            fp32_path,
+            input_names=["input_ids", "attention_mask", "token_type_ids"],
+            output_names=["token_embeddings"],
+            dynamic_axes=dynamic_axes,
+            opset_version=opset,
+        )
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(fp32_path, os.path.join(output_dir, ONNX_INT8_FILE), weight_type=QuantType.QInt8)
+
+    config = {
+        "model_name": model_name,
+        "max_seq_length": model.max_seq_length,
+        "dimension": model.get_sentence_embedding_dimension(),
+        "pooling": pooling,
+        "normalize": normalize,
+        "pad_token": tokenizer.pad_token,
+        "pad_token_id": tokenizer.pad_token_id,
+    }
+    with open(os.path.join(output_dir, ENCODER_CONFIG_FILE), 'w', encoding='utf-8') as f:
+        json.dump(config, f, ensure_ascii=False, indent=4)
+    return output_dir
+
+def check_encoder_parity(reference, candidate, texts: list, min_cosine: float = 0.99, batch_size: int = 32) -> dict:
+    """
+    Compares two encoders on the same texts: per-text cosine similarity between
+    their embeddings, whether each text's nearest neighbour among the texts is
+    the same under both, and batch encode latency. `passed` requires the lowest
+    cosine to reach min_cosine.
+    """
+    start = time.perf_counter()
+    reference_vectors = reference.encode(texts, batch_size=batch_size)
+    reference_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    candidate_vectors = candidate.encode(texts, batch_size=batch_size)
+    candidate_seconds = time.perf_counter() - start
+
+    def normalized(vectors):
+        return vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+
+    reference_vectors, candidate_vectors = normalized(reference_vectors), normalized(candidate_vectors)
+    cosines = (reference_vectors * candidate_vectors).sum(axis=1)
+
+    def nearest_neighbours(vectors):
+        similarities = vectors @ vectors.T
+        np.fill_diagonal(similarities, -np.inf)
+        return similarities.argmax(axis=1)
+
+    neighbour_agreement = float(np.mean(nearest_neighbours(reference_vectors) == nearest_neighbours(candidate_vectors))) \
+        if len(texts) > 1 else 1.0
+    return {
+        "texts": len(texts),
+        "mean_cosine": float(cosines.mean()),
+        "min_cosine": float(cosines.min()),
+        "neighbour_agreement": neighbour_agreement,
+        "reference_ms_per_text": reference_seconds * 1000 / len(texts),
+        "candidate_ms_per_text": candidate_seconds * 1000 / len(texts),
+        "passed": bool(cosines.min() >= min_cosine),
+    }
+
+def create_query_encoder(model_name: str, backend: str = None, onnx_dir: str = None):
+    """Builds the query encoder selected by `backend` (default: QUERY_ENCODER_BACKEND)."""
+    backend = backend or QUERY_ENCODER_BACKEND
+    if backend == "sentence-transformers":
+        return SentenceTransformerEncoder(model_name)
+    if backend in ("onnx-int8", "onnx-fp32"):
+        model_dir = onnx_dir or onnx_encoder_dir(model_name)
+        if not os.path.exists(os.path.join(model_dir, ENCODER_CONFIG_FILE)):
+            raise FileNotFoundError(
+                f"No exported encoder at '{model_dir}'. Export one with: python backend/scripts/export_onnx_encoder.py"
+            )
+        return OnnxEncoder(model_dir, quantized=(backend == "onnx-int8"))
+    raise ValueError(f"Unknown QUERY_ENCODER_BACKEND '{backend}'.")
@@ -0,0 +1,230 @@
+import bisect
+import json
+import os
+import re
+from datetime import date, datetime, timedelta
+
+from backend.utils.cache_utils import file_content_version, normalize_cache_text
+from backend.utils.logging_utils import get_logger
+
+logger = get_logger(__name__)
+
+EVENT_INDEX_FORMAT_VERSION = 1
+
+# "December 9 - 11, 2024", "February 23 – 25, 2025", "July 26 - August 15, 2025", "August 12, 2025".
+DATE_RANGE_PATTERN = re.compile(
+    r'(?P<month1>[A-Za-z]+)\s+(?P<day1>\d{1,2})'
+    r'(?:\s*[-–]\s*(?:(?P<month2>[A-Za-z]+)\s+)?(?P<day2>\d{1,2}))?'
+    r',\s*(?P<year>\d{4})'
+)
+# Event chunks read "Event No. 1: <name>, Date: <date>, Venue: <venue>".
+EVENT_CONTENT_PATTERN = re.compile(r'Date:\s*(?P<date>.*?),\s*Venue:\s*(?P<venue>.+)$', re.DOTALL)
+
+# Phrases that ask for a date window, per supported language. Phrases are
+# matched as whole words (see mentions_phrase), never as substrings.
+TODAY_PHRASES = ('today', 'hôm nay', '오늘')
+TOMORROW_PHRASES = ('tomorrow', 'ngày mai', '내일')
+THIS_WEEK_PHRASES = ('this week', 'tuần này', '이번 주', '이번주')
+NEXT_WEEK_PHRASES = ('next week', 'tuần sau', 'tuần tới', '다음 주', '다음주')
+THIS_MONTH_PHRASES = ('this month', 'tháng này', '이번 달', '이번달')
+# A date window or venue only makes a schedule question next to one of these
+# words, so "Tell me about Gyeongju" or "What's the weather today?" still go to
+# normal retrieval. Vietnamese 'lịch' alone is too ambiguous ('du lịch' =
+# travel, 'lịch sử' = history), so only schedule phrases built on it count.
+EVENT_WORDS = (
+    'event', 'meeting', 'schedule', 'agenda',
+    'sự kiện', 'hội nghị', 'cuộc họp', 'lịch trình', 'lịch sự kiện', 'lịch họp', 'lịch hội nghị', 'lịch làm việc',
+    'lịch apec',
+    '행사', '회의', '일정',
+)
+# Korean spellings of the host cities, mapped to the English venue names used in the data.
+VENUE_ALIASES = {'서울': 'seoul', '부산': 'busan', '경주': 'gyeongju', '제주': 'jeju', '인천': 'incheon'}
+
+_HANGUL = re.compile(r'[\uac00-\ud7a3]')
+
+def mentions_phrase(normalized_text: str, phrase: str) -> bool:
+    """
+    Whole-word match of a phrase in normalized text. English phrases may take a
+    plural 's'; Korean phrases only need a word start, since particles attach
+    to the word ("오늘은", "경주에서").
+    """
+    if _HANGUL.search(phrase):
+        pattern = rf'(?<!\w){re.escape(phrase)}'
+    else:
+        pattern = rf'(?<!\w){re.escape(phrase)}s?(?!\w)'
+    return re.search(pattern, normalized_text) is not None
+
+def parse_date_range(text: str):
+    """
+    Parses an event date (single day or range) into (start, end) dates, or
+    returns None for missing dates such as "-". A range crossing New Year
+    ("December 30 - January 2, 2026") starts in the previous year.
+    """
+    match = DATE_RANGE_PATTERN.search(text or "")
+    if not match:
+        return None
+    try:
+        year = int(match.group('year'))
+        start = datetime.strptime(f"{match.group('month1')} {match.group('day1')} {year}", '%B %d %Y').date()
+        end = start
+        if match.group('day2'):
+            end_month = match.group('month2') or match.group('month1')
+            end = datetime.strptime(f"{end_month} {match.group('day2')} {year}", '%B %d %Y').date()
+    except ValueError:
+        return None
+    if end < start:
+        start = start.replace(year=year - 1)
+    return start, end
+
+def parse_event_chunk(chunk: dict):
+    """Extracts {'id', 'name', 'start', 'end', 'venue', ...} from an event chunk, or None."""
+    metadata = chunk.get('metadata', {})
+    if metadata.get('item_type') != 'event':
+        return None
+    match = EVENT_CONTENT_PATTERN.search(chunk['content'])
+    if not match:
+        return None
+    dates = parse_date_range(match.group('date'))
+    return {
+        'id': chunk['id'],
+        'event_no': metadata.get('event_no'),
+        'name': metadata.get('event_name', ''),
+        'start': dates[0].isoformat() if dates else None,
+        'end': dates[1].isoformat() if dates else None,
+        'venue': match.group('venue').strip(),
+        'content': chunk['content'],
+        'metadata': metadata,
+    }
+
+def _venue_keys(venue: str) -> set:
+    # "Brisbane, Australia" is findable as the whole string, "brisbane" or "australia".
+    normalized = normalize_cache_text(venue)
+    return {normalized} | {part.strip() for part in normalized.split(',') if part.strip()}
+
+class EventIndex:
+    """
+    Interval index over the event schedule. Dated events are kept sorted by
+    start date; an overlap query bisects the start array and only scans the
+    window that could overlap (bounded by the longest event), so lookups are
+    O(log n + matches). Venues map to their events through a dictionary.
+    """
+
+    def __init__(self, events: list, source_version: str = None):
+        self.source_version = source_version
+        dated = [event for event in events if event['start']]
+        self.events = sorted(dated, key=lambda event: (event['start'], event['end']))
+        self.undated_events = [event for event in events if not event['start']]
+        self.starts = [date.fromisoformat(event['start']).toordinal() for event in self.events]
+        self.ends = [date.fromisoformat(event['end']).toordinal() for event in self.events]
+        self.max_duration = max((end - start for start, end in zip(self.starts, self.ends)), default=0)
+        self.venues = {}
+        for event in self.events + self.undated_events:
+            for key in _venue_keys(event['venue']):
+                self.venues.setdefault(key, []).append(event)
+
+    @classmethod
+    def from_chunks(cls, chunks: list, source_version: str = None):
+        events = [event for event in (parse_event_chunk(chunk) for chunk in chunks) if event]
+        return cls(events, source_version=source_version)
+
+    def save(self, path: str):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'format_version': EVENT_INDEX_FORMAT_VERSION,
+                'source_version': self.source_version,
+                'events': self.events + self.undated_events,
+            }, f, ensure_ascii=False, indent=4)
+
+    @classmethod
+    def load(cls, path: str):
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('format_version') != EVENT_INDEX_FORMAT_VERSION:
+            raise ValueError(f"Unsupported event index format {data.get('format_version')}.")
+        return cls(data['events'], source_version=data.get('source_version'))
+
+    @classmethod
+    def load_or_build(cls, index_path: str, chunks_path: str):
+        """
+        Loads the prebuilt index if it was built from the current chunks file;
+        otherwise rebuilds it from the chunks (and rewrites it when possible).
+        """
+        source_version = file_content_version(chunks_path)
+        if os.path.exists(index_path):
+            index = cls.load(index_path)
+            if index.source_version == source_version:
+                return index
+        with open(chunks_path, 'r', encoding='utf-8') as f:
+            index = cls.from_chunks(json.load(f), source_version=source_version)
+        try:
+            index.save(index_path)
+        except OSError as e:
+            logger.warning("Could not write event index to '%s': %s", index_path, e)
+        return index
+
+    def events_between(self, start: date, end: date) -> list:
+        """Events whose [start, end] overlaps the given inclusive date window, by start date."""
+        first = bisect.bisect_left(self.starts, start.toordinal() - self.max_duration)
+        last = bisect.bisect_right(self.starts, end.toordinal())
+        return [self.events[i] for i in range(first, last) if self.ends[i] >= start.toordinal()]
+
+    def events_at(self, venue: str) -> list:
+        return list(self.venues.get(normalize_cache_text(venue), []))
+
+    def find_venue(self, query: str):
+        """Returns the venue key mentioned in the query (longest match), or None."""
+        normalized = normalize_cache_text(query)
+        for alias, venue in VENUE_ALIASES.items():
+            if alias in normalized:
+                normalized += f" {venue}"
+        matches = [key for key in self.venues if re.search(rf'\b{re.escape(key)}\b', normalized)]
+        return max(matches, key=len) if matches else None
+
+    def match_query(self, query: str, today: date = None):
+        """
+        Answers schedule questions ("events today", "meetings this week",
+        "events in Busan", or both combined) by index lookup. A question needs
+        an event word together with a date window or a venue. Returns {'label',
+        'start', 'end', 'venue', 'events'} for a schedule question (events may
+        be empty), or None for anything else.
+        """
+        today = today or date.today()
+        normalized = normalize_cache_text(query)
+        if not any(mentions_phrase(normalized, phrase) for phrase in EVENT_WORDS):
+            return None
+
+        def mentions(phrases):
+            return any(mentions_phrase(normalized, phrase) for phrase in phrases)
+
+        window = None
+        if mentions(TODAY_PHRASES):
+            window = ('today', today, today)
+        elif mentions(TOMORROW_PHRASES):
+            window = ('tomorrow', today + timedelta(days=1), today + timedelta(days=1))
+        elif mentions(NEXT_WEEK_PHRASES):
+            monday = today - timedelta(days=today.weekday()) + timedelta(days=7)
+            window = ('next week', monday, monday + timedelta(days=6))
+        elif mentions(THIS_WEEK_PHRASES):
+            monday = today - timedelta(days=today.weekday())
+            window = ('this week', monday, monday + timedelta(days=6))
+        elif mentions(THIS_MONTH_PHRASES):
+            first_day = today.replace(day=1)
+            next_month = (first_day + timedelta(days=32)).replace(day=1)
+            window = ('this month', first_day, next_month - timedelta(days=1))
+
+        venue = self.find_venue(query)
+        if window is None and venue is None:
+            return None
+
+        if window is not None:
+            label, start, end = window
+            events = self.events_between(start, end)
+            if venue is not None:
+                venue_ids = {event['id'] for event in self.venues[venue]}
+                events = [event for event in events if event['id'] in venue_ids]
+                label = f"{label} in {venue.title()}"
+        else:
+            start = end = None
+            events = self.events_at(venue)
+            label = f"in {venue.title()}"
+        return {'label': label, 'start': start, 'end': end, 'venue': venue, 'events': events}
@@ -0,0 +1,307 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from backend.utils.logging_utils import get_logger
+from backend.utils.metrics import API_KEY_REQUESTS, API_KEY_WAIT_SECONDS
+from backend.utils.pipeline_utils import stage_time_remaining
+from backend.utils.retry_utils import is_rate_limit_error, is_retryable_error
+
+logger = get_logger(__name__)
+
+# Pool settings, read when a pool is first built (after the apps load .env):
+#   GEMINI_GENERATION_RPM_PER_KEY / GEMINI_EMBEDDING_RPM_PER_KEY - requests per
+#     minute each key may send. Quotas are per key and per model, so generation
+#     and embedding calls are scheduled by separate pools.
+#   GEMINI_KEY_BURST - requests a key may send back to back before the rate applies.
+#   GEMINI_KEY_COOLDOWN_SECONDS - how long a key is skipped after a 429 (doubling
+#     on each repeat, up to GEMINI_KEY_MAX_COOLDOWN_SECONDS); a quarter of it after a 5xx.
+#   GEMINI_KEY_ACQUIRE_TIMEOUT_SECONDS - how long a caller waits for a key.
+DEFAULT_REQUESTS_PER_MINUTE = {"generation": 60.0, "embedding": 600.0}
+DEFAULT_BURST = 5
+DEFAULT_COOLDOWN_SECONDS = 20.0
+DEFAULT_MAX_COOLDOWN_SECONDS = 300.0
+DEFAULT_ACQUIRE_TIMEOUT_SECONDS = 30.0
+
+def load_gemini_api_keys() -> list:
+    """GEMINI_API_KEY_01 ... GEMINI_API_KEY_05, in order, skipping unset ones."""
+    return [os.getenv(f"GEMINI_API_KEY_0{i}") for i in range(1, 6) if os.getenv(f"GEMINI_API_KEY_0{i}")]
+
+class NoApiKeyAvailable(TimeoutError):
+    """Raised when every key stays rate-limited or cooling down past the acquire timeout."""
+
+class TokenBucket:
+    """Refills `rate_per_second` tokens per second up to `capacity`. Not thread-safe; the pool locks."""
+
+    def __init__(self, rate_per_second: float, capacity: float):
+        self.rate_per_second = rate_per_second
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate_per_second)
+        self.updated_at = now
+
+    def seconds_until_available(self) -> float:
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate_per_second
+
+class _KeyState:
+    def __init__(self, api_key: str, rate_per_second: float, burst: int):
+        self.api_key = api_key
+        self.bucket = TokenBucket(rate_per_second, burst)
+        self.in_flight = 0
+        self.cooldown_until = 0.0
+        self.consecutive_failures = 0
+        self.requests = 0
+        self.successes = 0
+        self.rate_limited = 0
+        self.errors = 0
+
+    @property
+    def label(self) -> str:
+        # Keys are only ever shown by their last four characters.
+        return f"...{self.api_key[-4:]}"
+
+class ApiKeyLease:
+    """One granted request slot on a key; `client` is that key's API client."""
+
+    def __init__(self, api_key: str, client):
+        self.api_key = api_key
+        self.client = client
+
+class ApiKeyPool:
+    """
+    Thread-safe scheduler over several API keys. Each key has a token bucket
+    for its request rate and is put in cooldown after rate-limit (429) or
+    transient 5xx errors. A request goes to the healthy key with a free token
+    and the fewest requests in flight; when none is free the caller waits for
+    the earliest one instead of sending a request that would be rejected.
+    """
+
+    def __init__(self, api_keys: list, client_factory, requests_per_minute: float, burst: int = DEFAULT_BURST,
+                 cooldown_seconds: float = DEFAULT_COOLDOWN_SECONDS,
+                 max_cooldown_seconds: float = DEFAULT_MAX_COOLDOWN_SECONDS,
+                 acquire_timeout: float = DEFAULT_ACQUIRE_TIMEOUT_SECONDS, name: str = "gemini"):
+        if not api_keys:
+            raise ValueError("ApiKeyPool needs at least one API key.")
+        self.name = name
+        self.client_factory = client_factory
+        self.cooldown_seconds = cooldown_seconds
+        self.max_cooldown_seconds = max_cooldown_seconds
+        self.acquire_timeout = acquire_timeout
+        self._keys = [_KeyState(api_key, requests_per_minute / 60.0, burst) for api_key in api_keys]
+        self._condition = threading.Condition()
+
+    def __len__(self):
+        return len(self._keys)
+
+    def _pick(self, now: float):
+        # Caller holds the lock. Returns (key state or None, seconds until one may be free).
+        best = None
+        wait_seconds = float("inf")
+        for key in self._keys:
+            key.bucket.refill(now)
+            if key.cooldown_until > now:
+                wait_seconds = min(wait_seconds, key.cooldown_until - now)
+                continue
+            if key.bucket.tokens < 1:
+                wait_seconds = min(wait_seconds, key.bucket.seconds_until_available())
+                continue
+            if best is None or (key.in_flight, -key.bucket.tokens) < (best.in_flight, -best.bucket.tokens):
+                best = key
+        return best, wait_seconds
+
+    def acquire(self, timeout: float = None) -> ApiKeyLease:
+        """Takes a request slot on the best available key, waiting up to `timeout` seconds."""
+        timeout = self.acquire_timeout if timeout is None else timeout
+        started_at = time.monotonic()
+        deadline = started_at + timeout
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                key, wait_seconds = self._pick(now)
+                if key is not None:
+                    key.bucket.tokens -= 1
+                    key.in_flight += 1
+                    key.requests += 1
+                    break
+                if now >= deadline:
+                    API_KEY_WAIT_SECONDS.labels(self.name).observe(now - started_at)
+                    raise NoApiKeyAvailable(f"No {self.name} API key available within {timeout:g}s.")
+                # Woken early when a key is released or put back in service.
+                self._condition.wait(min(wait_seconds, deadline - now))
+        API_KEY_WAIT_SECONDS.labels(self.name).observe(time.monotonic() - started_at)
+        return ApiKeyLease(key.api_key, self.client_factory(key.api_key))
+
+    def release(self, lease: ApiKeyLease, error: Exception = None):
+        """Returns the slot; a rate-limit or transient error puts the key in cooldown."""
+        with self._condition:
+            key = next(state for state in self._keys if state.api_key == lease.api_key)
+            key.in_flight -= 1
+            if error is None:
+                result = "ok"
+                key.successes += 1
+                key.consecutive_failures = 0
+            elif is_rate_limit_error(error) or is_retryable_error(error):
+                result = "rate_limited" if is_rate_limit_error(error) else "server_error"
+                key.consecutive_failures += 1
+                if result == "rate_limited":
+                    key.rate_limited += 1
+                    cooldown = self.cooldown_seconds * 2 ** (key.consecutive_failures - 1)
+                else:
+                    key.errors += 1
+                    cooldown = self.cooldown_seconds / 4
+                cooldown = min(self.max_cooldown_seconds, cooldown)
+                key.cooldown_until = time.monotonic() + cooldown
+                logger.warning("%s key %s cooling down for %.1fs (%s).", self.name, key.label, cooldown, result)
+            else:
+                # Request errors (bad input, blocked content) say nothing about the key's health.
+                result = "error"
+                key.errors += 1
+            self._condition.notify_all()
+        API_KEY_REQUESTS.labels(self.name, key.label, result).inc()
+
+    @contextmanager
+    def lease(self, timeout: float = None):
+        """`with pool.lease() as lease:` acquires a key and releases it, reporting any error."""
+        lease = self.acquire(timeout)
+        error = None
+        try:
+            yield lease
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            # Also runs when an abandoned stream is closed mid-way.
+            self.release(lease, error)
+
+    def stats(self) -> list:
+        """Per-key usage (keys shown by their last four characters only)."""
+        now = time.monotonic()
+        with self._condition:
+            return [{
+                "key": key.label,
+                "requests": key.requests,
+                "successes": key.successes,
+                "rate_limited": key.rate_limited,
+                "errors": key.errors,
+                "in_flight": key.in_flight,
+                "tokens": round(min(key.bucket.capacity,
+                                    key.bucket.tokens + (now - key.bucket.updated_at) * key.bucket.rate_per_second), 2),
+                "cooldown_seconds": round(max(0.0, key.cooldown_until - now), 1),
+            } for key in self._keys]
+
+# --- Gemini clients and the process-wide pools ---
+_clients = {}
+_clients_lock = threading.Lock()
+_pools = {}
+_pools_lock = threading.Lock()
+
+def get_gemini_client(api_key: str):
+    """
+    One GenerativeServiceClient per key, shared by generation and embedding.
+    Unlike genai.configure, which swaps a process-global key, per-key clients
+    can be used from several threads at the same time.
+    """
+    with _clients_lock:
+        client = _clients.get(api_key)
+        if client is None:
+            from google.ai import generativelanguage as glm
+            from google.api_core.client_options import ClientOptions
+            client = glm.GenerativeServiceClient(client_options=ClientOptions(api_key=api_key))
+            _clients[api_key] = client
+        return client
+
+def get_gemini_key_pool(purpose: str) -> ApiKeyPool:
+    """The process-wide key pool for 'generation' or 'embedding' calls, built on first use."""
+    if purpose not in DEFAULT_REQUESTS_PER_MINUTE:
+        raise ValueError(f"Unknown Gemini key pool '{purpose}'.")
+    with _pools_lock:
+        pool = _pools.get(purpose)
+        if pool is None:
+            api_keys = load_gemini_api_keys()
+            if not api_keys:
+                raise ValueError("Missing Gemini API keys. Please ensure your .env file is correctly configured.")
+            pool = ApiKeyPool(
+                api_keys, get_gemini_client,
+                requests_per_minute=float(os.getenv(f"GEMINI_{purpose.upper()}_RPM_PER_KEY",
+                                                    DEFAULT_REQUESTS_PER_MINUTE[purpose])),
+                burst=int(os.getenv("GEMINI_KEY_BURST", DEFAULT_BURST)),
+                cooldown_seconds=float(os.getenv("GEMINI_KEY_COOLDOWN_SECONDS", DEFAULT_COOLDOWN_SECONDS)),
+                max_cooldown_seconds=float(os.getenv("GEMINI_KEY_MAX_COOLDOWN_SECONDS", DEFAULT_MAX_COOLDOWN_SECONDS)),
+                acquire_timeout=float(os.getenv("GEMINI_KEY_ACQUIRE_TIMEOUT_SECONDS", DEFAULT_ACQUIRE_TIMEOUT_SECONDS)),
+                name=f"gemini-{purpose}",
+            )
+            logger.info("Gemini %s key pool: %d keys.", purpose, len(pool))
+            _pools[purpose] = pool
+        return pool
+
+def gemini_key_stats() -> dict:
+    """Per-key usage of every pool created so far."""
+    with _pools_lock:
+        pools = dict(_pools)
+    return {purpose: pool.stats() for purpose, pool in pools.items()}
+
+def _is_deadline_exceeded(exc: Exception) -> bool:
+    try:
+        from google.api_core.exceptions import DeadlineExceeded
+    except ImportError:
+        return False
+    return isinstance(exc, DeadlineExceeded)
+
+def leased_call(pool: ApiKeyPool, call):
+    """
+    Runs call(lease, timeout) on a key leased from `pool`. Inside a timed
+    pipeline stage, both the wait for a key and the request (`timeout`
+    seconds, None outside a stage) end at the stage deadline, so an abandoned
+    stage does not keep its worker thread busy. A request cut off by that
+    deadline is reported as TimeoutError, which does not cool the key down.
+    """
+    timeout = stage_time_remaining()
+    if timeout is not None and timeout <= 0:
+        raise TimeoutError("Pipeline stage deadline passed before the Gemini request.")
+    with pool.lease(timeout=timeout) as lease:
+        try:
+            return call(lease, timeout)
+        except Exception as e:
+            if timeout is not None and _is_deadline_exceeded(e):
+                raise TimeoutError(f"Gemini request cut off at the pipeline stage deadline ({timeout:.1f}s).") from e
+            raise
+
+class PooledGenerativeModel:
+    """
+    Drop-in for genai.GenerativeModel whose generate_content takes a key from
+    the generation pool for each call and sends it on that key's client. A
+    streamed call keeps its key until the stream is consumed, so in-flight
+    counts reflect real load.
+    """
+
+    def __init__(self, model_name: str, pool: ApiKeyPool = None):
+        self.model_name = model_name if model_name.startswith("models/") else f"models/{model_name}"
+        self.pool = pool or get_gemini_key_pool("generation")
+
+    def _request(self, contents, generation_config=None, safety_settings=None):
+        from google.ai import generativelanguage as glm
+        from google.generativeai.types import content_types, generation_types, safety_types
+        request = {"model": self.model_name, "contents": content_types.to_contents(contents)}
+        if generation_config:
+            request["generation_config"] = generation_types.to_generation_config_dict(generation_config)
+        if safety_settings:
+            request["safety_settings"] = safety_types.normalize_safety_settings(safety_settings)
+        return glm.GenerateContentRequest(request)
+
+    def generate_content(self, contents, stream: bool = False, generation_config=None, safety_settings=None):
+        from google.generativeai.types import generation_types
+        request = self._request(contents, generation_config, safety_settings)
+        if stream:
+            return self._stream(request)
+        response = leased_call(self.pool, lambda lease, timeout: lease.client.generate_content(
+            request, **({"timeout": timeout} if timeout is not None else {})))
+        return generation_types.GenerateContentResponse.from_response(response)
+
+    def _stream(self, request):
+        from google.generativeai.types import generation_types
+        with self.pool.lease() as lease:
+            yield from generation_types.GenerateContentResponse.from_iterator(lease.client.stream_generate_content(request))
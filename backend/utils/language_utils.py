@@ -0,0 +1,138 @@
+import re
+import threading
+from collections import OrderedDict
+
+# langdetect is an n-gram (character profile) detector that runs fully offline.
+# It is optional: without it only the script-based rules below are available,
+# and Latin-script text is reported with zero confidence so callers fall back.
+try:
+    from langdetect import DetectorFactory, detect_langs
+    from langdetect.detector_factory import init_factory
+    from langdetect.lang_detect_exception import LangDetectException
+except ImportError:
+    detect_langs = None
+
+# Script-specific character ranges. A message written in one of these scripts
+# can be classified without any statistical model at all.
+_HANGUL_RE = re.compile(r'[ᄀ-ᇿ㄰-㆏가-힯]')
+_KANA_RE = re.compile(r'[぀-ヿ]')
+_HAN_RE = re.compile(r'[一-鿿]')
+_THAI_RE = re.compile(r'[฀-๿]')
+_CYRILLIC_RE = re.compile(r'[Ѐ-ӿ]')
+# Letters that only occur in Vietnamese among the Latin-script languages we serve
+# (đ, ơ, ư, ă and the stacked / dot-below / hook-above tone marks).
+_VIETNAMESE_RE = re.compile(
+    r'[đơưăạảấầẩẫậắằẳẵặẹẻẽếềểễệỉịọỏốồổỗộớờởỡợụủứừửữựỳỵỷỹĩũ]', re.IGNORECASE
+)
+# Vowels with a grave, acute, tilde or circumflex also occur in French, Spanish
+# or Portuguese, but short Vietnamese questions often use nothing else
+# ("APEC là gì?"). Short texts get a low langdetect confidence, so these marks
+# raise it, but only when langdetect's candidates are all Vietnamese.
+_VIETNAMESE_SHARED_RE = re.compile(r'[àáâãèéêìíòóôõùúý]', re.IGNORECASE)
+SHARED_DIACRITIC_CONFIDENCE = 0.85
+_LETTER_RE = re.compile(r'\w', re.UNICODE)
+
+# langdetect is unreliable on very short inputs ("ok", "yes", "có"), so its
+# probability is scaled down until the text has a reasonable length.
+MIN_CHARS_FOR_FULL_CONFIDENCE = 20
+
+_detector_lock = threading.Lock()
+_detector_ready = False
+
+def _ensure_detector_loaded():
+    """
+    Loads the langdetect language profiles exactly once per process. The profiles
+    are then shared by every detection call.
+    """
+    global _detector_ready
+    if _detector_ready or detect_langs is None:
+        return
+    with _detector_lock:
+        if not _detector_ready:
+            init_factory()
+            # A fixed seed makes langdetect deterministic for identical inputs.
+            DetectorFactory.seed = 0
+            _detector_ready = True
+
+def _normalize_lang_code(lang_code: str) -> str:
+    # langdetect reports Chinese as 'zh-cn' / 'zh-tw'; we only need ISO 639-1.
+    return lang_code.split('-')[0].lower()
+
+def detect_language_local(text: str):
+    """
+    Detects the language of the text without any network call.
+    Returns a tuple (ISO 639-1 language code, confidence in [0, 1]). A confidence
+    of 0 means the text could not be classified locally.
+    """
+    stripped = (text or "").strip()
+    letters = _LETTER_RE.findall(stripped)
+    if not letters:
+        return 'en', 0.0
+
+    # Script-based rules first: they are exact and cost a single regex scan.
+    total = len(letters)
+    hangul = len(_HANGUL_RE.findall(stripped))
+    if hangul:
+        return 'ko', min(1.0, 0.5 + hangul / total)
+    kana = len(_KANA_RE.findall(stripped))
+    if kana:
+        return 'ja', min(1.0, 0.5 + kana / total)
+    han = len(_HAN_RE.findall(stripped))
+    if han:
+        return 'zh', min(1.0, 0.5 + han / total)
+    thai = len(_THAI_RE.findall(stripped))
+    if thai:
+        return 'th', min(1.0, 0.5 + thai / total)
+    cyrillic = len(_CYRILLIC_RE.findall(stripped))
+    if cyrillic:
+        return 'ru', min(1.0, 0.5 + cyrillic / total)
+    if _VIETNAMESE_RE.search(stripped):
+        return 'vi', 0.95
+
+    # Latin script without Vietnamese-specific letters: use the n-gram model.
+    if detect_langs is None:
+        return 'en', 0.0
+    _ensure_detector_loaded()
+    try:
+        candidates = detect_langs(stripped)
+    except LangDetectException:
+        return 'en', 0.0
+    if not candidates:
+        return 'en', 0.0
+
+    best = candidates[0]
+    length_factor = min(1.0, len(stripped) / MIN_CHARS_FOR_FULL_CONFIDENCE)
+    lang_code, confidence = _normalize_lang_code(best.lang), best.prob * length_factor
+    if _VIETNAMESE_SHARED_RE.search(stripped) and all(_normalize_lang_code(c.lang) == 'vi' for c in candidates):
+        return 'vi', max(confidence, SHARED_DIACRITIC_CONFIDENCE)
+    return lang_code, confidence
+
+class SessionLanguageCache:
+    """
+    Remembers the last confidently detected language of each chat session, so
+    that short follow-ups such as "yes" / "no" reuse it instead of triggering
+    another detection. Bounded with LRU eviction to keep memory flat.
+    """
+
+    def __init__(self, max_sessions: int = 10000):
+        self.max_sessions = max_sessions
+        self._languages = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id):
+        if session_id is None:
+            return None
+        with self._lock:
+            lang_code = self._languages.get(session_id)
+            if lang_code is not None:
+                self._languages.move_to_end(session_id)
+            return lang_code
+
+    def set(self, session_id, lang_code: str):
+        if session_id is None:
+            return
+        with self._lock:
+            self._languages[session_id] = lang_code
+            self._languages.move_to_end(session_id)
+            while len(self._languages) > self.max_sessions:
+                self._languages.popitem(last=False)
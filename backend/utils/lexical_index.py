@@ -0,0 +1,140 @@
+import json
+import math
+import re
+from collections import Counter, defaultdict
+
+import numpy as np
+
+from backend.utils.cache_utils import normalize_cache_text
+from backend.utils.vector_store import make_result
+
+# Runs of digits and separators that look like phone numbers; their digits are
+# also indexed as one token so "779-6114" and "779 6114" match the same way.
+PHONE_NUMBER_PATTERN = re.compile(r'\+?\d[\d\s\-().]{5,}\d')
+# Standard reciprocal rank fusion constant: damps the weight of top ranks so
+# one list cannot dominate the fused order.
+RRF_K = 60
+
+def tokenize(text: str) -> list:
+    """Case-folded word tokens (Unicode-aware) plus digit-only tokens for phone numbers."""
+    normalized = normalize_cache_text(text)
+    tokens = re.findall(r'\w+', normalized)
+    for match in PHONE_NUMBER_PATTERN.finditer(normalized):
+        digits = re.sub(r'\D', '', match.group())
+        if len(digits) >= 7:
+            tokens.append(digits)
+    return tokens
+
+class BM25Index:
+    """
+    In-process BM25 inverted index over chunk texts. Each posting stores the
+    precomputed BM25 term-frequency weight, so a query is a handful of vector
+    additions over the postings of its terms.
+    """
+
+    def __init__(self, ids: list, texts: list, metadatas: list, k1: float = 1.5, b: float = 0.75):
+        self.ids = list(ids)
+        self.texts = list(texts)
+        self.metadatas = list(metadatas)
+        self.k1 = k1
+        self.b = b
+
+        term_frequencies = [Counter(tokenize(text)) for text in self.texts]
+        lengths = np.asarray([sum(tf.values()) for tf in term_frequencies], dtype='float32')
+        average_length = float(lengths.mean()) if len(lengths) and lengths.mean() > 0 else 1.0
+
+        postings = defaultdict(lambda: ([], []))
+        for row, tf in enumerate(term_frequencies):
+            length_norm = k1 * (1 - b + b * lengths[row] / average_length)
+            for term, count in tf.items():
+                rows, weights = postings[term]
+                rows.append(row)
+                weights.append(count * (k1 + 1) / (count + length_norm))
+
+        n = len(self.texts)
+        self.postings = {
+            term: (np.asarray(rows, dtype='int64'), np.asarray(weights, dtype='float32'))
+            for term, (rows, weights) in postings.items()
+        }
+        self.idf = {
+            term: math.log(1 + (n - len(rows) + 0.5) / (len(rows) + 0.5))
+            for term, (rows, _) in self.postings.items()
+        }
+        # Terms missing from the corpus count as maximally rare.
+        self.unknown_term_idf = math.log(1 + (n + 0.5) / 0.5)
+
+    @classmethod
+    def from_chunks(cls, chunks: list, **kwargs):
+        """Builds the index from processed chunks ({'id', 'content', 'metadata'})."""
+        return cls(
+            [chunk["id"] for chunk in chunks],
+            [chunk["content"] for chunk in chunks],
+            [chunk.get("metadata", {}) for chunk in chunks],
+            **kwargs
+        )
+
+    @classmethod
+    def from_chunks_file(cls, chunks_path: str, **kwargs):
+        with open(chunks_path, 'r', encoding='utf-8') as f:
+            return cls.from_chunks(json.load(f), **kwargs)
+
+    def _scores(self, terms: list):
+        scores = np.zeros(len(self.texts), dtype='float32')
+        for term in set(terms):
+            if term in self.postings:
+                rows, weights = self.postings[term]
+                scores[rows] += self.idf[term] * weights
+        return scores
+
+    def search(self, query: str, top_k: int = 5) -> list:
+        """Returns up to top_k results in the shared result schema, score = BM25."""
+        terms = tokenize(query)
+        if not terms or not self.texts:
+            return []
+        scores = self._scores(terms)
+        top_k = min(top_k, len(scores))
+        rows = np.argpartition(-scores, top_k - 1)[:top_k]
+        rows = rows[np.argsort(-scores[rows])]
+        return [
+            make_result(self.ids[row], scores[row], self.texts[row], self.metadatas[row])
+            for row in rows if scores[row] > 0
+        ]
+
+    def match_confidence(self, query: str, result: dict, rare_document_fraction: float = 0.05) -> float:
+        """
+        How completely a result covers the query, in [0, 1]: the IDF-weighted
+        share of query terms it contains. Returns 0 unless it also contains at
+        least one rare term (in at most rare_document_fraction of the chunks),
+        so generic words such as "APEC" alone never count as an exact hit.
+        """
+        terms = set(tokenize(query))
+        if not terms:
+            return 0.0
+        document_terms = set(tokenize(result["content"]))
+        rare_df = max(1, int(rare_document_fraction * len(self.texts)))
+        total_weight = matched_weight = 0.0
+        has_rare_term = False
+        for term in terms:
+            weight = self.idf.get(term, self.unknown_term_idf)
+            total_weight += weight
+            if term in document_terms:
+                matched_weight += weight
+                if len(self.postings[term][0]) <= rare_df:
+                    has_rare_term = True
+        return matched_weight / total_weight if has_rare_term else 0.0
+
+def reciprocal_rank_fusion(result_lists: list, top_k: int = 5, k: int = RRF_K) -> list:
+    """
+    Fuses ranked result lists by reciprocal rank: each result scores
+    sum(1 / (k + rank)) over the lists it appears in, matched by 'id'. The
+    first occurrence's fields are kept (its 'score' stays on the original
+    scale) and the fused score is added as 'fusion_score'.
+    """
+    fused = {}
+    for results in result_lists:
+        for rank, result in enumerate(results, start=1):
+            entry = fused.get(result["id"])
+            if entry is None:
+                entry = fused[result["id"]] = {**result, "fusion_score": 0.0}
+            entry["fusion_score"] += 1.0 / (k + rank)
+    return sorted(fused.values(), key=lambda result: result["fusion_score"], reverse=True)[:top_k]
@@ -0,0 +1,178 @@
+import atexit
+import contextvars
+import functools
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+import time
+import uuid
+
+# Level (DEBUG, INFO, WARNING, ...) of this project's loggers; third-party
+# libraries log at WARNING and above. Per-logger overrides, e.g.
+# LOG_LEVELS="backend.utils.pinecone_utils=DEBUG,faiss=INFO".
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+PROJECT_LOGGERS = ("app", "__main__", "backend")
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+# 'json' (one object per line, for log shippers) or 'text' (for terminals).
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+# Records waiting for the writer thread. When it is full new records are
+# dropped (and counted) rather than blocking the request.
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# Share of requests whose full LLM prompts are logged; the rest log only sizes.
+PROMPT_LOG_SAMPLE_RATE = float(os.getenv("PROMPT_LOG_SAMPLE_RATE", "0.01"))
+
+_request_id = contextvars.ContextVar("request_id", default=None)
+_log_prompts = contextvars.ContextVar("log_prompts", default=False)
+
+# Attributes every LogRecord has; anything else was passed through `extra=`.
+_STANDARD_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {
+    "message", "asctime", "request_id"
+}
+
+def _extra_fields(record) -> dict:
+    return {key: value for key, value in vars(record).items() if key not in _STANDARD_RECORD_FIELDS}
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+def current_request_id():
+    return _request_id.get()
+
+def start_request(request_id: str = None) -> str:
+    """
+    Tags the current context with a request ID (a new one unless given) and
+    decides, once per request, whether its full prompts are logged.
+    """
+    request_id = request_id or new_request_id()
+    _request_id.set(request_id)
+    _log_prompts.set(random.random() < PROMPT_LOG_SAMPLE_RATE)
+    return request_id
+
+def with_request_context(generator_fn):
+    """
+    Runs a generator function as one request: every step runs in its own
+    context carrying the request ID (kept if the caller already set one), so
+    log records carry the ID whichever thread drives the generator.
+    """
+    @functools.wraps(generator_fn)
+    def wrapper(*args, **kwargs):
+        context = contextvars.copy_context()
+        context.run(start_request, context.get(_request_id))
+        generator = context.run(generator_fn, *args, **kwargs)
+        try:
+            while True:
+                try:
+                    item = context.run(next, generator)
+                except StopIteration:
+                    return
+                yield item
+        finally:
+            context.run(generator.close)
+    return wrapper
+
+class _RequestIdFilter(logging.Filter):
+    # Runs in the logging thread, before the record is queued.
+    def filter(self, record):
+        record.request_id = _request_id.get()
+        return True
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that never blocks: records that do not fit are dropped and counted."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger, request_id, message and any `extra` fields."""
+
+    def format(self, record):
+        entry = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", None),
+            "message": record.getMessage(),
+        }
+        for key, value in _extra_fields(record).items():
+            entry.setdefault(key, value)
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class TextFormatter(logging.Formatter):
+    """Single-line text with `extra` fields as key=value; a logged prompt follows on its own lines."""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s [%(request_id)s] %(name)s: %(message)s")
+
+    def format(self, record):
+        record.request_id = getattr(record, "request_id", None) or "-"
+        line = super().format(record)
+        extras = _extra_fields(record)
+        prompt = extras.pop("prompt", None)
+        if extras:
+            line += " " + " ".join(f"{key}={value!r}" for key, value in extras.items())
+        return f"{line}\n{prompt}" if prompt is not None else line
+
+_configure_lock = threading.Lock()
+_queue_handler = None
+_listener = None
+
+def configure_logging():
+    """
+    Installs the queue-based handler on the root logger (once per process).
+    Callers only enqueue records; a background listener thread formats and
+    writes them to stdout, so slow terminals or pipes never stall a request.
+    """
+    global _queue_handler, _listener
+    with _configure_lock:
+        if _queue_handler is not None:
+            return
+        log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+        _queue_handler = _DroppingQueueHandler(log_queue)
+        _queue_handler.addFilter(_RequestIdFilter())
+
+        output_handler = logging.StreamHandler(sys.stdout)
+        output_handler.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else TextFormatter())
+        _listener = logging.handlers.QueueListener(log_queue, output_handler)
+        _listener.start()
+        # Flushes whatever is still queued when the process exits.
+        atexit.register(_listener.stop)
+
+        root = logging.getLogger()
+        root.addHandler(_queue_handler)
+        root.setLevel(logging.WARNING)
+        for name in PROJECT_LOGGERS:
+            logging.getLogger(name).setLevel(LOG_LEVEL)
+        for override in filter(None, (part.strip() for part in LOG_LEVELS.split(","))):
+            name, _, level = override.partition("=")
+            logging.getLogger(name.strip()).setLevel(level.strip().upper())
+
+def get_logger(name: str) -> logging.Logger:
+    configure_logging()
+    return logging.getLogger(name)
+
+def dropped_log_records() -> int:
+    return _queue_handler.dropped if _queue_handler is not None else 0
+
+def log_prompt(logger: logging.Logger, purpose: str, prompt: str):
+    """
+    Logs an LLM prompt: in full for the sampled share of requests (or at
+    DEBUG level), otherwise only its size.
+    """
+    if _log_prompts.get() or logger.isEnabledFor(logging.DEBUG):
+        logger.info("LLM prompt", extra={"purpose": purpose, "prompt_chars": len(prompt), "prompt": prompt})
+    else:
+        logger.info("LLM prompt", extra={"purpose": purpose, "prompt_chars": len(prompt)})
@@ -0,0 +1,133 @@
+import contextlib
+import os
+import threading
+import time
+
+from backend.utils.logging_utils import get_logger
+
+logger = get_logger(__name__)
+
+# prometheus_client is optional: without it every metric below is a no-op, so
+# instrumented code never has to check whether metrics are available.
+try:
+    from prometheus_client import CONTENT_TYPE_LATEST, Counter, Histogram, generate_latest, start_http_server
+except ImportError:
+    Counter = Histogram = None
+    CONTENT_TYPE_LATEST = "text/plain; version=0.0.4; charset=utf-8"
+
+# Port of the standalone /metrics server started by processes without their own
+# HTTP API (the Gradio app). Unset = no sidecar server.
+METRICS_PORT = os.getenv("METRICS_PORT")
+
+# Latency buckets (seconds) spanning local lookups up to slow LLM generations.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+SCORE_BUCKETS = (0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0)
+PROMPT_CHARS_BUCKETS = (250, 500, 1000, 2000, 4000, 8000, 16000, 32000)
+
+class _NoOpMetric:
+    """Stands in for a Counter or Histogram when prometheus_client is not installed."""
+
+    def labels(self, *args, **kwargs):
+        return self
+
+    def inc(self, amount: float = 1):
+        pass
+
+    def observe(self, value: float):
+        pass
+
+def _counter(name: str, documentation: str, labelnames=()):
+    return Counter(name, documentation, labelnames) if Counter else _NoOpMetric()
+
+def _histogram(name: str, documentation: str, labelnames=(), buckets=LATENCY_BUCKETS):
+    return Histogram(name, documentation, labelnames, buckets=buckets) if Histogram else _NoOpMetric()
+
+LLM_CALL_SECONDS = _histogram("rag_llm_call_seconds", "Gemini call latency, by purpose.", ["purpose"])
+LLM_CALLS = _counter("rag_llm_calls_total", "Gemini calls, by purpose and outcome.", ["purpose", "status"])
+LLM_PROMPT_CHARS = _histogram("rag_llm_prompt_chars", "Prompt size in characters, by purpose.", ["purpose"],
+                              buckets=PROMPT_CHARS_BUCKETS)
+EMBEDDING_SECONDS = _histogram("rag_embedding_seconds", "Embedding call latency, by encoder.", ["encoder"])
+EMBEDDING_TEXTS = _counter("rag_embedding_texts_total", "Texts sent to an encoder, by encoder.", ["encoder"])
+VECTOR_QUERY_SECONDS = _histogram("rag_vector_query_seconds", "Vector search latency, by backend.", ["backend"])
+RETRIEVED_CHUNK_SCORE = _histogram("rag_retrieved_chunk_score", "Cosine score of each retrieved chunk.",
+                                   buckets=SCORE_BUCKETS)
+CACHE_LOOKUPS = _counter("rag_cache_lookups_total", "Cache lookups, by cache and result.", ["cache", "result"])
+STAGE_SECONDS = _histogram("rag_stage_seconds", "Wall time of each pipeline stage.", ["stage"])
+REQUEST_SECONDS = _histogram("rag_request_seconds", "End-to-end request latency, by endpoint.", ["endpoint"])
+ERRORS = _counter("rag_errors_total", "Errors, by component.", ["component"])
+API_KEY_REQUESTS = _counter("rag_api_key_requests_total", "Requests sent with each pooled API key, by outcome.",
+                            ["pool", "key", "result"])
+API_KEY_WAIT_SECONDS = _histogram("rag_api_key_wait_seconds", "Time spent waiting for a pooled API key.", ["pool"])
+
+@contextlib.contextmanager
+def track_llm_call(purpose: str, prompt: str = None):
+    """
+    Times one Gemini call (wrap a streamed call around its whole iteration) and
+    counts it as 'ok' or 'error'. The exception, if any, is re-raised.
+    """
+    if prompt is not None:
+        LLM_PROMPT_CHARS.labels(purpose).observe(len(prompt))
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        LLM_CALLS.labels(purpose, "error").inc()
+        ERRORS.labels(f"llm_{purpose}").inc()
+        raise
+    else:
+        LLM_CALLS.labels(purpose, "ok").inc()
+    finally:
+        LLM_CALL_SECONDS.labels(purpose).observe(time.perf_counter() - start)
+
+@contextlib.contextmanager
+def track_duration(histogram, *labels):
+    """Observes the wall time of the block on `histogram` (with the given label values)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metric = histogram.labels(*labels) if labels else histogram
+        metric.observe(time.perf_counter() - start)
+
+def record_cache_lookup(cache: str, hit: bool):
+    CACHE_LOOKUPS.labels(cache, "hit" if hit else "miss").inc()
+
+def record_retrieved_scores(results: list):
+    """Observes the 'score' of every result in the shared result schema."""
+    for result in results:
+        RETRIEVED_CHUNK_SCORE.observe(result["score"])
+
+def record_stage_timings(timings: dict):
+    """Observes the per-stage wall times (seconds) filled in by run_stage_graph."""
+    for stage, seconds in timings.items():
+        STAGE_SECONDS.labels(stage).observe(seconds)
+
+def render_metrics():
+    """Returns (body, content type) for a /metrics response; empty without prometheus_client."""
+    if Counter is None:
+        return b"", CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+_sidecar_lock = threading.Lock()
+_sidecar_started = False
+
+def start_metrics_sidecar(port=None) -> bool:
+    """
+    Serves /metrics on its own port from a daemon thread (for processes such as
+    the Gradio app that have no API of their own). Port defaults to
+    METRICS_PORT; nothing is started when neither is set. Returns True once the
+    server is running.
+    """
+    global _sidecar_started
+    port = port or METRICS_PORT
+    if not port:
+        return False
+    if Counter is None:
+        logger.warning("prometheus_client is not installed; metrics sidecar not started.")
+        return False
+    with _sidecar_lock:
+        if not _sidecar_started:
+            start_http_server(int(port))
+            _sidecar_started = True
+            logger.info("Serving Prometheus metrics on port %s.", port)
+    return True
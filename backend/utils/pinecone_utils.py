@@ -2,8 +2,20 @@ import os
 from dotenv import load_dotenv
 from pinecone import Pinecone as PC_Client, ServerlessSpec # Explicitly import ServerlessSpec
 import google.generativeai as genai
-import itertools
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from tqdm.auto import tqdm
+from backend.utils.cache_utils import embedding_cache_from_env
+from backend.utils.gemini_keys import get_gemini_key_pool, leased_call, load_gemini_api_keys
+from backend.utils.logging_utils import get_logger
+from backend.utils.metrics import (
+    EMBEDDING_SECONDS, EMBEDDING_TEXTS, ERRORS, VECTOR_QUERY_SECONDS, track_duration
+)
+from backend.utils.retry_utils import retry_with_backoff
+
+logger = get_logger(__name__)
 
 # Defines the path to the .env file. This explicit pathing ensures environment
 # variables are loaded reliably regardless of where the script is executed from.
@@ -14,29 +26,109 @@ load_dotenv(dotenv_path=dotenv_path)
 # Raises an error if essential keys are missing to prevent runtime failures.
 PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
 PINECONE_ENVIRONMENT = os.getenv("PINECONE_ENVIRONMENT")
-# Collects up to 5 Gemini API keys for rotation, enhancing rate limit management.
-GEMINI_API_KEYS = [os.getenv(f"GEMINI_API_KEY_0{i}") for i in range(1, 6) if os.getenv(f"GEMINI_API_KEY_0{i}")]
+# Collects up to 5 Gemini API keys; requests are spread over them by the key pool.
+GEMINI_API_KEYS = load_gemini_api_keys()
+
+# Gemini keys are always needed (embeddings); Pinecone keys are only checked when
+# a Pinecone client is created, so in-process vector stores work without them.
+if not GEMINI_API_KEYS:
+    raise ValueError("Missing Gemini API keys. Please ensure your .env file is correctly configured.")
 
-if not PINECONE_API_KEY or not PINECONE_ENVIRONMENT or not GEMINI_API_KEYS:
-    raise ValueError("Missing Pinecone or Gemini API keys. Please ensure your .env file is correctly configured.")
+GEMINI_EMBEDDING_MODEL = "models/text-embedding-004"
 
-# Cycles through available Gemini API keys for distributed usage.
-gemini_api_key_cycler = itertools.cycle(GEMINI_API_KEYS)
+# Caches embeddings by (model, task_type, normalized text). Repeated questions
+# (e.g. the Gradio example prompts) then skip the embedding API call entirely.
+# Configured through EMBEDDING_CACHE_MAX_ENTRIES / _TTL_SECONDS / _PATH; setting
+# EMBEDDING_CACHE_PATH enables the on-disk tier that survives restarts.
+embedding_cache = embedding_cache_from_env()
+
+def _embed_content(texts, task_type: str):
+    # Every attempt leases a key from the embedding pool, so a retry after a
+    # 429 goes to another key while the throttled one cools down. Inside a
+    # timed pipeline stage the wait and the request end at the stage deadline.
+    return leased_call(get_gemini_key_pool("embedding"), lambda lease, timeout: genai.embed_content(
+        model=GEMINI_EMBEDDING_MODEL, content=texts, task_type=task_type, client=lease.client,
+        request_options={"timeout": timeout} if timeout is not None else None))
+
+def _embed_with_gemini(text: str, task_type: str):
+    EMBEDDING_TEXTS.labels("gemini").inc()
+    try:
+        with track_duration(EMBEDDING_SECONDS, "gemini"):
+            response = _embed_content(text, task_type)
+        return response['embedding']
+    except Exception as e:
+        # Logs the embedding error without halting the process, useful for debugging batches.
+        logger.error("Embedding error for '%s...': %s", text[:50], e)
+        ERRORS.labels("embedding").inc()
+        return None
 
 def get_gemini_embedding(text: str, task_type: str = "RETRIEVAL_DOCUMENT"):
     """
     Generates an embedding for the given text using a Gemini text embedding model.
-    It rotates through configured API keys to manage rate limits.
+    Requests go through the embedding key pool, which respects each key's rate
+    limit and skips keys cooling down after errors. Repeated texts are served
+    from the embedding cache.
+    """
+    return embedding_cache.get_or_compute(
+        GEMINI_EMBEDDING_MODEL, task_type, text,
+        lambda uncached_text: _embed_with_gemini(uncached_text, task_type)
+    )
+
+# Gemini's batchEmbedContents accepts at most 100 texts per request.
+GEMINI_EMBEDDING_MAX_BATCH_SIZE = 100
+# Concurrent embedding requests allowed per API key during bulk embedding.
+GEMINI_EMBEDDING_REQUESTS_PER_KEY = int(os.getenv("GEMINI_EMBEDDING_REQUESTS_PER_KEY", "2"))
+
+embedding_executor = ThreadPoolExecutor(
+    max_workers=len(GEMINI_API_KEYS) * GEMINI_EMBEDDING_REQUESTS_PER_KEY,
+    thread_name_prefix="gemini-embed"
+)
+
+def _embed_batch(texts: list, task_type: str, max_attempts: int = 1):
     """
-    current_api_key = next(gemini_api_key_cycler)
-    genai.configure(api_key=current_api_key)
+    Embeds up to GEMINI_EMBEDDING_MAX_BATCH_SIZE texts with one batch request
+    on a pooled key, retrying rate-limit and 5xx errors with exponential
+    backoff up to max_attempts. Returns one vector per text, or Nones if the
+    request failed.
+    """
+    EMBEDDING_TEXTS.labels("gemini").inc(len(texts))
     try:
-        response = genai.embed_content(model="models/text-embedding-004", content=text, task_type=task_type)
+        with track_duration(EMBEDDING_SECONDS, "gemini"):
+            response = retry_with_backoff(
+                _embed_content, texts, task_type,
+                max_attempts=max_attempts, description="Gemini batch embedding"
+            )
         return response['embedding']
     except Exception as e:
-        # Logs the embedding error without halting the process, useful for debugging batches.
-        print(f"Embedding error for '{text[:50]}...': {e}")
-        return None
+        logger.error("Batch embedding error for %d texts (first: '%s...'): %s", len(texts), texts[0][:50], e)
+        ERRORS.labels("embedding").inc()
+        return [None] * len(texts)
+
+def get_gemini_embeddings(texts: list, task_type: str = "RETRIEVAL_DOCUMENT", max_attempts: int = 1):
+    """
+    Embeds many texts at once. Cached texts are served from the embedding cache;
+    the rest are split into batch requests sent in parallel, each on the least
+    loaded key of the embedding pool. Returns one vector (or None on failure) per text.
+    """
+    embeddings = [embedding_cache.get(GEMINI_EMBEDDING_MODEL, task_type, text) for text in texts]
+    missing_positions = [i for i, embedding in enumerate(embeddings) if embedding is None]
+    if not missing_positions:
+        return embeddings
+
+    # Sub-batches are sized so every key gets work, but never above the API limit.
+    sub_batch_size = min(GEMINI_EMBEDDING_MAX_BATCH_SIZE, math.ceil(len(missing_positions) / len(GEMINI_API_KEYS)))
+    futures = []
+    for start in range(0, len(missing_positions), sub_batch_size):
+        positions = missing_positions[start:start + sub_batch_size]
+        future = embedding_executor.submit(_embed_batch, [texts[i] for i in positions], task_type, max_attempts)
+        futures.append((positions, future))
+
+    for positions, future in futures:
+        for position, embedding in zip(positions, future.result()):
+            if embedding is not None:
+                embedding_cache.set(GEMINI_EMBEDDING_MODEL, task_type, texts[position], embedding)
+            embeddings[position] = embedding
+    return embeddings
 
 # Defines the standard embedding dimension for consistency with the model.
 EMBEDDING_DIMENSION = 768
@@ -49,11 +141,13 @@ def initialize_pinecone_client():
     """
     global pc_client_instance
     if pc_client_instance is None:
+        if not PINECONE_API_KEY or not PINECONE_ENVIRONMENT:
+            raise ValueError("Missing Pinecone API keys. Please ensure your .env file is correctly configured.")
         try:
             pc_client_instance = PC_Client(api_key=PINECONE_API_KEY, environment=PINECONE_ENVIRONMENT)
-            print("Pinecone client initialized successfully.")
+            logger.info("Pinecone client initialized successfully.")
         except Exception as e:
-            print(f"Pinecone client initialization failed: {e}")
+            logger.error("Pinecone client initialization failed: %s", e)
             raise # Re-raises the exception as this is a critical failure.
 
 def create_or_connect_pinecone_index(index_name: str):
@@ -66,68 +160,198 @@ def create_or_connect_pinecone_index(index_name: str):
     existing_index_names = [idx['name'] for idx in pc_client_instance.list_indexes()]
 
     if index_name not in existing_index_names:
-        print(f"Creating Pinecone index '{index_name}' with dimension {EMBEDDING_DIMENSION}...")
+        logger.info("Creating Pinecone index '%s' with dimension %d...", index_name, EMBEDDING_DIMENSION)
         pc_client_instance.create_index(
             name=index_name, 
             dimension=EMBEDDING_DIMENSION, 
             metric='cosine', 
             spec=ServerlessSpec(cloud='aws', region=PINECONE_ENVIRONMENT) # Using ServerlessSpec directly
         )
-        print(f"Index '{index_name}' created successfully.")
+        logger.info("Index '%s' created successfully.", index_name)
     else:
-        print(f"Connected to existing Pinecone index '{index_name}'.")
+        logger.info("Connected to existing Pinecone index '%s'.", index_name)
     
-    return pc_client_instance.Index(index_name) # Returns the index object for interaction.
+    # Returns the pooled, cached handle so ingestion and queries share connections.
+    return pinecone_index_manager.get_index(index_name)
+
+# Connection settings for data-plane index handles. Each handle keeps its own
+# keep-alive HTTP connection pool, so handles are created once and reused.
+PINECONE_POOL_THREADS = int(os.getenv("PINECONE_POOL_THREADS", "4"))
+PINECONE_CONNECTION_POOL_MAXSIZE = int(os.getenv("PINECONE_CONNECTION_POOL_MAXSIZE", "16"))
+PINECONE_HEALTH_CHECK_INTERVAL_SECONDS = float(os.getenv("PINECONE_HEALTH_CHECK_INTERVAL_SECONDS", "60"))
+
+class PineconeIndexManager:
+    """
+    Resolves each index's data-plane host once and caches the resulting Index
+    handle, so the query hot path does not pay a list_indexes / describe_index
+    control-plane round trip per request. Optional background threads warm the
+    connection pool up and periodically health-check the cached handles.
+    """
+
+    def __init__(self, pool_threads: int = PINECONE_POOL_THREADS, connection_pool_maxsize: int = PINECONE_CONNECTION_POOL_MAXSIZE):
+        self.pool_threads = pool_threads
+        self.connection_pool_maxsize = connection_pool_maxsize
+        self._indexes = {}
+        self._health = {}
+        self._lock = threading.Lock()
+        self._health_thread = None
+        self._stop_event = threading.Event()
+
+    def get_index(self, index_name: str):
+        """Returns the cached Index handle, resolving it on first use."""
+        pinecone_index = self._indexes.get(index_name)
+        if pinecone_index is not None:
+            return pinecone_index
+
+        with self._lock:
+            pinecone_index = self._indexes.get(index_name)
+            if pinecone_index is None:
+                initialize_pinecone_client()
+                host = pc_client_instance.describe_index(index_name).host
+                pinecone_index = pc_client_instance.Index(
+                    host=host,
+                    pool_threads=self.pool_threads,
+                    connection_pool_maxsize=self.connection_pool_maxsize
+                )
+                self._indexes[index_name] = pinecone_index
+                logger.info("Resolved Pinecone index '%s' at host '%s'.", index_name, host)
+            return pinecone_index
+
+    def invalidate(self, index_name: str):
+        """Drops a cached handle, e.g. after the index was deleted or recreated."""
+        with self._lock:
+            self._indexes.pop(index_name, None)
+
+    def check_health(self, index_name: str) -> bool:
+        """
+        Runs a lightweight stats call on the index. On failure the handle is
+        dropped so the next query re-resolves the host.
+        """
+        try:
+            self.get_index(index_name).describe_index_stats()
+            healthy = True
+        except Exception as e:
+            logger.warning("Pinecone health check failed for '%s': %s", index_name, e)
+            self.invalidate(index_name)
+            healthy = False
+        self._health[index_name] = {"healthy": healthy, "checked_at": time.time()}
+        return healthy
+
+    def warm_up(self, index_name: str, background: bool = True):
+        """
+        Resolves the handle and opens a pooled connection ahead of the first
+        user query. Runs in a daemon thread unless background is False.
+        """
+        if not background:
+            return self.check_health(index_name)
+        threading.Thread(target=self.check_health, args=(index_name,), daemon=True, name=f"pinecone-warmup-{index_name}").start()
+
+    def start_health_checks(self, index_names: list, interval_seconds: float = PINECONE_HEALTH_CHECK_INTERVAL_SECONDS):
+        """Starts one daemon thread that health-checks the given indexes periodically."""
+        if self._health_thread is not None and self._health_thread.is_alive():
+            return
+
+        def run():
+            while not self._stop_event.wait(interval_seconds):
+                for index_name in index_names:
+                    self.check_health(index_name)
+
+        self._stop_event.clear()
+        self._health_thread = threading.Thread(target=run, daemon=True, name="pinecone-health-check")
+        self._health_thread.start()
+
+    def stop_health_checks(self):
+        self._stop_event.set()
+
+    def health(self) -> dict:
+        return dict(self._health)
+
+pinecone_index_manager = PineconeIndexManager()
+
+def build_pinecone_vectors(chunks: list, embeddings: list):
+    """
+    Pairs chunks with their embeddings in Pinecone's upsert format.
+    Returns (vectors, failed_ids) where failed_ids lists chunks without an embedding.
+    """
+    vectors = []
+    failed_ids = []
+    for chunk, embedding in zip(chunks, embeddings):
+        if not embedding:
+            failed_ids.append(chunk["id"])
+            continue
+        chunk_metadata = chunk["metadata"].copy()
+        # Stores the original text in metadata for direct retrieval,
+        # avoiding re-fetching from a separate source.
+        chunk_metadata['original_text'] = chunk["content"]
+        vectors.append({
+            "id": chunk["id"],
+            "values": embedding,
+            "metadata": chunk_metadata
+        })
+    return vectors, failed_ids
 
 def upsert_chunks_to_pinecone(index_name: str, chunks: list, batch_size: int = 100):
     """
     Generates embeddings for a list of text chunks and upserts them into
     the specified Pinecone index in batches for efficiency.
     Includes original text in metadata for easier retrieval and debugging.
+    Returns the IDs of chunks that could not be embedded or upserted.
     """
     pinecone_index = create_or_connect_pinecone_index(index_name)
-    print(f"Preparing to upsert {len(chunks)} chunks to '{index_name}'...")
-    
-    for i in tqdm(range(0, len(chunks), batch_size), desc="Upserting chunks"):
+    logger.info("Preparing to upsert %d chunks to '%s'...", len(chunks), index_name)
+
+    batch_starts = list(range(0, len(chunks), batch_size))
+    # The next batch is embedded in the background while the current one is
+    # being upserted, so embedding and upsert round trips overlap.
+    prefetch_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embed-prefetch")
+
+    def embed_batch(start):
+        return get_gemini_embeddings([chunk["content"] for chunk in chunks[start:start + batch_size]])
+
+    next_embeddings = prefetch_executor.submit(embed_batch, batch_starts[0]) if batch_starts else None
+    failed_ids = []
+
+    for batch_number, i in enumerate(tqdm(batch_starts, desc="Upserting chunks")):
         batch = chunks[i:i + batch_size]
-        vectors_to_upsert = []
-        for chunk in batch:
-            embedding = get_gemini_embedding(chunk["content"])
-            if embedding:
-                chunk_metadata = chunk["metadata"].copy()
-                # Stores the original text in metadata for direct retrieval,
-                # avoiding re-fetching from a separate source.
-                chunk_metadata['original_text'] = chunk["content"] 
-                
-                vectors_to_upsert.append({
-                    "id": chunk["id"],
-                    "values": embedding,
-                    "metadata": chunk_metadata
-                })
-        
+        embeddings = next_embeddings.result()
+        if batch_number + 1 < len(batch_starts):
+            next_embeddings = prefetch_executor.submit(embed_batch, batch_starts[batch_number + 1])
+
+        vectors_to_upsert, batch_failed_ids = build_pinecone_vectors(batch, embeddings)
+        failed_ids.extend(batch_failed_ids)
+
         if vectors_to_upsert:
             try:
                 pinecone_index.upsert(vectors=vectors_to_upsert)
             except Exception as e:
                 # Logs batch-specific errors without stopping the entire upsert process.
-                print(f"Error upserting batch {i}-{i+len(vectors_to_upsert)}: {e}")
-    print(f"Finished upserting all batches to '{index_name}'.")
+                logger.error("Error upserting batch %d-%d: %s", i, i + len(vectors_to_upsert), e)
+                failed_ids.extend(vector["id"] for vector in vectors_to_upsert)
+    prefetch_executor.shutdown()
+    if failed_ids:
+        logger.warning("%d chunks were not upserted to '%s': %s", len(failed_ids), index_name, failed_ids)
+    logger.info("Finished upserting all batches to '%s'.", index_name)
+    return failed_ids
 
-def query_pinecone_index(index_name: str, query_text: str, top_k: int = 5):
+def query_pinecone_index(index_name: str, query_text: str, top_k: int = 5, query_embedding: list = None):
     """
     Queries the specified Pinecone index with a given text query.
     It embeds the query, performs a similarity search, and retrieves
     the top 'k' matching chunks along with their scores and metadata.
+    A precomputed query embedding can be passed to skip the embedding step.
     """
-    pinecone_index = create_or_connect_pinecone_index(index_name)
-    query_embedding = get_gemini_embedding(query_text, task_type="RETRIEVAL_QUERY")
+    # Uses the cached handle: no control-plane call on the query hot path.
+    pinecone_index = pinecone_index_manager.get_index(index_name)
+    if query_embedding is None:
+        query_embedding = get_gemini_embedding(query_text, task_type="RETRIEVAL_QUERY")
     
     if not query_embedding: 
-        print("Could not generate embedding for the query. Returning empty results.")
+        logger.warning("Could not generate embedding for the query. Returning empty results.")
         return []
     
     try:
-        results = pinecone_index.query(vector=query_embedding, top_k=top_k, include_metadata=True)
+        with track_duration(VECTOR_QUERY_SECONDS, "pinecone"):
+            results = pinecone_index.query(vector=query_embedding, top_k=top_k, include_metadata=True)
         retrieved_chunks = []
         for match in results.matches:
             retrieved_chunks.append({
@@ -138,5 +362,6 @@ def query_pinecone_index(index_name: str, query_text: str, top_k: int = 5):
             })
         return retrieved_chunks
     except Exception as e:
-        print(f"Error querying Pinecone index '{index_name}': {e}")
+        logger.error("Error querying Pinecone index '%s': %s", index_name, e)
+        ERRORS.labels("vector_query").inc()
         return []
\ No newline at end of file
@@ -0,0 +1,115 @@
+import contextvars
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from backend.utils.logging_utils import get_logger
+
+logger = get_logger(__name__)
+
+# perf_counter() deadline of the stage running in the current context, if it has a timeout.
+_stage_deadline = contextvars.ContextVar("stage_deadline", default=None)
+
+def stage_time_remaining():
+    """
+    Seconds left before the current pipeline stage times out (0 once it has),
+    or None outside a stage with a timeout. Blocking calls made by a stage
+    (LLM and embedding requests) use it as their own timeout, so a stage that
+    was abandoned stops holding its worker thread soon after its deadline.
+    """
+    deadline = _stage_deadline.get()
+    return None if deadline is None else max(0.0, deadline - time.perf_counter())
+
+class StageError(Exception):
+    """Raised when a pipeline stage fails or times out and has no fallback."""
+
+    def __init__(self, stage_name: str, cause: Exception):
+        super().__init__(f"Stage '{stage_name}' failed: {cause}")
+        self.stage_name = stage_name
+        self.cause = cause
+
+class Stage:
+    """
+    One node of a pipeline dependency graph.
+    `fn` receives a dict with the results of the stages listed in `depends_on`.
+    `fallback`, if given, is called with the exception when the stage fails or
+    exceeds `timeout` seconds, and its return value is used as the stage result.
+    """
+
+    def __init__(self, name: str, fn, depends_on=(), timeout: float = None, fallback=None):
+        self.name = name
+        self.fn = fn
+        self.depends_on = tuple(depends_on)
+        self.timeout = timeout
+        self.fallback = fallback
+
+def run_stage_graph(stages: list, executor: ThreadPoolExecutor, timings: dict = None) -> dict:
+    """
+    Runs the stages on the executor as soon as their dependencies are done, so
+    independent stages overlap and the total wall time follows the critical path.
+    Returns a dict of stage name -> result. Per-stage wall times (seconds) are
+    written into `timings` when provided.
+    A timed-out stage keeps running in its worker thread, but its result is
+    discarded in favour of the fallback so the pipeline is never held up by it.
+    Threads cannot be interrupted, so stages bound their own blocking calls
+    with stage_time_remaining(); otherwise slow abandoned stages can fill the
+    executor and delay later pipelines.
+    Stages run in a copy of the caller's context, so they log its request ID.
+    """
+    stages_by_name = {stage.name: stage for stage in stages}
+    for stage in stages:
+        for dependency in stage.depends_on:
+            if dependency not in stages_by_name:
+                raise ValueError(f"Stage '{stage.name}' depends on unknown stage '{dependency}'.")
+
+    results = {}
+    pending = dict(stages_by_name)
+    running = {}  # future -> (stage, start time)
+
+    def resolve(stage, value, started_at):
+        results[stage.name] = value
+        if timings is not None:
+            timings[stage.name] = time.perf_counter() - started_at
+
+    def fail(stage, exc, started_at):
+        if stage.fallback is None:
+            raise StageError(stage.name, exc) from exc
+        logger.warning("Stage '%s' failed (%s). Using fallback.", stage.name, exc)
+        resolve(stage, stage.fallback(exc), started_at)
+
+    while pending or running:
+        # Submits every stage whose dependencies have all produced a result.
+        for name, stage in list(pending.items()):
+            if all(dependency in results for dependency in stage.depends_on):
+                inputs = {dependency: results[dependency] for dependency in stage.depends_on}
+                started_at = time.perf_counter()
+                context = contextvars.copy_context()
+                context.run(_stage_deadline.set, started_at + stage.timeout if stage.timeout is not None else None)
+                future = executor.submit(context.run, stage.fn, inputs)
+                running[future] = (stage, started_at)
+                del pending[name]
+
+        if not running:
+            unresolved = ", ".join(sorted(pending))
+            raise ValueError(f"Pipeline stages have circular dependencies: {unresolved}")
+
+        # Waits until the next stage finishes or the nearest stage deadline passes.
+        now = time.perf_counter()
+        deadlines = [started_at + stage.timeout - now for stage, started_at in running.values() if stage.timeout is not None]
+        wait_timeout = max(0.0, min(deadlines)) if deadlines else None
+        done, _ = wait(list(running), timeout=wait_timeout, return_when=FIRST_COMPLETED)
+
+        for future in done:
+            stage, started_at = running.pop(future)
+            try:
+                resolve(stage, future.result(), started_at)
+            except Exception as e:
+                fail(stage, e, started_at)
+
+        now = time.perf_counter()
+        for future, (stage, started_at) in list(running.items()):
+            if stage.timeout is not None and now - started_at >= stage.timeout:
+                del running[future]
+                future.cancel()
+                fail(stage, TimeoutError(f"timed out after {stage.timeout}s"), started_at)
+
+    return results
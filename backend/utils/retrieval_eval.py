@@ -0,0 +1,129 @@
+import hashlib
+import json
+import time
+
+from backend.utils.benchmark_utils import LatencyRecorder
+
+# Cut-offs reported for recall; MRR is computed over the deepest one.
+DEFAULT_KS = (1, 3, 5, 10)
+
+def load_golden_set(path: str) -> dict:
+    """
+    Loads a golden query set: {'version', 'queries': [{'id', 'query',
+    'language', 'relevant_ids'}]}. Queries with no relevant IDs are out of
+    scope; they only count towards the confidence-threshold report.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        golden = json.load(f)
+    if 'version' not in golden or not golden.get('queries'):
+        raise ValueError(f"'{path}' is not a golden set: it needs a 'version' and a non-empty 'queries' list.")
+    seen = set()
+    for query in golden['queries']:
+        missing = {'id', 'query', 'relevant_ids'} - set(query)
+        if missing:
+            raise ValueError(f"Golden query {query.get('id', '?')} is missing {sorted(missing)}.")
+        if query['id'] in seen:
+            raise ValueError(f"Duplicate golden query id '{query['id']}'.")
+        seen.add(query['id'])
+    return golden
+
+def golden_set_fingerprint(golden: dict) -> str:
+    """Short hash of the queries and their labels; runs are only comparable when it matches."""
+    canonical = json.dumps(golden['queries'], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()[:16]
+
+def missing_relevant_ids(golden: dict, chunk_ids) -> list:
+    """Relevant IDs that no longer exist in the corpus (e.g. after re-chunking), which would cap recall."""
+    chunk_ids = set(chunk_ids)
+    return sorted({chunk_id for query in golden['queries'] for chunk_id in query['relevant_ids']} - chunk_ids)
+
+def recall_at_k(retrieved_ids: list, relevant_ids: list, k: int) -> float:
+    """Share of the relevant IDs found in the top k results."""
+    return len(set(retrieved_ids[:k]) & set(relevant_ids)) / len(relevant_ids)
+
+def reciprocal_rank(retrieved_ids: list, relevant_ids: list) -> float:
+    """1 / rank of the first relevant result, 0 when none was retrieved."""
+    relevant_ids = set(relevant_ids)
+    for rank, chunk_id in enumerate(retrieved_ids, start=1):
+        if chunk_id in relevant_ids:
+            return 1.0 / rank
+    return 0.0
+
+def _mean(values: list) -> float:
+    return sum(values) / len(values) if values else 0.0
+
+def _quality_summary(rows: list, ks: tuple) -> dict:
+    summary = {'queries': len(rows), 'mrr': _mean([row['reciprocal_rank'] for row in rows])}
+    for k in ks:
+        summary[f'recall@{k}'] = _mean([row['recall'][k] for row in rows])
+    return summary
+
+def evaluate_retriever(golden: dict, retrieve_fn, recorder: LatencyRecorder, ks: tuple = DEFAULT_KS,
+                       confidence_threshold: float = None, confidence_k: int = 3, repeats: int = 1) -> dict:
+    """
+    Runs every golden query through `retrieve_fn(query_text, k)`, which returns
+    results in the shared schema ({'id', 'score', ...}, best first), and
+    scores them. Stage times recorded on `recorder` by the retriever are kept
+    per query, next to the end-to-end 'retrieve' time measured here. Each
+    query is timed `repeats` times; quality is scored on the last run.
+
+    With a confidence threshold, the mean score of the top `confidence_k`
+    results is checked the way the chatbot does before answering: in-scope
+    queries should pass it and out-of-scope ones (no relevant IDs) should not.
+    """
+    k = max(ks)
+    in_scope, out_of_scope = [], []
+    for query in golden['queries']:
+        for _ in range(repeats):
+            recorder.start_turn()
+            start = time.perf_counter()
+            results = retrieve_fn(query['query'], k)
+            recorder.record('retrieve', time.perf_counter() - start)
+
+        retrieved_ids = [result['id'] for result in results]
+        top_scores = [result['score'] for result in results[:confidence_k]]
+        row = {
+            'id': query['id'],
+            'language': query.get('language'),
+            'retrieved_ids': retrieved_ids,
+            'confidence': _mean(top_scores),
+        }
+        if query['relevant_ids']:
+            reciprocal = reciprocal_rank(retrieved_ids, query['relevant_ids'])
+            row['reciprocal_rank'] = reciprocal
+            row['first_relevant_rank'] = round(1 / reciprocal) if reciprocal else None
+            row['recall'] = {cutoff: recall_at_k(retrieved_ids, query['relevant_ids'], cutoff) for cutoff in ks}
+            in_scope.append(row)
+        else:
+            out_of_scope.append(row)
+
+    report = {'quality': _quality_summary(in_scope, ks), 'by_language': {}}
+    for language in sorted({row['language'] for row in in_scope if row['language']}):
+        report['by_language'][language] = _quality_summary([row for row in in_scope if row['language'] == language], ks)
+    if confidence_threshold is not None:
+        report['confidence'] = {
+            'threshold': confidence_threshold,
+            'top_k': confidence_k,
+            'in_scope_answered': _mean([row['confidence'] >= confidence_threshold for row in in_scope]),
+            'out_of_scope_rejected': _mean([row['confidence'] < confidence_threshold for row in out_of_scope]),
+        }
+    report['per_query'] = [
+        {key: value for key, value in row.items() if key != 'recall'}
+        for row in in_scope + out_of_scope
+    ]
+    report['latency'] = recorder.summary()
+    return report
+
+def compare_quality(report: dict, baseline: dict, max_drop: float = 0.02) -> list:
+    """
+    Returns (metric, baseline_value, current_value) for every quality metric
+    (MRR, recall@k) that fell by more than `max_drop` (absolute) against a
+    baseline report.
+    """
+    drops = []
+    for metric, after in report['quality'].items():
+        if metric != 'queries' and metric in baseline['quality']:
+            before = baseline['quality'][metric]
+            if before - after > max_drop:
+                drops.append((metric, before, after))
+    return drops
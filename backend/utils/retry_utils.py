@@ -0,0 +1,69 @@
+import random
+import time
+
+from backend.utils.logging_utils import get_logger
+
+logger = get_logger(__name__)
+
+# HTTP status codes worth retrying: rate limiting and transient server errors.
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+# Fragments of error messages that indicate the same conditions when the client
+# library does not expose a status code (e.g. gRPC errors from the Gemini SDK).
+RETRYABLE_MESSAGE_FRAGMENTS = (
+    "429", "resource has been exhausted", "resource_exhausted", "rate limit",
+    "too many requests", "quota", "503", "service unavailable", "deadline exceeded",
+    "internal error", "502", "504",
+)
+
+def get_error_status_code(exc: Exception):
+    """Best-effort extraction of an HTTP-style status code from an API exception."""
+    for attribute in ("status", "status_code", "code"):
+        value = getattr(exc, attribute, None)
+        if callable(value):
+            try:
+                value = value()
+            except Exception:
+                value = None
+        # google.api_core exceptions expose `code` as an int; gRPC status codes
+        # are enums whose value is a tuple, so only plain ints are trusted here.
+        if isinstance(value, int):
+            return value
+    return None
+
+RATE_LIMIT_MESSAGE_FRAGMENTS = (
+    "429", "resource has been exhausted", "resource_exhausted", "rate limit", "too many requests", "quota",
+)
+
+def is_rate_limit_error(exc: Exception) -> bool:
+    """True for rate-limit / quota errors (429) only."""
+    status_code = get_error_status_code(exc)
+    if status_code is not None:
+        return status_code == 429
+    message = str(exc).lower()
+    return any(fragment in message for fragment in RATE_LIMIT_MESSAGE_FRAGMENTS)
+
+def is_retryable_error(exc: Exception) -> bool:
+    """True for rate-limit (429) and transient 5xx errors."""
+    status_code = get_error_status_code(exc)
+    if status_code is not None:
+        return status_code in RETRYABLE_STATUS_CODES
+    message = str(exc).lower()
+    return any(fragment in message for fragment in RETRYABLE_MESSAGE_FRAGMENTS)
+
+def retry_with_backoff(fn, *args, max_attempts: int = 6, base_delay: float = 1.0, max_delay: float = 60.0,
+                       retry_on=is_retryable_error, description: str = "request", **kwargs):
+    """
+    Calls fn(*args, **kwargs), retrying errors accepted by `retry_on` with
+    exponential backoff and full jitter. Non-retryable errors, and the last
+    error once attempts are exhausted, are re-raised.
+    """
+    for attempt in range(1, max_attempts + 1):
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            if attempt == max_attempts or not retry_on(e):
+                raise
+            delay = random.uniform(0, min(max_delay, base_delay * (2 ** (attempt - 1))))
+            logger.warning("Retryable error on %s (attempt %d/%d): %s. Retrying in %.1fs.",
+                           description, attempt, max_attempts, e, delay)
+            time.sleep(delay)
@@ -0,0 +1,126 @@
+import json
+import mmap
+import os
+import threading
+
+import numpy as np
+
+# File layout of a row store directory. Every array is a plain .npy file so it
+# can be memory-mapped; text is one UTF-8 blob addressed by offsets.
+TEXTS_FILE = "texts.bin"
+TEXT_OFFSETS_FILE = "text_offsets.npy"
+STRINGS_FILE = "strings.bin"
+STRING_OFFSETS_FILE = "string_offsets.npy"
+METADATA_CODES_FILE = "metadata_codes.npy"
+COLUMNS_FILE = "columns.json"
+
+def _write_blob(directory: str, blob_file: str, offsets_file: str, values: list):
+    encoded = [value.encode('utf-8') for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype='int64')
+    offsets[1:] = np.cumsum([len(value) for value in encoded])
+    with open(os.path.join(directory, blob_file), 'wb') as f:
+        for value in encoded:
+            f.write(value)
+    np.save(os.path.join(directory, offsets_file), offsets)
+
+def write_row_store(directory: str, texts: list, metadatas: list):
+    """
+    Writes row-aligned chunk texts and metadata in a compact columnar layout:
+    texts as a UTF-8 blob plus an offset array, and metadata as an
+    (n_rows, n_columns) int32 matrix of codes into a table of interned strings
+    (-1 = key absent). Repeated category/page/section values are stored once.
+    """
+    if len(texts) != len(metadatas):
+        raise ValueError(f"Got {len(texts)} texts but {len(metadatas)} metadata rows.")
+    os.makedirs(directory, exist_ok=True)
+
+    columns = []
+    for meta in metadatas:
+        for key in meta:
+            if key not in columns:
+                columns.append(key)
+
+    strings = []
+    string_codes = {}
+    codes = np.full((len(metadatas), len(columns)), -1, dtype='int32')
+    for row, meta in enumerate(metadatas):
+        for column, key in enumerate(columns):
+            if key not in meta:
+                continue
+            value = meta[key]
+            if not isinstance(value, str):
+                raise ValueError(f"Metadata value for '{key}' in row {row} is not a string: {value!r}")
+            if value not in string_codes:
+                string_codes[value] = len(strings)
+                strings.append(value)
+            codes[row, column] = string_codes[value]
+
+    _write_blob(directory, TEXTS_FILE, TEXT_OFFSETS_FILE, list(texts))
+    _write_blob(directory, STRINGS_FILE, STRING_OFFSETS_FILE, strings)
+    np.save(os.path.join(directory, METADATA_CODES_FILE), codes)
+    with open(os.path.join(directory, COLUMNS_FILE), 'w', encoding='utf-8') as f:
+        json.dump(columns, f, ensure_ascii=False)
+
+class RowStore:
+    """
+    Read-only, memory-mapped view of a directory written by write_row_store.
+    Nothing is decoded up front: a row's text and metadata are read from the
+    mapped files when asked for, so resident memory does not grow with the
+    corpus and processes opening the same files share the OS page cache.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        with open(os.path.join(directory, COLUMNS_FILE), 'r', encoding='utf-8') as f:
+            self.columns = json.load(f)
+        self._text_offsets = np.load(os.path.join(directory, TEXT_OFFSETS_FILE), mmap_mode='r')
+        self._string_offsets = np.load(os.path.join(directory, STRING_OFFSETS_FILE), mmap_mode='r')
+        self._codes = np.load(os.path.join(directory, METADATA_CODES_FILE), mmap_mode='r')
+        self._texts = self._map(TEXTS_FILE)
+        self._strings = self._map(STRINGS_FILE)
+        # Interned strings are few and hot (categories, pages), so decoded ones are kept.
+        self._decoded_strings = {}
+        self._lock = threading.Lock()
+
+    def _map(self, file_name: str):
+        path = os.path.join(self.directory, file_name)
+        if os.path.getsize(path) == 0:
+            # mmap cannot map empty files; an empty store has nothing to read anyway.
+            return b''
+        with open(path, 'rb') as f:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self) -> int:
+        return len(self._text_offsets) - 1
+
+    def _check_row(self, row: int) -> int:
+        row = int(row)
+        if not 0 <= row < len(self):
+            raise IndexError(f"Row {row} is out of range for a store of {len(self)} rows.")
+        return row
+
+    def text(self, row: int) -> str:
+        row = self._check_row(row)
+        start, end = int(self._text_offsets[row]), int(self._text_offsets[row + 1])
+        return self._texts[start:end].decode('utf-8')
+
+    def _string(self, code: int) -> str:
+        value = self._decoded_strings.get(code)
+        if value is None:
+            start, end = int(self._string_offsets[code]), int(self._string_offsets[code + 1])
+            value = self._strings[start:end].decode('utf-8')
+            with self._lock:
+                self._decoded_strings[code] = value
+        return value
+
+    def metadata(self, row: int) -> dict:
+        row = self._check_row(row)
+        return {
+            key: self._string(int(code))
+            for key, code in zip(self.columns, self._codes[row]) if code >= 0
+        }
+
+    def close(self):
+        for mapped in (self._texts, self._strings):
+            if isinstance(mapped, mmap.mmap):
+                mapped.close()
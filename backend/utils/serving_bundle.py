@@ -0,0 +1,171 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+
+from backend.utils.logging_utils import get_logger
+
+logger = get_logger(__name__)
+
+# A serving bundle is one directory holding everything the retrieval API needs:
+# the FAISS index and its parameters, the row store (texts and metadata aligned
+# with the index rows) and a manifest naming the query encoder and the version.
+MANIFEST_FILE = "manifest.json"
+INDEX_FILE = "index.faiss"
+# Named so rag_pipeline.index_params_path(INDEX_FILE) resolves to it.
+INDEX_PARAMS_FILE = "index_params.json"
+# Likewise resolved by rag_pipeline.rerank_vectors_path(INDEX_FILE).
+RERANK_VECTORS_FILE = "index_vectors.npy"
+ROWS_DIR = "rows"
+BUNDLE_FORMAT_VERSION = 1
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def write_serving_bundle(output_dir: str, index_path: str, index_params: dict, texts: list, metadatas: list,
+                         model_name: str, rerank_vectors_path: str = None) -> dict:
+    """
+    Writes a serving bundle to output_dir and returns its manifest. The bundle is
+    assembled in a sibling directory and swapped in at the end, so a server
+    never sees a half-written bundle. The version is a hash over every file.
+    rerank_vectors_path adds the float32 vectors used to re-rank candidates
+    from a compressed index.
+    """
+    from backend.utils.row_store import write_row_store
+
+    output_dir = os.path.abspath(output_dir)
+    staging_dir = output_dir + ".building"
+    shutil.rmtree(staging_dir, ignore_errors=True)
+    os.makedirs(staging_dir)
+
+    shutil.copyfile(index_path, os.path.join(staging_dir, INDEX_FILE))
+    if rerank_vectors_path:
+        shutil.copyfile(rerank_vectors_path, os.path.join(staging_dir, RERANK_VECTORS_FILE))
+    with open(os.path.join(staging_dir, INDEX_PARAMS_FILE), 'w', encoding='utf-8') as f:
+        json.dump(index_params, f, ensure_ascii=False, indent=4)
+    write_row_store(os.path.join(staging_dir, ROWS_DIR), texts, metadatas)
+
+    files = {}
+    for root, _, names in os.walk(staging_dir):
+        for name in names:
+            path = os.path.join(root, name)
+            files[os.path.relpath(path, staging_dir).replace(os.sep, '/')] = _file_sha256(path)
+    version = hashlib.sha256(json.dumps(files, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+    manifest = {
+        "format_version": BUNDLE_FORMAT_VERSION,
+        "version": version,
+        "created_at": time.strftime('%Y-%m-%dT%H:%M:%S'),
+        "model_name": model_name,
+        "rows": len(texts),
+        "index_type": index_params.get('index_type'),
+        "metric": index_params.get('metric'),
+        "compression": index_params.get('compression', 'none'),
+        "files": files,
+    }
+    with open(os.path.join(staging_dir, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=4)
+
+    previous_dir = output_dir + ".previous"
+    shutil.rmtree(previous_dir, ignore_errors=True)
+    if os.path.exists(output_dir):
+        os.replace(output_dir, previous_dir)
+    os.replace(staging_dir, output_dir)
+    shutil.rmtree(previous_dir, ignore_errors=True)
+    return manifest
+
+class ServingBundle:
+    """
+    Lazily loaded serving bundle. Constructing it touches no files; the manifest,
+    encoder, index and row store are loaded together on first use or by an
+    explicit warm_up(), so the process can start serving health checks at once
+    and report readiness once loading has finished.
+    """
+
+    def __init__(self, path: str, mmap_index: bool = True):
+        self.path = path
+        self.mmap_index = mmap_index
+        self.manifest = None
+        self.encoder = None
+        self.index = None
+        self.index_params = None
+        self.rerank_vectors = None
+        self.rows = None
+        self.error = None
+        self.load_seconds = None
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self.rows is not None
+
+    @property
+    def version(self):
+        return self.manifest["version"] if self.manifest else None
+
+    def load(self):
+        """Loads every component once; concurrent callers wait for the same load."""
+        if self.ready:
+            return self
+        with self._lock:
+            if self.ready:
+                return self
+            start = time.perf_counter()
+            try:
+                self._load()
+            except Exception as e:
+                self.error = str(e)
+                raise
+            self.error = None
+            self.load_seconds = time.perf_counter() - start
+            logger.info("Loaded serving bundle %s from '%s' in %.2fs.", self.version, self.path, self.load_seconds)
+        return self
+
+    def _load(self):
+        # Heavy imports are deferred so importing the API module stays cheap.
+        from backend.utils.encoders import create_query_encoder
+        from backend.scripts.rag_pipeline import load_faiss_index, load_rerank_vectors
+        from backend.utils.row_store import RowStore
+
+        manifest_path = os.path.join(self.path, MANIFEST_FILE)
+        if not os.path.exists(manifest_path):
+            raise FileNotFoundError(
+                f"No serving bundle at '{self.path}'. Build one with: python backend/scripts/build_serving_bundle.py"
+            )
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get("format_version") != BUNDLE_FORMAT_VERSION:
+            raise ValueError(f"Unsupported serving bundle format {manifest.get('format_version')}.")
+
+        # load_faiss_index picks up INDEX_PARAMS_FILE as the index's parameter sidecar.
+        index, index_params = load_faiss_index(os.path.join(self.path, INDEX_FILE), mmap=self.mmap_index)
+        rerank_vectors = load_rerank_vectors(os.path.join(self.path, INDEX_FILE))
+        rows = RowStore(os.path.join(self.path, ROWS_DIR))
+        if index.ntotal != len(rows):
+            raise ValueError(f"Bundle index has {index.ntotal} vectors but {len(rows)} rows.")
+
+        # The encoder backend (PyTorch or quantized ONNX) is chosen by QUERY_ENCODER_BACKEND.
+        self.encoder = create_query_encoder(manifest["model_name"])
+        self.manifest = manifest
+        self.index = index
+        self.index_params = index_params
+        self.rerank_vectors = rerank_vectors
+        # Assigned last: `ready` flips only once everything else is in place.
+        self.rows = rows
+
+    def warm_up(self, sample_query: str = "APEC 2025"):
+        """
+        Loads the bundle and runs one encode and search, so the first real
+        request does not pay for model initialization or cold index pages.
+        """
+        from backend.scripts.rag_pipeline import search_index
+        self.load()
+        search_index(self.index, self.index_params, self.encoder.encode([sample_query]), min(5, self.index.ntotal),
+                     self.rerank_vectors)
+        return self
@@ -0,0 +1,302 @@
+import json
+import os
+
+import numpy as np
+
+from backend.utils.logging_utils import get_logger
+from backend.utils.metrics import VECTOR_QUERY_SECONDS, track_duration
+
+logger = get_logger(__name__)
+
+# FAISS is optional for the in-process store; NumPy brute force is used without it.
+try:
+    import faiss
+except ImportError:
+    faiss = None
+
+# Selects the retrieval backend: 'pinecone' (managed service), 'faiss' or 'numpy'
+# (in-process, built from the processed chunks file).
+VECTOR_STORE_BACKEND = os.getenv("VECTOR_STORE_BACKEND", "pinecone")
+# Encoder used by the in-process backends: 'gemini' (same vectors as Pinecone)
+# or 'sentence-transformers' (fully offline).
+LOCAL_EMBEDDING_BACKEND = os.getenv("LOCAL_EMBEDDING_BACKEND", "gemini")
+LOCAL_SENTENCE_TRANSFORMER_MODEL = os.getenv("LOCAL_SENTENCE_TRANSFORMER_MODEL", "all-MiniLM-L6-v2")
+# In-memory vector format of the in-process backends: 'none' (float32), 'fp16'
+# (2x smaller) or 'int8' (4x smaller). Compressed stores re-score the top
+# LOCAL_RERANK_FACTOR * k candidates against the float32 embedding cache file,
+# which is memory-mapped rather than loaded.
+VECTOR_STORE_COMPRESSION = os.getenv("VECTOR_STORE_COMPRESSION", "none")
+LOCAL_RERANK_FACTOR = int(os.getenv("LOCAL_RERANK_FACTOR", "4"))
+COMPRESSION_TYPES = ('none', 'fp16', 'int8')
+# Rows scored per block when searching a compressed matrix, bounding the
+# temporary float32 copy.
+SCORE_BLOCK_ROWS = 8192
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+PROCESSED_CHUNKS_PATH = os.path.join(PROJECT_ROOT, 'backend', 'data', 'processed', 'refined_processed_chunks_v4.json')
+EMBEDDINGS_DIR = os.path.join(PROJECT_ROOT, 'backend', 'data', 'embeddings')
+
+def l2_distance_to_cosine(distances):
+    """
+    Converts squared L2 distances between unit-length vectors into cosine
+    similarities (||a - b||^2 = 2 - 2 cos), so FAISS L2 results can share the
+    score scale used everywhere else.
+    """
+    return 1.0 - np.asarray(distances, dtype='float32') / 2.0
+
+def make_result(chunk_id, score, content, metadata) -> dict:
+    """The normalized retrieval result shared by every vector store."""
+    return {
+        "id": chunk_id,
+        "score": float(score),
+        "content": content,
+        "metadata": metadata,
+    }
+
+class VectorStore:
+    """
+    Retriever interface. `query` returns a list of normalized results
+    ({'id', 'score', 'content', 'metadata'}, score = cosine similarity, higher
+    is better), best match first.
+    """
+
+    def embed_query(self, query_text: str):
+        """Embeds a query with the encoder this store was built with."""
+        raise NotImplementedError
+
+    def query(self, query_text: str, top_k: int = 5, query_embedding=None) -> list:
+        raise NotImplementedError
+
+    def warm_up(self):
+        """Prepares connections or in-memory structures before the first query."""
+
+class PineconeVectorStore(VectorStore):
+    """Pinecone-backed store, embedding queries with Gemini."""
+
+    def __init__(self, index_name: str):
+        self.index_name = index_name
+
+    def embed_query(self, query_text: str):
+        from backend.utils.pinecone_utils import get_gemini_embedding
+        return get_gemini_embedding(query_text, task_type="RETRIEVAL_QUERY")
+
+    def query(self, query_text: str, top_k: int = 5, query_embedding=None) -> list:
+        from backend.utils.pinecone_utils import query_pinecone_index
+        # query_pinecone_index already returns the normalized result schema.
+        return query_pinecone_index(self.index_name, query_text, top_k=top_k, query_embedding=query_embedding)
+
+    def warm_up(self):
+        from backend.utils.pinecone_utils import initialize_pinecone_client, pinecone_index_manager
+        initialize_pinecone_client()
+        pinecone_index_manager.warm_up(self.index_name)
+        pinecone_index_manager.start_health_checks([self.index_name])
+
+class LocalVectorStore(VectorStore):
+    """
+    In-process store over unit-normalized embeddings, searched by inner product
+    (= cosine). Uses a FAISS flat index when FAISS is installed and requested,
+    otherwise a single NumPy matrix-vector product. With compression the
+    vectors are held as float16 or int8; candidates are then re-ranked exactly
+    against rerank_vectors (typically the memory-mapped float32 cache) if given.
+    """
+
+    def __init__(self, ids: list, texts: list, metadatas: list, embeddings, embed_query_fn, use_faiss: bool = True,
+                 compression: str = 'none', rerank_vectors=None, rerank_factor: int = LOCAL_RERANK_FACTOR):
+        if compression not in COMPRESSION_TYPES:
+            raise ValueError(f"Unknown VECTOR_STORE_COMPRESSION '{compression}'. Choose one of {COMPRESSION_TYPES}.")
+        self.ids = list(ids)
+        self.texts = list(texts)
+        self.metadatas = list(metadatas)
+        self.embed_query_fn = embed_query_fn
+        self.compression = compression
+        self.rerank_vectors = rerank_vectors if compression != 'none' else None
+        self.rerank_factor = rerank_factor
+        vectors = self._normalize(np.asarray(embeddings, dtype='float32'))
+        self.index = None
+        self.embeddings = None
+        if use_faiss and faiss is not None:
+            dimension = vectors.shape[1]
+            if compression == 'none':
+                self.index = faiss.IndexFlatIP(dimension)
+            else:
+                scalar_type = faiss.ScalarQuantizer.QT_fp16 if compression == 'fp16' else faiss.ScalarQuantizer.QT_8bit
+                self.index = faiss.IndexScalarQuantizer(dimension, scalar_type, faiss.METRIC_INNER_PRODUCT)
+                self.index.train(vectors)
+            self.index.add(vectors)
+        elif compression == 'fp16':
+            self.embeddings = vectors.astype('float16')
+        elif compression == 'int8':
+            # Symmetric per-dimension scales; folded into the query at search time.
+            self.int8_scale = np.abs(vectors).max(axis=0) / 127.0
+            self.int8_scale[self.int8_scale == 0] = 1.0
+            self.embeddings = np.round(vectors / self.int8_scale).astype('int8')
+        else:
+            self.embeddings = vectors
+
+    @staticmethod
+    def _normalize(vectors):
+        vectors = np.atleast_2d(vectors).astype('float32')
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    @classmethod
+    def from_chunks(cls, chunks: list, embed_documents_fn, embed_query_fn, cache_path: str = None, use_faiss: bool = True,
+                    compression: str = 'none'):
+        """
+        Builds the store from processed chunks ({'id', 'content', 'metadata'}).
+        Document embeddings are saved to cache_path (.npy) together with the chunk
+        IDs they belong to. On the next start cached vectors are reused by ID and
+        only chunks missing from the cache (new ones, or ones whose embedding
+        failed) are embedded. A compressed store re-ranks against that file,
+        memory-mapped.
+        """
+        ids = [chunk["id"] for chunk in chunks]
+        cached_ids, cached_rows, cached_embeddings = [], {}, None
+        ids_path = f"{cache_path}.ids.json" if cache_path else None
+        if cache_path and os.path.exists(cache_path) and os.path.exists(ids_path):
+            with open(ids_path, 'r', encoding='utf-8') as f:
+                cache_index = json.load(f)
+            # Older caches hold only the list of embedded IDs.
+            cached_ids = cache_index["ids"] if isinstance(cache_index, dict) else cache_index
+            cached_rows = {chunk_id: row for row, chunk_id in enumerate(cached_ids)}
+            cached_embeddings = np.load(cache_path)
+
+        to_embed = [i for i, chunk_id in enumerate(ids) if chunk_id not in cached_rows]
+        new_vectors = {}
+        if to_embed:
+            if cached_rows:
+                logger.info("Embedding %d chunks missing from '%s'.", len(to_embed), cache_path)
+            vectors = embed_documents_fn([chunks[i]["content"] for i in to_embed])
+            new_vectors = {i: vector for i, vector in zip(to_embed, vectors) if vector is not None}
+        else:
+            logger.info("Loaded %d cached document embeddings from '%s'.", len(ids), cache_path)
+        failed_ids = [ids[i] for i in to_embed if i not in new_vectors]
+        if failed_ids:
+            # Left out rather than indexed as zeros; they are retried on the next start.
+            logger.warning("Skipping %d chunks without embeddings.", len(failed_ids))
+
+        kept = [i for i, chunk_id in enumerate(ids) if chunk_id in cached_rows or i in new_vectors]
+        chunks = [chunks[i] for i in kept]
+        embeddings = np.asarray([new_vectors[i] if i in new_vectors else cached_embeddings[cached_rows[ids[i]]]
+                                 for i in kept], dtype='float32')
+        ids = [ids[i] for i in kept]
+        if cache_path and ids != cached_ids:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            np.save(cache_path, embeddings)
+            with open(ids_path, 'w', encoding='utf-8') as f:
+                json.dump({"ids": ids, "failed": failed_ids}, f)
+
+        rerank_vectors = np.load(cache_path, mmap_mode='r') if cache_path and compression != 'none' else None
+        return cls(
+            ids,
+            [chunk["content"] for chunk in chunks],
+            [chunk["metadata"] for chunk in chunks],
+            embeddings,
+            embed_query_fn,
+            use_faiss=use_faiss,
+            compression=compression,
+            rerank_vectors=rerank_vectors,
+        )
+
+    def embed_query(self, query_text: str):
+        return self.embed_query_fn(query_text)
+
+    def _matrix_scores(self, query_vectors):
+        if self.compression == 'none':
+            return query_vectors @ self.embeddings.T
+        if self.compression == 'int8':
+            query_vectors = (query_vectors * self.int8_scale).astype('float32')
+        scores = np.empty((len(query_vectors), len(self.embeddings)), dtype='float32')
+        for start in range(0, len(self.embeddings), SCORE_BLOCK_ROWS):
+            block = self.embeddings[start:start + SCORE_BLOCK_ROWS].astype('float32')
+            scores[:, start:start + len(block)] = query_vectors @ block.T
+        return scores
+
+    def _rerank(self, query_vectors, candidate_rows, top_k: int):
+        # Exact cosine against the float32 vectors, reading only the candidate rows.
+        scores = np.full((len(query_vectors), top_k), -np.inf, dtype='float32')
+        rows = np.full((len(query_vectors), top_k), -1, dtype='int64')
+        for i, query_vector in enumerate(query_vectors):
+            candidates = np.sort(candidate_rows[i][candidate_rows[i] >= 0])
+            exact = self._normalize(self.rerank_vectors[candidates]) @ query_vector
+            order = np.argsort(-exact)[:top_k]
+            scores[i, :len(order)] = exact[order]
+            rows[i, :len(order)] = candidates[order]
+        return scores, rows
+
+    def search(self, query_embeddings, top_k: int):
+        """Returns (scores, rows) arrays of shape (n_queries, k) for a batch of embeddings."""
+        query_vectors = self._normalize(np.asarray(query_embeddings, dtype='float32'))
+        top_k = min(top_k, len(self.ids))
+        if self.rerank_vectors is not None and self.rerank_factor > 1:
+            candidate_k = min(top_k * self.rerank_factor, len(self.ids))
+            _, candidate_rows = self._search_compressed(query_vectors, candidate_k)
+            return self._rerank(query_vectors, candidate_rows, top_k)
+        return self._search_compressed(query_vectors, top_k)
+
+    def _search_compressed(self, query_vectors, top_k: int):
+        if self.index is not None:
+            return self.index.search(query_vectors, top_k)
+        scores = self._matrix_scores(query_vectors)
+        # argpartition finds the top k in linear time; only those k are sorted.
+        rows = np.argpartition(-scores, top_k - 1, axis=1)[:, :top_k]
+        row_scores = np.take_along_axis(scores, rows, axis=1)
+        order = np.argsort(-row_scores, axis=1)
+        return np.take_along_axis(row_scores, order, axis=1), np.take_along_axis(rows, order, axis=1)
+
+    def query(self, query_text: str, top_k: int = 5, query_embedding=None) -> list:
+        if query_embedding is None:
+            query_embedding = self.embed_query(query_text)
+        if query_embedding is None:
+            logger.warning("Could not generate embedding for the query. Returning empty results.")
+            return []
+        with track_duration(VECTOR_QUERY_SECONDS, "faiss" if self.index is not None else "numpy"):
+            scores, rows = self.search([query_embedding], top_k)
+        return [
+            make_result(self.ids[row], score, self.texts[row], self.metadatas[row])
+            for score, row in zip(scores[0], rows[0]) if row >= 0
+        ]
+
+def _local_encoder_functions(embedding_backend: str):
+    """Returns (embed_documents_fn, embed_query_fn, encoder_name) for an in-process store."""
+    if embedding_backend == "gemini":
+        from backend.utils.pinecone_utils import get_gemini_embedding, get_gemini_embeddings, GEMINI_EMBEDDING_MODEL
+        return (
+            lambda texts: get_gemini_embeddings(texts, task_type="RETRIEVAL_DOCUMENT", max_attempts=6),
+            lambda text: get_gemini_embedding(text, task_type="RETRIEVAL_QUERY"),
+            GEMINI_EMBEDDING_MODEL.split('/')[-1],
+        )
+    if embedding_backend == "sentence-transformers":
+        from sentence_transformers import SentenceTransformer
+        model = SentenceTransformer(LOCAL_SENTENCE_TRANSFORMER_MODEL)
+        return (
+            lambda texts: list(model.encode(texts, batch_size=64)),
+            lambda text: model.encode([text])[0],
+            LOCAL_SENTENCE_TRANSFORMER_MODEL,
+        )
+    raise ValueError(f"Unknown LOCAL_EMBEDDING_BACKEND '{embedding_backend}'.")
+
+def create_vector_store(backend: str = None, index_name: str = None, chunks_path: str = PROCESSED_CHUNKS_PATH,
+                        embedding_backend: str = None, compression: str = None) -> VectorStore:
+    """
+    Builds the vector store selected by `backend` (default: VECTOR_STORE_BACKEND).
+    In-process backends are built from the processed chunks file, with document
+    embeddings cached under backend/data/embeddings.
+    """
+    backend = backend or VECTOR_STORE_BACKEND
+    if backend == "pinecone":
+        return PineconeVectorStore(index_name)
+    if backend not in ("faiss", "numpy"):
+        raise ValueError(f"Unknown VECTOR_STORE_BACKEND '{backend}'.")
+
+    embedding_backend = embedding_backend or LOCAL_EMBEDDING_BACKEND
+    embed_documents_fn, embed_query_fn, encoder_name = _local_encoder_functions(embedding_backend)
+    with open(chunks_path, 'r', encoding='utf-8') as f:
+        chunks = json.load(f)
+    cache_path = os.path.join(EMBEDDINGS_DIR, f"local_store_{encoder_name}.npy")
+    return LocalVectorStore.from_chunks(
+        chunks, embed_documents_fn, embed_query_fn,
+        cache_path=cache_path, use_faiss=(backend == "faiss"),
+        compression=compression or VECTOR_STORE_COMPRESSION
+    )